@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import gzip
+from pyv3d import V3DReader
+from pyv3d.v3dobj import write_obj
+from pyv3d.v3dobjects import V3DTriangleGroups
+
+
+class LegacyV3DToObjWriter(V3DReader):
+    # The per-line str.format writer formerly shipped as v3dtoobj.py, kept as the benchmark baseline
+    def __init__(self, fil: gzip.GzipFile):
+        super().__init__(fil)
+
+    def write_obj(self, out_name: str, scale=1.0):
+        if not self.processed:
+            self.process()
+        with open(out_name, 'w') as fil:
+            base_position_offset = 0
+            base_normal_offset = 0
+            fil.write('\n')
+            k = 0
+            for object in self.objects:
+                if not isinstance(object, V3DTriangleGroups):
+                    break
+                fil.write('g triangles_{0}\n'.format(k))
+                for x,y,z in object.positions:
+                    fil.write('v {0:.6f} {1:.6f} {2:.6f}\n'.format(
+                        x*scale, y*scale, z*scale))
+                for normal in object.normals:
+                    fil.write('vn {0:.6f} {1:.6f} {2:.6f}\n'.format(*normal))
+
+                for i in range(len(object.position_indices)):
+                    px, py, pz = object.position_indices[i]
+                    nx, ny, nz = object.normals_indices[i]
+                    fil.write('f {0}//{3} {1}//{4} {2}//{5}\n'.format(
+                        px + base_position_offset+1, py+base_position_offset+1,
+                        pz + base_position_offset + 1,
+                        nx + base_normal_offset+1, ny+base_normal_offset +
+                        1, nz + base_normal_offset + 1
+                    ))
+
+                base_position_offset += len(object.positions)
+                base_normal_offset += len(object.normals)
+                k += 1
+
+
+def main():
+    # usage: objbenchmark.py file.v3d
+    file_name = sys.argv[1] if len(sys.argv) > 1 else 'teapot.v3d'
+
+    with gzip.open(file_name, 'rb') as fil:
+        legacy = LegacyV3DToObjWriter(fil)
+    legacy.process()
+    start = time.perf_counter()
+    legacy.write_obj('legacy.obj')
+    legacy_time = time.perf_counter() - start
+
+    reader = V3DReader.from_file_name(file_name, numpy_triangles=True)
+    reader.process()
+    start = time.perf_counter()
+    write_obj(reader.objects, 'bulk.obj', vertex_color=False)
+    bulk_time = time.perf_counter() - start
+
+    print('legacy writer: {0:.3f}s'.format(legacy_time))
+    print('bulk writer:   {0:.3f}s ({1:.1f}x)'.format(bulk_time, legacy_time / bulk_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+import numpy as np
+from pyv3d import V3DReader
+from pyv3d.v3dsynth import scene_counts, write_synthetic_scene
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+# Reader configurations that can be timed
+_MODES = {
+    'default': {},
+    'numpy': {'numpy_triangles': True},
+    'columnar': {'columnar': True},
+    'lazy': {'lazy': True},
+}
+
+
+def parse_size(text: str) -> int:
+    unit = text[-1].upper()
+    return int(float(text[:-1]) * _UNITS[unit]) if unit in _UNITS else int(text)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def time_process(file_name: str, mode: str) -> dict:
+    """Runs in a fresh process so that the peak memory belongs to this measurement alone."""
+    start = time.perf_counter()
+    reader = V3DReader.from_file_name(file_name, **_MODES[mode])
+    inflated = time.perf_counter()
+    reader.process()
+    processed = time.perf_counter()
+    raw_bytes = len(reader.raw_buffer)
+    return {'mode': mode, 'inflate_s': inflated - start, 'process_s': processed - inflated,
+            'total_s': processed - start, 'objects': len(reader.columnar if mode == 'columnar' else reader.objects),
+            'raw_bytes': raw_bytes, 'process_mb_s': raw_bytes / (1 << 20) / (processed - inflated),
+            'peak_rss_mb': _peak_rss_mb()}
+
+
+def time_types(file_name: str) -> dict:
+    """Decoding throughput of each object type, read through the record index."""
+    reader = V3DReader.from_file_name(file_name)
+    index = reader.build_index()
+    results = {}
+    for typ in np.unique(index.types[index.object_records]).tolist():
+        records = index.records_of_type(typ)
+        start = time.perf_counter()
+        reader.objects_of_type(typ)
+        elapsed = time.perf_counter() - start
+        nbytes = int(index.lengths[records].sum()) + 4 * len(records)
+        results[str(typ)] = {'objects': len(records), 'bytes': nbytes, 'seconds': elapsed,
+                             'objects_s': len(records) / elapsed, 'mb_s': nbytes / (1 << 20) / elapsed}
+    return results
+
+
+def _isolated(fn, *args):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def scene_file(data_dir: str, size: int, double_precision: bool, seed: int) -> str:
+    name = os.path.join(data_dir, 'synthetic_{0}_{1}_{2}.v3d'.format(size, 'dp' if double_precision else 'sp', seed))
+    if not os.path.exists(name):
+        print('generating {0}'.format(name))
+        write_synthetic_scene(name + '.tmp', scene_counts(size, double_precision), double_precision, seed)
+        os.replace(name + '.tmp', name)
+    return name
+
+
+def main():
+    # usage: v3dbenchmark.py --sizes 1M 64M 1G --output results.json
+    parser = argparse.ArgumentParser(description='Time V3DReader on synthetic scenes containing every object type.')
+    parser.add_argument('--sizes', nargs='+', default=['1M', '16M', '128M'],
+                        help='decompressed scene sizes, e.g. 1M 256M 5G')
+    parser.add_argument('--modes', nargs='+', default=['default', 'numpy', 'columnar'], choices=sorted(_MODES))
+    parser.add_argument('--precision', nargs='+', default=['double'], choices=['double', 'single'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-types', action='store_true', help='skip the per-type throughput runs')
+    parser.add_argument('--data-dir', default='v3dbench_data')
+    parser.add_argument('--output', default='v3dbenchmark.json')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    runs = []
+    for precision in args.precision:
+        for size in map(parse_size, args.sizes):
+            file_name = scene_file(args.data_dir, size, precision == 'double', args.seed)
+            entry = {'size': size, 'precision': precision, 'seed': args.seed,
+                     'compressed_bytes': os.path.getsize(file_name), 'process': []}
+            for mode in args.modes:
+                for _ in range(args.repeat):
+                    result = _isolated(time_process, file_name, mode)
+                    peak = result['peak_rss_mb']
+                    print('{0:>12} {1:6} {2:8} process {3:8.3f}s {4:8.1f} MB/s  peak {5} MB'.format(
+                        size, precision, mode, result['process_s'], result['process_mb_s'],
+                        '-' if peak is None else '{0:.1f}'.format(peak)))
+                    entry['process'].append(result)
+            if not args.no_types:
+                entry['types'] = _isolated(time_types, file_name)
+            runs.append(entry)
+
+    report = {
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'platform': platform.platform(), 'processor': platform.processor(),
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'runs': runs,
+    }
+    with open(args.output, 'w') as fil:
+        json.dump(report, fil, indent=1)
+    print('results written to {0}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import gzip
+import tempfile
+import numpy as np
+from collections.abc import Sequence
+from pyv3d import V3DReader, V3DWriter
+from pyv3d.v3dsynth import scene_counts, write_synthetic_scene
+from pyv3d.v3dparallel import process_parallel
+from pyv3d.v3dbvh import V3DBVH
+from pyv3d.v3dbounds import scene_bounds
+from pyv3d.v3dfilter import filter_v3d
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import V3DAnimation, V3DSphere
+
+
+def same(a, b) -> bool:
+    """Whether two decoded records hold the same values, comparing arrays and sequences by element."""
+    if isinstance(a, (str, bytes)) or isinstance(b, (str, bytes)):
+        return a == b
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    if isinstance(a, Sequence) and isinstance(b, Sequence):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if hasattr(a, '__dict__'):
+        return type(a) is type(b) and vars(a).keys() == vars(b).keys() and \
+            all(same(value, getattr(b, name)) for name, value in vars(a).items())
+    return a == b
+
+
+def check_parallel(file_name: str):
+    reader = V3DReader.from_file_name(file_name, numpy_triangles=True)
+    reader.process()
+    parallel = V3DReader.from_file_name(file_name, numpy_triangles=True)
+    process_parallel(parallel, max_workers=2)
+    assert same(reader.materials, parallel.materials) and same(reader.centers, parallel.centers)
+    assert same(reader.objects, parallel.objects), 'parallel decoding differs'
+
+
+def check_rewrite(file_name: str):
+    # Writing back what a reader decoded gives the same stream, records in the same order
+    with gzip.open(file_name, 'rb') as fil:
+        data = fil.read()
+    double_precision = bool(data[7])
+    for mode in ({}, {'columnar': True}, {'lazy': True}):
+        reader = V3DReader.from_file_name(file_name, **mode)
+        reader.process()
+        out_name = file_name + '.out'
+        with V3DWriter.from_file_name(out_name, double_precision) as writer:
+            writer.write_scene(reader)
+        with gzip.open(out_name, 'rb') as fil:
+            assert fil.read() == data, 'rewriting a reader with {0} changes the stream'.format(mode)
+
+
+def check_bvh(file_name: str):
+    # Box queries agree with testing every object, and objects without geometry are never hit
+    reader = V3DReader.from_file_name(file_name, columnar=True)
+    reader.process()
+    bounds = scene_bounds(reader.columnar)
+    bvh = V3DBVH.from_scene(reader.columnar)
+    lo, hi = np.array([-3.0, -3.0, -3.0]), np.array([4.0, 2.0, 5.0])
+    overlap = np.all((bounds[:, 0] <= hi) & (lo <= bounds[:, 1]), axis=1)
+    assert np.array_equal(bvh.query_box(lo, hi), np.flatnonzero(overlap)), 'BVH box query differs'
+
+
+def check_filter(file_name: str):
+    # Kept objects, and the records inside kept animations, still have the materials they had in the source
+    source = V3DReader.from_file_name(file_name)
+    source.process()
+    for types in ([v3dtypes.v3dtypes_animation, v3dtypes.v3dtypes_sphere], [v3dtypes.v3dtypes_sphere]):
+        out_name = file_name + '.out'
+        filter_v3d(V3DReader.from_file_name(file_name), out_name, types=types, materials=[0, 5])
+        reader = V3DReader.from_file_name(out_name)
+        reader.process()
+        kept = [obj for obj in source.objects
+                if (isinstance(obj, V3DAnimation) and v3dtypes.v3dtypes_animation in types) or
+                (type(obj) is V3DSphere and obj.material_id in (0, 5))]
+        assert len(kept) == len(reader.objects), 'filter kept other objects'
+        for src, obj in zip(kept, reader.objects):
+            pairs = zip([record for frame in src.frames for record in frame],
+                        [record for frame in obj.frames for record in frame]) \
+                if isinstance(obj, V3DAnimation) else [(src, obj)]
+            for a, b in pairs:
+                assert same(source.materials[a.material_id], reader.materials[b.material_id]), 'material renumbered'
+    # Transforms and elements survive a box crop
+    filter_v3d(V3DReader.from_file_name(file_name), out_name, box=([-1.0, -1.0, -1.0], [0.5, 0.5, 0.5]))
+    types = V3DReader.from_file_name(out_name).index.types
+    source_types = V3DReader.from_file_name(file_name).index.types
+    for typ in (v3dtypes.v3dtypes_transform, v3dtypes.v3dtypes_element):
+        assert np.count_nonzero(types == typ) == np.count_nonzero(source_types == typ), 'box crop dropped placements'
+
+
+# Checks run on each synthetic scene, in order
+CHECKS = [check_parallel, check_rewrite, check_bvh, check_filter]
+
+
+def main():
+    # usage: v3dcheck.py [size]  -- regression checks of pyv3d on synthetic scenes
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 20
+    with tempfile.TemporaryDirectory() as data_dir:
+        for double_precision in (True, False):
+            file_name = os.path.join(data_dir, 'synthetic.v3d')
+            write_synthetic_scene(file_name, scene_counts(size, double_precision), double_precision)
+            for check in CHECKS:
+                check(file_name)
+                print('{0} ({1} precision): ok'.format(check.__name__, 'double' if double_precision else 'single'))
+
+
+if __name__ == '__main__':
+    main()
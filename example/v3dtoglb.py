@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+
+from pyv3d import V3DReader
+from pyv3d.v3dglb import write_reader_glb
+
+
+def main():
+    # produce v3d file with
+    # asy -fv3d -prerender 2 -c "import teapot;" -o teapot
+    reader = V3DReader.from_file_name('teapot.v3d', numpy_triangles=True)
+    write_reader_glb(reader, 'teapot.glb')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,3 @@
 #!/usr/bin/env python3
 from .v3dconv import V3DReader
-
+from .v3dwriter import V3DWriter
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# Baking of transform records and billboard centers into the point arrays of columnar scenes
+
+import numpy as np
+from typing import Dict, Optional, Sequence
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import V3DTriangleGroups, V3DTriangleGroupsColor
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray, TY_OBJECT_GROUP
+from pyv3d.v3dbounds import directions
+from pyv3d.v3dtessellate import normalize
+
+# Fields holding points, of shape (N, 3) or (N, k, 3)
+_POINT_FIELDS = ('control_pts', 'path', 'center', 'point')
+
+# Fields scaled with the objects; pixel widths are in screen units and stay
+_LENGTH_FIELDS = ('radius', 'width', 'height')
+
+
+def resolve_centers(center_indices: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Billboard centers (N, 3) of objects; NaN where the center index is 0, i.e. no center."""
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    center_indices = np.asarray(center_indices, dtype=np.int64)
+    resolved = np.full((len(center_indices), 3), np.nan)
+    has = center_indices > 0
+    resolved[has] = centers[center_indices[has] - 1]
+    return resolved
+
+
+def look_at_rotation(eye: Sequence[float], target: Sequence[float],
+                     up: Sequence[float] = (0.0, 1.0, 0.0)) -> np.ndarray:
+    """Rotation (3, 3) from scene to camera axes for a camera at eye looking at target.
+
+    The initial V3D camera looks down -z with +y up, which is the identity.
+    """
+    back = normalize(np.asarray(eye, dtype=np.float64) - np.asarray(target, dtype=np.float64))
+    right = normalize(np.cross(np.asarray(up, dtype=np.float64), back))
+    return np.stack((right, np.cross(back, right), back))
+
+
+def scene_transforms(scene: V3DColumnarScene) -> np.ndarray:
+    """The identity followed by the matrices of the scene's transform records, shape (T + 1, 4, 4)."""
+    transforms = scene.get(v3dtypes.v3dtypes_transform)
+    matrices = np.empty((0, 4, 4)) if transforms is None else transforms.matrix.reshape(-1, 4, 4)
+    return np.concatenate((np.eye(4)[None], matrices))
+
+
+def transform_ids(object_types: np.ndarray) -> np.ndarray:
+    """For each object the number of transform records before it, i.e. its row in scene_transforms.
+
+    A transform record applies to all objects after it up to the next transform record.
+    """
+    is_transform = object_types == v3dtypes.v3dtypes_transform
+    return np.cumsum(is_transform) - is_transform
+
+
+def _matrix_rows(linear: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    # Per-object matrices, or a single one when all objects share it
+    unique = np.unique(ids)
+    if len(unique) == 1:
+        return linear[unique[0]]
+    return linear[ids]
+
+
+def _transform_points(points: np.ndarray, matrices: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    n = len(points)
+    flat = points.reshape(n, -1, 3)
+    linear = _matrix_rows(matrices[:, :3, :3].transpose(0, 2, 1), ids)
+    offset = _matrix_rows(matrices[:, :3, 3], ids)
+    # Row vectors times the transposed linear parts, batched when objects differ in transform
+    out = flat @ linear + (offset if offset.ndim == 1 else offset[:, None])
+    return out.reshape(points.shape)
+
+
+def _billboard_points(points: np.ndarray, centers: np.ndarray, rotation: np.ndarray) -> np.ndarray:
+    # c + R^T (p - c) for row vectors, turning the geometry about its center with the camera
+    flat = points.reshape(len(points), -1, 3)
+    return (centers[:, None] + (flat - centers[:, None]) @ rotation).reshape(points.shape)
+
+
+def _bake_array(objects: V3DObjectArray, matrices: np.ndarray, ids: np.ndarray, centers: Optional[np.ndarray],
+                rotation: Optional[np.ndarray]) -> V3DObjectArray:
+    fields = dict(objects.fields)
+    has_direction = 'polar' in fields
+    axis = directions(fields['polar'], fields['azimuth']) if has_direction else None
+    if len(matrices) > 1 and np.any(ids > 0):
+        linear = matrices[:, :3, :3]
+        for name in _POINT_FIELDS:
+            if name in fields:
+                fields[name] = _transform_points(fields[name], matrices, ids)
+        # Exact for rotations, uniform scales and translations
+        scale = np.cbrt(np.abs(np.linalg.det(linear)))[ids]
+        for name in _LENGTH_FIELDS:
+            if name in fields and (name != 'width' or objects.obj_type != v3dtypes.v3dtypes_pixel):
+                fields[name] = fields[name] * scale
+        if has_direction:
+            axis = np.einsum('nij,nj->ni', linear[ids], axis)
+            length = np.linalg.norm(axis, axis=1)
+            if 'height' in fields:
+                fields['height'] = objects.height * length
+            axis = axis / length[:, None]
+    if rotation is not None and centers is not None:
+        billboard = ~np.isnan(centers[:, 0])
+        if np.any(billboard):
+            for name in _POINT_FIELDS:
+                if name in fields:
+                    points = fields[name].copy()
+                    points[billboard] = _billboard_points(points[billboard], centers[billboard], rotation)
+                    fields[name] = points
+            if has_direction:
+                axis = axis.copy()
+                axis[billboard] = axis[billboard] @ rotation
+    if has_direction:
+        fields['polar'] = np.arccos(np.clip(axis[:, 2], -1.0, 1.0))
+        fields['azimuth'] = np.arctan2(axis[:, 1], axis[:, 0])
+    return V3DObjectArray(objects.obj_type, fields)
+
+
+def _bake_group(group: V3DTriangleGroups, matrix: np.ndarray, centers: np.ndarray,
+                rotation: Optional[np.ndarray]) -> V3DTriangleGroups:
+    positions = np.asarray(group.positions, dtype=np.float64).reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    normals = np.asarray(group.normals, dtype=np.float64).reshape(-1, 3)
+    normals = normalize(normals @ np.linalg.inv(matrix[:3, :3]))
+    if rotation is not None and group.center_index:
+        center = centers[group.center_index - 1]
+        positions = center + (positions - center) @ rotation
+        normals = normals @ rotation
+    if isinstance(group, V3DTriangleGroupsColor):
+        return V3DTriangleGroupsColor(positions, normals, group.colors, group.position_indices,
+                                      group.normals_indices, group.color_indices, group.material_id,
+                                      group.center_index)
+    return V3DTriangleGroups(positions, normals, group.position_indices, group.normals_indices, group.material_id,
+                             group.center_index)
+
+
+def bake_scene(scene: V3DColumnarScene, centers: Optional[np.ndarray] = None,
+               rotation: Optional[np.ndarray] = None, transforms: bool = True) -> V3DColumnarScene:
+    """Returns a scene whose geometry has transforms and, optionally, billboards applied.
+
+    With transforms, the matrix of the last transform record before each object is applied to its
+    points, sizes and axis directions; the transform records are left out of the result. Given
+    centers (e.g. V3DReader.centers) and a camera rotation such as look_at_rotation(...), objects
+    with a center index are turned about their center to face the camera, in scene coordinates
+    after transforming. Each type is handled with a few array operations over all its objects.
+    Sizes follow the cube root of the determinant, which is exact for similarity transforms.
+    Frames of animations are not baked.
+    """
+    matrices = scene_transforms(scene) if transforms else np.eye(4)[None]
+    all_ids = transform_ids(scene.object_types) if transforms else np.zeros(len(scene), dtype=np.int64)
+    centers = None if centers is None else np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    if rotation is not None:
+        rotation = np.asarray(rotation, dtype=np.float64)[:3, :3]
+        if centers is None:
+            raise ValueError('Billboards need the centers of the scene')
+
+    groups: Dict[int, TY_OBJECT_GROUP] = {}
+    for typ, group in scene.groups.items():
+        if transforms and typ == v3dtypes.v3dtypes_transform:
+            continue
+        ids = all_ids[scene.object_types == typ]
+        if isinstance(group, V3DObjectArray):
+            object_centers = None
+            if rotation is not None and 'center_index' in group.fields:
+                object_centers = resolve_centers(group.center_index, centers)
+            groups[typ] = _bake_array(group, matrices, ids, object_centers, rotation)
+        elif typ == v3dtypes.v3dtypes_triangles:
+            groups[typ] = [_bake_group(obj, matrices[i], centers, rotation) for obj, i in zip(group, ids.tolist())]
+        else:
+            groups[typ] = group
+    object_types = scene.object_types
+    if transforms:
+        object_types = object_types[object_types != v3dtypes.v3dtypes_transform]
+    return V3DColumnarScene(groups, object_types)
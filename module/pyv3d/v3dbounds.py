@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# Axis-aligned bounding boxes of V3D objects
+
+import numpy as np
+from typing import List, Union
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import *
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+
+
+def directions(polar: np.ndarray, azimuth: np.ndarray) -> np.ndarray:
+    """Unit vectors (N, 3) of spherical angles, polar angle measured from +z."""
+    sin_polar = np.sin(polar)
+    return np.stack((sin_polar * np.cos(azimuth), sin_polar * np.sin(azimuth), np.cos(polar)), axis=-1)
+
+
+def _box(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    return np.stack((lo, hi), axis=1).astype(np.float64)
+
+
+def _hull_bounds(objects: V3DObjectArray) -> np.ndarray:
+    # Bezier objects lie in the convex hull of their control points
+    return _box(objects.control_pts.min(axis=1), objects.control_pts.max(axis=1))
+
+
+def _sphere_bounds(objects: V3DObjectArray) -> np.ndarray:
+    radius = objects.radius[:, None]
+    return _box(objects.center - radius, objects.center + radius)
+
+
+def _disk_extent(radius: np.ndarray, axis: np.ndarray) -> np.ndarray:
+    # Half extent along each coordinate of a circle of the given radius perpendicular to axis
+    return radius[:, None] * np.sqrt(np.clip(1 - axis ** 2, 0.0, 1.0))
+
+
+def _half_sphere_bounds(objects: V3DObjectArray) -> np.ndarray:
+    axis = directions(objects.polar, objects.azimuth)
+    radius = objects.radius[:, None]
+    rim = _disk_extent(objects.radius, axis)
+    # The dome reaches the full radius on the side the axis points to and the rim on the other
+    lo = objects.center - np.where(axis < 0, radius, rim)
+    hi = objects.center + np.where(axis > 0, radius, rim)
+    return _box(lo, hi)
+
+
+def _cylinder_bounds(objects: V3DObjectArray) -> np.ndarray:
+    axis = directions(objects.polar, objects.azimuth)
+    top = objects.center + objects.height[:, None] * axis
+    rim = _disk_extent(objects.radius, axis)
+    return _box(np.minimum(objects.center, top) - rim, np.maximum(objects.center, top) + rim)
+
+
+def _disk_bounds(objects: V3DObjectArray) -> np.ndarray:
+    rim = _disk_extent(objects.radius, directions(objects.polar, objects.azimuth))
+    return _box(objects.center - rim, objects.center + rim)
+
+
+def _tube_bounds(objects: V3DObjectArray) -> np.ndarray:
+    half_width = 0.5 * objects.width[:, None]
+    return _box(objects.path.min(axis=1) - half_width, objects.path.max(axis=1) + half_width)
+
+
+def _pixel_bounds(objects: V3DObjectArray) -> np.ndarray:
+    # Pixel widths are in screen units; only the point itself is bounded
+    return _box(objects.point, objects.point)
+
+
+def _empty_bounds(objects: V3DObjectArray) -> np.ndarray:
+    # Transforms and element markers have no extent; their boxes overlap nothing
+    n = len(objects)
+    return _box(np.full((n, 3), np.inf), np.full((n, 3), -np.inf))
+
+
+_bounds_fns = {
+    v3dtypes.v3dtypes_bezierPatch: _hull_bounds,
+    v3dtypes.v3dtypes_bezierPatchColor: _hull_bounds,
+    v3dtypes.v3dtypes_bezierTriangle: _hull_bounds,
+    v3dtypes.v3dtypes_bezierTriangleColor: _hull_bounds,
+    v3dtypes.v3dtypes_quad: _hull_bounds,
+    v3dtypes.v3dtypes_quadColor: _hull_bounds,
+    v3dtypes.v3dtypes_triangle: _hull_bounds,
+    v3dtypes.v3dtypes_triangleColor: _hull_bounds,
+    v3dtypes.v3dtypes_curve: _hull_bounds,
+    v3dtypes.v3dtypes_line: _hull_bounds,
+    v3dtypes.v3dtypes_sphere: _sphere_bounds,
+    v3dtypes.v3dtypes_halfSphere: _half_sphere_bounds,
+    v3dtypes.v3dtypes_cylinder: _cylinder_bounds,
+    v3dtypes.v3dtypes_disk: _disk_bounds,
+    v3dtypes.v3dtypes_tube: _tube_bounds,
+    v3dtypes.v3dtypes_pixel: _pixel_bounds,
+    v3dtypes.v3dtypes_lineColor: _hull_bounds,
+    v3dtypes.v3dtypes_curveColor: _hull_bounds,
+    v3dtypes.v3dtypes_transform: _empty_bounds,
+    v3dtypes.v3dtypes_element: _empty_bounds,
+}
+
+
+def triangle_group_bounds(groups: List[V3DTriangleGroups]) -> np.ndarray:
+    boxes = np.empty((len(groups), 2, 3))
+    for i, group in enumerate(groups):
+        positions = np.asarray(group.positions, dtype=np.float64).reshape(-1, 3)
+        boxes[i] = (positions.min(axis=0), positions.max(axis=0)) if len(positions) else (np.inf, -np.inf)
+    return boxes
+
+
+def has_bounds(obj_type: int) -> bool:
+    """Whether object_bounds supports objects of the given v3dtypes code."""
+    return obj_type in _bounds_fns or obj_type == v3dtypes.v3dtypes_triangles
+
+
+def object_bounds(objects: Union[V3DObjectArray, List[V3DTriangleGroups]]) -> np.ndarray:
+    """Boxes (N, 2, 3) holding the minimum and maximum corner of each object."""
+    if isinstance(objects, V3DObjectArray):
+        if objects.obj_type not in _bounds_fns:
+            raise ValueError('No bounds for objects of type {0}'.format(objects.obj_type))
+        return _bounds_fns[objects.obj_type](objects)
+    return triangle_group_bounds(objects)
+
+
+def scene_bounds(scene: V3DColumnarScene) -> np.ndarray:
+    """Boxes of all objects of a columnar scene in file order, shape (len(scene), 2, 3).
+
+    Records without geometry of their own, such as animations, get empty boxes.
+    """
+    boxes = np.empty((len(scene), 2, 3))
+    boxes[:, 0], boxes[:, 1] = np.inf, -np.inf
+    for typ, group in scene.groups.items():
+        if has_bounds(typ):
+            boxes[scene.object_types == typ] = object_bounds(group)
+    return boxes
+
+
+def union_bounds(boxes: np.ndarray) -> np.ndarray:
+    """Box (2, 3) enclosing all boxes."""
+    return np.stack((boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)))
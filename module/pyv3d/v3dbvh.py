@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# Bounding volume hierarchy over axis-aligned boxes with batched queries
+
+import numpy as np
+from typing import Tuple
+from pyv3d.v3dcolumnar import V3DColumnarScene
+from pyv3d.v3dbounds import scene_bounds
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + count) over all ranges."""
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+def _area(boxes: np.ndarray) -> np.ndarray:
+    extent = np.maximum(boxes[..., 1, :] - boxes[..., 0, :], 0.0)
+    return extent[..., 0] * extent[..., 1] + extent[..., 1] * extent[..., 2] + extent[..., 2] * extent[..., 0]
+
+
+class V3DBVH:
+    """Binary tree of boxes built with binned surface area heuristic splits.
+
+    Nodes are stored as arrays: ``boxes`` (M,2,3), ``children`` (M,2) with -1 for leaves, and
+    ``starts``/``counts`` giving each leaf's range in ``order``, the permutation of the input
+    boxes. The tree is built one depth level at a time, with all nodes of a level binned and
+    split together, and every query walks it the same way for a whole batch.
+    """
+
+    def __init__(self, boxes: np.ndarray, children: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                 order: np.ndarray, primitive_boxes: np.ndarray):
+        self.boxes = boxes
+        self.children = children
+        self.starts = starts
+        self.counts = counts
+        self.order = order
+        self.primitive_boxes = primitive_boxes
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.boxes)
+
+    @classmethod
+    def build(cls, boxes: np.ndarray, leaf_size: int = 4, bins: int = 16) -> 'V3DBVH':
+        """Builds the tree over boxes (N,2,3); boxes that are empty or not finite are never returned by queries."""
+        primitive_boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3)
+        # Empty or non-finite boxes, e.g. of records without geometry, are left out of the tree
+        valid = np.all(np.isfinite(primitive_boxes), axis=(1, 2)) & \
+            np.all(primitive_boxes[:, 0] <= primitive_boxes[:, 1], axis=1)
+        order = np.flatnonzero(valid)
+        n = len(order)
+        centroids = np.zeros((len(primitive_boxes), 3))
+        centroids[order] = primitive_boxes[order].mean(axis=1)
+
+        node_boxes, node_children, node_starts, node_counts = [], [], [], []
+        # Nodes of the current level as ranges of order, with their index in the node arrays
+        level_starts, level_counts = np.array([0]), np.array([n])
+        num_nodes = 1
+        while len(level_starts):
+            nonempty = level_counts > 0
+            members = order[_expand_ranges(level_starts, level_counts)]
+            boxes_of = np.empty((len(level_starts), 2, 3))
+            boxes_of[:] = [[np.inf] * 3, [-np.inf] * 3]
+            if len(members):
+                offsets = (np.cumsum(level_counts) - level_counts)[nonempty]
+                boxes_of[nonempty, 0] = np.minimum.reduceat(primitive_boxes[members, 0], offsets)
+                boxes_of[nonempty, 1] = np.maximum.reduceat(primitive_boxes[members, 1], offsets)
+            node_boxes.append(boxes_of)
+            node_starts.append(level_starts.copy())
+            node_counts.append(level_counts.copy())
+            children = np.full((len(level_starts), 2), -1, dtype=np.int64)
+            node_children.append(children)
+
+            split = level_counts > leaf_size
+            if not split.any():
+                break
+            nodes = np.flatnonzero(split)
+            go_left, left_counts = cls._binned_splits(primitive_boxes, centroids, order, level_starts[nodes],
+                                                      level_counts[nodes], bins)
+            # Stable partition of every split range into its left and right parts
+            ranges = _expand_ranges(level_starts[nodes], level_counts[nodes])
+            node_of = np.repeat(np.arange(len(nodes)), level_counts[nodes])
+            order[ranges] = order[ranges][np.argsort(2 * node_of + ~go_left, kind='stable')]
+
+            # Leaves in this level keep their ranges; split nodes turn into two children
+            children[nodes, 0] = num_nodes + 2 * np.arange(len(nodes))
+            children[nodes, 1] = children[nodes, 0] + 1
+            node_counts[-1][nodes] = 0
+            num_nodes += 2 * len(nodes)
+            level_starts = np.stack((level_starts[nodes], level_starts[nodes] + left_counts), axis=1).ravel()
+            level_counts = np.stack((left_counts, level_counts[nodes] - left_counts), axis=1).ravel()
+
+        return cls(np.concatenate(node_boxes), np.concatenate(node_children), np.concatenate(node_starts),
+                   np.concatenate(node_counts), order, primitive_boxes)
+
+    @classmethod
+    def from_scene(cls, scene: V3DColumnarScene, leaf_size: int = 4, bins: int = 16) -> 'V3DBVH':
+        """BVH over all objects of a columnar scene; primitive indices are positions in file order."""
+        return cls.build(scene_bounds(scene), leaf_size, bins)
+
+    @staticmethod
+    def _binned_splits(primitive_boxes: np.ndarray, centroids: np.ndarray, order: np.ndarray, starts: np.ndarray,
+                       counts: np.ndarray, bins: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Chooses the binned split of each node with the lowest surface area cost over all three axes.
+
+        Returns for every member whether it goes left, and the left count of every node.
+        """
+        num_nodes = len(starts)
+        members = order[_expand_ranges(starts, counts)]
+        node_of = np.repeat(np.arange(num_nodes), counts)
+        points = centroids[members]
+        member_lo, member_hi = primitive_boxes[members, 0], primitive_boxes[members, 1]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        lo = np.minimum.reduceat(points, offsets)
+        hi = np.maximum.reduceat(points, offsets)
+        extent = hi - lo
+        scale = np.divide(bins * (1 - 1e-9), extent, out=np.zeros_like(extent), where=extent > 0)
+        bin_of = ((points - lo[node_of]) * scale[node_of]).astype(np.int64)
+
+        best_cost = np.full(num_nodes, np.inf)
+        best_axis = np.zeros(num_nodes, dtype=np.int64)
+        best_bin = np.zeros(num_nodes, dtype=np.int64)
+        for axis in range(3):
+            keys = node_of * bins + bin_of[:, axis]
+            bin_counts = np.bincount(keys, minlength=num_nodes * bins).reshape(num_nodes, bins)
+            # Bin boxes by reducing runs of equal keys, which is much faster than ufunc.at
+            by_key = np.argsort(keys, kind='stable')
+            sorted_keys = keys[by_key]
+            runs = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            bin_boxes = np.empty((num_nodes * bins, 2, 3))
+            bin_boxes[:, 0], bin_boxes[:, 1] = np.inf, -np.inf
+            bin_boxes[sorted_keys[runs], 0] = np.minimum.reduceat(member_lo[by_key], runs)
+            bin_boxes[sorted_keys[runs], 1] = np.maximum.reduceat(member_hi[by_key], runs)
+            bin_boxes = bin_boxes.reshape(num_nodes, bins, 2, 3)
+
+            # Left side covers bins [0, k], right side bins (k, bins)
+            left = bin_boxes.copy()
+            left[:, :, 0] = np.minimum.accumulate(left[:, :, 0], axis=1)
+            left[:, :, 1] = np.maximum.accumulate(left[:, :, 1], axis=1)
+            right = bin_boxes[:, ::-1].copy()
+            right[:, :, 0] = np.minimum.accumulate(right[:, :, 0], axis=1)
+            right[:, :, 1] = np.maximum.accumulate(right[:, :, 1], axis=1)
+            right = right[:, ::-1]
+            left_n = np.cumsum(bin_counts, axis=1)[:, :-1]
+            right_n = counts[:, None] - left_n
+            cost = _area(left[:, :-1]) * left_n + _area(right[:, 1:]) * right_n
+            cost = np.where((left_n > 0) & (right_n > 0), cost, np.inf)
+            k = np.argmin(cost, axis=1)
+            axis_cost = cost[np.arange(num_nodes), k]
+            better = axis_cost < best_cost
+            best_cost[better], best_axis[better], best_bin[better] = axis_cost[better], axis, k[better]
+
+        go_left = np.take_along_axis(bin_of, best_axis[node_of, None], axis=1)[:, 0] <= best_bin[node_of]
+
+        # Nodes whose centroids coincide cannot be binned; they are halved in order instead
+        degenerate = ~np.isfinite(best_cost)
+        if degenerate.any():
+            rank = np.arange(len(members)) - offsets[node_of]
+            halves = rank < (counts[node_of] // 2)
+            go_left = np.where(degenerate[node_of], halves, go_left)
+        left_counts = np.bincount(node_of, weights=go_left, minlength=num_nodes).astype(np.int64)
+        return go_left, left_counts
+
+    def _walk(self, num_queries: int, hits) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs (query, primitive) of leaves reached; hits(queries, nodes) tests query/node pairs."""
+        queries = np.arange(num_queries)
+        nodes = np.zeros(num_queries, dtype=np.int64)
+        found_queries, found_primitives = [], []
+        while len(queries):
+            keep = hits(queries, nodes)
+            queries, nodes = queries[keep], nodes[keep]
+            leaf = self.children[nodes, 0] < 0
+            counts = self.counts[nodes[leaf]]
+            found_queries.append(np.repeat(queries[leaf], counts))
+            found_primitives.append(self.order[_expand_ranges(self.starts[nodes[leaf]], counts)])
+            queries = np.repeat(queries[~leaf], 2)
+            nodes = self.children[nodes[~leaf]].ravel()
+        if not found_queries:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(found_queries), np.concatenate(found_primitives)
+
+    def query_boxes(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs (query index, primitive index) of overlapping query and primitive boxes."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3)
+        if not len(self.order):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        def overlap(lo_a, hi_a, lo_b, hi_b):
+            return np.all((lo_a <= hi_b) & (lo_b <= hi_a), axis=-1)
+
+        queries, primitives = self._walk(len(boxes), lambda q, n: overlap(
+            boxes[q, 0], boxes[q, 1], self.boxes[n, 0], self.boxes[n, 1]))
+        exact = overlap(boxes[queries, 0], boxes[queries, 1], self.primitive_boxes[primitives, 0],
+                        self.primitive_boxes[primitives, 1])
+        return queries[exact], primitives[exact]
+
+    def query_box(self, lo, hi) -> np.ndarray:
+        """Sorted indices of the primitives overlapping the box [lo, hi]."""
+        return np.sort(self.query_boxes(np.array([[lo, hi]], dtype=np.float64))[1])
+
+    @staticmethod
+    def _slabs(origins: np.ndarray, directions: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Parameter interval of each ray inside each box
+        parallel = directions == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t0 = (boxes[:, 0] - origins) / directions
+            t1 = (boxes[:, 1] - origins) / directions
+        # A ray parallel to a slab is either inside it for all t or for none
+        inside = (boxes[:, 0] <= origins) & (origins <= boxes[:, 1])
+        near = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1))
+        far = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1))
+        return near.max(axis=1), far.min(axis=1)
+
+    def intersect_rays(self, origins: np.ndarray, directions: np.ndarray,
+                       max_t: float = np.inf) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Triples (ray index, primitive index, entry t) of rays hitting primitive boxes within [0, max_t]."""
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        if not len(self.order):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+        def hit(rays, boxes):
+            near, far = self._slabs(origins[rays], directions[rays], boxes)
+            return (near <= far) & (far >= 0) & (near <= max_t), np.maximum(near, 0.0)
+
+        rays, primitives = self._walk(len(origins), lambda q, n: hit(q, self.boxes[n])[0])
+        exact, t = hit(rays, self.primitive_boxes[primitives])
+        return rays[exact], primitives[exact], t[exact]
+
+    def closest_hits(self, origins: np.ndarray, directions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """For each ray the primitive whose box it enters first (-1 if none) and the entry t."""
+        rays, primitives, t = self.intersect_rays(origins, directions)
+        closest = np.full(len(np.asarray(origins).reshape(-1, 3)), -1, dtype=np.int64)
+        entry = np.full(len(closest), np.inf)
+        by_t = np.lexsort((t, rays))
+        first = by_t[np.r_[True, rays[by_t][1:] != rays[by_t][:-1]]] if len(rays) else by_t
+        closest[rays[first]] = primitives[first]
+        entry[rays[first]] = t[first]
+        return closest, entry
+
+    def query_frustum(self, planes: np.ndarray) -> np.ndarray:
+        """Sorted indices of primitives not entirely outside one of planes (P,4).
+
+        A plane (a, b, c, d) keeps the points with a*x + b*y + c*z + d >= 0. The test is
+        conservative: boxes straddling two planes outside a frustum corner are kept.
+        """
+        planes = np.asarray(planes, dtype=np.float64).reshape(-1, 4)
+        if not len(self.order):
+            return np.empty(0, dtype=np.int64)
+
+        def inside(boxes):
+            # Corner of each box furthest along each plane normal
+            corners = np.where(planes[None, :, :3] >= 0, boxes[:, None, 1], boxes[:, None, 0])
+            return np.all(np.einsum('npi,pi->np', corners, planes[:, :3]) + planes[:, 3] >= 0, axis=1)
+
+        _, primitives = self._walk(1, lambda q, n: inside(self.boxes[n]))
+        return np.sort(primitives[inside(self.primitive_boxes[primitives])])
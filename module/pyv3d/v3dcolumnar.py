@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# Columnar (structure-of-arrays) representation of V3D scenes
+
+import numpy as np
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dlayouts import record_dtype
+from pyv3d.v3dobjects import *
+
+
+def _ctrl(cls):
+    return lambda f, i: cls(f['control_pts'][i], int(f['material_id'][i]), int(f['center_index'][i]))
+
+
+def _ctrl_color(cls):
+    return lambda f, i: cls(f['control_pts'][i], f['colors'][i], int(f['material_id'][i]), int(f['center_index'][i]))
+
+
+_object_factories: Dict[int, Callable[[Dict[str, np.ndarray], int], AV3Dobject]] = {
+    v3dtypes.v3dtypes_bezierPatch: _ctrl(V3DBezierPatch),
+    v3dtypes.v3dtypes_bezierPatchColor: _ctrl_color(V3DBezierPatchColor),
+    v3dtypes.v3dtypes_bezierTriangle: _ctrl(V3DBezierTriangle),
+    v3dtypes.v3dtypes_bezierTriangleColor: _ctrl_color(V3DBezierTriangleColor),
+    v3dtypes.v3dtypes_quad: _ctrl(V3DStraightBezierPatch),
+    v3dtypes.v3dtypes_quadColor: _ctrl_color(V3DStraightBezierPatchColor),
+    v3dtypes.v3dtypes_triangle: _ctrl(V3DStraightBezierTriangle),
+    v3dtypes.v3dtypes_triangleColor: _ctrl_color(V3DStraightBezierTriangleColor),
+    v3dtypes.v3dtypes_sphere: lambda f, i: V3DSphere(
+        f['center'][i], float(f['radius'][i]), int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_halfSphere: lambda f, i: V3DHalfSphere(
+        f['center'][i], float(f['radius'][i]), float(f['polar'][i]), float(f['azimuth'][i]),
+        int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_cylinder: lambda f, i: V3DCylinder(
+        f['center'][i], float(f['radius'][i]), float(f['height'][i]), float(f['polar'][i]),
+        float(f['azimuth'][i]), bool(f['core'][i]), int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_disk: lambda f, i: V3DDisk(
+        f['center'][i], float(f['radius'][i]), float(f['polar'][i]), float(f['azimuth'][i]),
+        int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_tube: lambda f, i: V3DTube(
+        *f['path'][i], float(f['width'][i]), bool(f['core'][i]), int(f['material_id'][i]),
+        int(f['center_index'][i])),
+    v3dtypes.v3dtypes_curve: lambda f, i: V3DCurve(
+        *f['control_pts'][i], int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_line: lambda f, i: V3DLine(
+        *f['control_pts'][i], int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_pixel: lambda f, i: V3DPixel(
+        f['point'][i], float(f['width'][i]), int(f['material_id'][i]), None),
+    v3dtypes.v3dtypes_lineColor: lambda f, i: V3DLineColor(
+        *f['control_pts'][i], f['colors'][i], int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_curveColor: lambda f, i: V3DCurveColor(
+        *f['control_pts'][i], f['colors'][i], int(f['material_id'][i]), int(f['center_index'][i])),
+    v3dtypes.v3dtypes_transform: lambda f, i: V3DTransform(f['matrix'][i]),
+    v3dtypes.v3dtypes_element: lambda f, i: V3DElement(int(f['element_id'][i])),
+}
+
+
+class V3DObjectArray:
+    """All objects of one fixed-size type, stored as one contiguous array per field.
+
+    Fields are reachable as attributes, e.g. ``patches.control_pts`` is an (N,16,3) array and
+    ``spheres.radius`` an (N,) array. Indexing builds the usual v3dobjects instance whose point
+    data are views into these arrays.
+    """
+
+    def __init__(self, obj_type: int, fields: Dict[str, np.ndarray]):
+        self.obj_type = obj_type
+        self.fields = fields
+
+    @classmethod
+    def from_records(cls, obj_type: int, records: np.ndarray) -> 'V3DObjectArray':
+        fields = {}
+        for name in records.dtype.names:
+            column = records[name]
+            if name == 'core':
+                fields[name] = column != 0
+            else:
+                fields[name] = column.astype(column.dtype.base.newbyteorder('='))
+        return cls(obj_type, fields)
+
+    @classmethod
+    def from_bytes(cls, obj_type: int, data, double_precision: bool = True) -> 'V3DObjectArray':
+        return cls.from_records(obj_type, np.frombuffer(data, dtype=record_dtype(obj_type, double_precision)))
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        try:
+            return self.__dict__['fields'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self) -> int:
+        return len(next(iter(self.fields.values())))
+
+    def __getitem__(self, i: int) -> AV3Dobject:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('object index out of range')
+        return _object_factories[self.obj_type](self.fields, i)
+
+    def __iter__(self) -> Iterator[AV3Dobject]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def slice(self, start: int, stop: int) -> 'V3DObjectArray':
+        """Objects start to stop as an array whose fields are views into these."""
+        return V3DObjectArray(self.obj_type, {name: column[start:stop] for name, column in self.fields.items()})
+
+
+TY_OBJECT_GROUP = Union[V3DObjectArray, List[AV3Dobject]]
+
+
+class V3DColumnarScene:
+    """Objects of a V3D file grouped by type.
+
+    ``groups`` maps each v3dtypes code to a V3DObjectArray; triangle groups, whose size varies,
+    are kept as a list of objects decoded into NumPy arrays. ``object_types`` records the type of
+    every object in file order so the scene can still be iterated sequentially.
+    """
+
+    def __init__(self, groups: Dict[int, TY_OBJECT_GROUP], object_types: np.ndarray):
+        self.groups = groups
+        self.object_types = object_types
+
+        self._local_index = np.empty(len(object_types), dtype=np.int64)
+        for typ in groups:
+            mask = object_types == typ
+            self._local_index[mask] = np.arange(np.count_nonzero(mask))
+
+    def __len__(self) -> int:
+        return len(self.object_types)
+
+    def __getitem__(self, i: int) -> AV3Dobject:
+        return self.groups[int(self.object_types[i])][int(self._local_index[i])]
+
+    def __iter__(self) -> Iterator[AV3Dobject]:
+        for typ, local in zip(self.object_types.tolist(), self._local_index.tolist()):
+            yield self.groups[typ][local]
+
+    def get(self, typ: int) -> Optional[TY_OBJECT_GROUP]:
+        return self.groups.get(typ, None)
+
+    def runs(self) -> Iterator[Tuple[int, int, int]]:
+        """(type, start, stop) for each run of consecutive objects of one type in file order.
+
+        start and stop are positions within the group of that type.
+        """
+        types = self.object_types
+        if len(types) == 0:
+            return
+        bounds = (np.flatnonzero(types[1:] != types[:-1]) + 1).tolist()
+        for first, end in zip([0] + bounds, bounds + [len(types)]):
+            local = int(self._local_index[first])
+            yield int(types[first]), local, local + end - first
+
+    @classmethod
+    def from_offsets(cls, buffer, object_types: Sequence[int], record_offsets: Dict[int, List[int]],
+                     triangle_groups: List[AV3Dobject], double_precision: bool = True,
+                     object_lists: Optional[Dict[int, List[AV3Dobject]]] = None) -> 'V3DColumnarScene':
+        """Gathers fixed-size records at the given offsets into arrays; other records come decoded.
+
+        Triangle groups, and any further variable-size records in object_lists, are kept as lists.
+        """
+        view = memoryview(buffer)
+        groups: Dict[int, TY_OBJECT_GROUP] = {}
+        for typ, offsets in record_offsets.items():
+            size = record_dtype(typ, double_precision).itemsize
+            data = b''.join([view[offset:offset + size] for offset in offsets])
+            groups[typ] = V3DObjectArray.from_bytes(typ, data, double_precision)
+        if triangle_groups:
+            groups[v3dtypes.v3dtypes_triangles] = triangle_groups
+        if object_lists:
+            groups.update(object_lists)
+        return cls(groups, np.asarray(object_types, dtype=np.uint32))
@@ -1,21 +1,90 @@
 #!/usr/bin/env python3
 
 import gzip
-from typing import Callable
+import mmap
+import os
+import struct
+import time
+import warnings
+import numpy as np
+from typing import Any, Callable, Dict, Iterator, Tuple
 from pyv3d.xdrlib import Unpacker
 from pyv3d.v3dtypes import v3dtypes
 from pyv3d.v3dheadertypes import v3dheadertypes
 from pyv3d.v3dobjects import *
+from pyv3d.v3dlayouts import v3dfixed_object_types, record_sizes, record_structs
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+from pyv3d.v3dstream import StreamUnpacker
+from pyv3d.v3dindex import V3DObjectIndex, index_sidecar, v3dnonobject_types
+from pyv3d.v3dlazy import V3DDecodeCache, V3DLazyObject, V3DAnimationFrames
+from pyv3d.v3dprofile import V3DReaderStats, TY_RECORD_HOOK, instrument
+
+def _triples(values: tuple, start: int, n: int) -> Tuple[TY_TRIPLE, ...]:
+    it = iter(values[start:start + 3 * n])
+    return tuple(zip(it, it, it))
+
+
+def _rgbas(values: tuple, start: int, n: int) -> Tuple[TY_RGBA, ...]:
+    it = iter(values[start:start + 4 * n])
+    return tuple(zip(it, it, it, it))
+
+
+def _as_buffer(data) -> Optional[memoryview]:
+    try:
+        return memoryview(data).cast('B')
+    except TypeError:
+        return None
+
+
+def decompress_to_raw(file_name: str, raw_name: Optional[str] = None, chunk_size: int = 1 << 24) -> str:
+    """Inflates a V3D file once into a .v3d.raw file suitable for V3DReader.from_file_name(raw=True)."""
+    if raw_name is None:
+        raw_name = file_name + '.raw'
+    with gzip.open(file_name, 'rb') as fil, open(raw_name, 'wb') as out:
+        while chunk := fil.read(chunk_size):
+            out.write(chunk)
+    return raw_name
+
+
+class V3DScan:
+    """What V3DReader.scan found: the preamble, the header and the number of records of each type."""
+
+    def __init__(self, file_version: int, double_precision: bool, header: Optional[V3DHeaderInformation],
+                 counts: Dict[int, int], num_centers: int, scanned_bytes: int, complete: bool):
+        self.file_version = file_version
+        self.double_precision = double_precision
+        self.header = header
+        self.counts = counts
+        self.num_centers = num_centers
+        # Decompressed bytes read, and whether that was the whole stream
+        self.scanned_bytes = scanned_bytes
+        self.complete = complete
+
 
 class V3DReader:
-    def __init__(self, fil: gzip.GzipFile):
+    def __init__(self, fil: Union[gzip.GzipFile, bytes, bytearray, memoryview, mmap.mmap], numpy_triangles: bool = False, columnar: bool = False,
+                 stream: bool = False, lazy: bool = False, cache_size: int = 1024, stats: bool = False,
+                 hook: Optional[TY_RECORD_HOOK] = None, tolerant: bool = False,
+                 unknown_sizes: Optional[Dict[int, int]] = None, chunk_size: int = 1 << 20):
         self._objects: List[AV3Dobject] = []
         self._materials: List[V3DMaterial] = []
         self._centers: List[TY_TRIPLE] = []
         self._header: V3DHeaderInformation = V3DHeaderInformation()
+        self._columnar_mode: bool = columnar
+        self._columnar: Optional[V3DColumnarScene] = None
+        self._index: Optional[V3DObjectIndex] = None
+        self._stats: Optional[V3DReaderStats] = V3DReaderStats() if stats or hook is not None else None
 
         self._file_ver: Optional[int] = None
+        # Payload sizes of record types without a decoder, which are skipped
+        self._unknown_sizes: Dict[int, int] = dict(unknown_sizes or {})
+        self._tolerant: bool = tolerant
+        self._skipped: Dict[int, int] = {}
         self._processed: bool = False
+        self._numpy_triangles: bool = numpy_triangles
+        # Reader options frames of animations are decoded with
+        self._frame_options = dict(numpy_triangles=numpy_triangles, tolerant=tolerant,
+                                   unknown_sizes=self._unknown_sizes)
 
         self._object_process_fns: dict[int, Callable[[], AV3Dobject]] = {
             v3dtypes.v3dtypes_bezierPatch: self.process_bezierpatch,
@@ -34,18 +103,119 @@ class V3DReader:
             v3dtypes.v3dtypes_curve: self.process_curve,
             v3dtypes.v3dtypes_line: self.process_line,
             v3dtypes.v3dtypes_pixel: self.process_pixel,
-            v3dtypes.v3dtypes_triangles: self.process_triangles
+            v3dtypes.v3dtypes_triangles: self.process_triangles,
+            v3dtypes.v3dtypes_lineColor: self.process_line_color,
+            v3dtypes.v3dtypes_curveColor: self.process_curve_color,
+            v3dtypes.v3dtypes_transform: self.process_transform,
+            v3dtypes.v3dtypes_element: self.process_element,
+            v3dtypes.v3dtypes_animation: self.process_animation,
         }
 
-        self._xdrfile = Unpacker(fil.read())
+        if numpy_triangles or columnar:
+            self._object_process_fns[v3dtypes.v3dtypes_triangles] = self.process_triangles_numpy
+
+        if lazy and columnar:
+            raise ValueError('Lazy and columnar mode cannot be combined')
+        if stream:
+            if columnar or lazy:
+                raise ValueError('Columnar and lazy mode need the whole file in memory')
+            self._xdrfile = StreamUnpacker(fil, chunk_size)
+        else:
+            # Reads go through a memoryview so that block reads slice the data without copying it
+            start = time.perf_counter()
+            buffer = _as_buffer(fil)
+            if buffer is None:
+                buffer = memoryview(fil.read())
+            self._xdrfile = Unpacker(buffer)
+            if self._stats is not None:
+                self._stats.inflate_seconds = time.perf_counter() - start
+                self._stats.inflated_bytes = len(buffer)
+        self._stream: bool = stream
+        self._lazy: bool = lazy
+        self._decode_cache = V3DDecodeCache(cache_size)
         self.unpack_double: Callable[[], float] = self._xdrfile.unpack_double
+        self._real_dtype: np.dtype = np.dtype('>f8')
+        self._record_sizes: dict[int, int] = {}
+        self._record_structs = record_structs(True)
+
+        if self._stats is not None:
+            self._instrument(hook)
+
+    def _instrument(self, hook: Optional[TY_RECORD_HOOK]):
+        # Only instrumented readers pay for timing: the decoding functions are replaced by wrappers
+        position = self._xdrfile.get_position
+        for typ, fn in self._object_process_fns.items():
+            self._object_process_fns[typ] = instrument(fn, typ, self._stats, position, hook)
+        self.process_material = instrument(self.process_material, v3dtypes.v3dtypes_material, self._stats,
+                                           position, hook)
+        self.process_centers = instrument(self.process_centers, v3dtypes.v3dtypes_centers, self._stats,
+                                          position, hook)
+        self.process_header = instrument(self.process_header, v3dtypes.v3dtypes_header, self._stats, position, hook)
 
     @classmethod
-    def from_file_name(cls, file_name: str):
-        with gzip.open(file_name, 'rb') as fil:
-            reader_obj = cls(fil)
+    def from_file_name(cls, file_name: str, numpy_triangles: bool = False, columnar: bool = False,
+                       sidecar_index: bool = False, raw: bool = False, lazy: bool = False, cache_size: int = 1024,
+                       stats: bool = False, hook: Optional[TY_RECORD_HOOK] = None, tolerant: bool = False,
+                       unknown_sizes: Optional[Dict[int, int]] = None):
+        """Opens a gzipped V3D file, or with raw=True memory-maps an already decompressed one.
+
+        With stats=True, or when a hook is given, the reader records where its time goes; see
+        V3DReader.stats. With tolerant=True records of unknown type are skipped instead of failing
+        the load; see V3DReader.skipped.
+        """
+        options = dict(lazy=lazy, cache_size=cache_size, stats=stats, hook=hook, tolerant=tolerant,
+                       unknown_sizes=unknown_sizes)
+        if raw:
+            with open(file_name, 'rb') as fil:
+                mapped = mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ)
+            reader_obj = cls(mapped, numpy_triangles, columnar, **options)
+        else:
+            with gzip.open(file_name, 'rb') as fil:
+                reader_obj = cls(fil, numpy_triangles, columnar, **options)
+                if reader_obj._stats is not None:
+                    reader_obj._stats.compressed_bytes = os.path.getsize(file_name)
+
+        if sidecar_index:
+            # Reuse the index stored next to the file unless the file changed since it was written, or the
+            # index was written in another format
+            index_name = index_sidecar(file_name)
+            index = None
+            if os.path.exists(index_name):
+                try:
+                    index = V3DObjectIndex.load(index_name)
+                except ValueError:
+                    index = None
+                if index is not None and not index.matches(file_name):
+                    index = None
+            if index is None:
+                index = reader_obj.build_index()
+                index.stamp(file_name)
+                index.save(index_name)
+            reader_obj.set_index(index)
         return reader_obj
 
+    @classmethod
+    def iter_file(cls, file_name: str, numpy_triangles: bool = False) -> Iterator[Tuple[int, Any]]:
+        with gzip.open(file_name, 'rb') as fil:
+            yield from cls(fil, numpy_triangles, stream=True).iter_objects()
+
+    @property
+    def raw_buffer(self) -> memoryview:
+        """The decompressed stream the reader decodes from."""
+        if self._stream:
+            raise RuntimeError('A streamed reader does not keep its data')
+        return self._xdrfile.get_buffer()
+
+    @property
+    def stats(self) -> Optional[V3DReaderStats]:
+        """Inflate time and per-type decode counts, times and bytes; None unless enabled."""
+        return self._stats
+
+    @property
+    def skipped(self) -> Dict[int, int]:
+        """Number of records skipped per unknown type."""
+        return self._skipped
+
     @property
     def processed(self) -> bool:
         return self._processed
@@ -58,8 +228,35 @@ class V3DReader:
     @property
     def objects(self) -> List[AV3Dobject]:
         self.process()
+        if self._columnar is not None:
+            return list(self._columnar)
         return self._objects
 
+    @property
+    def numpy_triangles(self) -> bool:
+        """Whether triangle groups are decoded into NumPy arrays."""
+        return self._numpy_triangles
+
+    @property
+    def lazy_mode(self) -> bool:
+        return self._lazy
+
+    @property
+    def decode_cache(self) -> V3DDecodeCache:
+        """Payloads decoded through the handles of lazy mode, most recently used last."""
+        return self._decode_cache
+
+    @property
+    def columnar_mode(self) -> bool:
+        return self._columnar_mode
+
+    @property
+    def columnar(self) -> V3DColumnarScene:
+        if not self._columnar_mode:
+            raise RuntimeError('Reader was not created in columnar mode')
+        self.process()
+        return self._columnar
+
     @property
     def materials(self) -> List[V3DMaterial]:
         self.process()
@@ -75,6 +272,15 @@ class V3DReader:
         self.process()
         return self._file_ver
 
+    @property
+    def index(self) -> V3DObjectIndex:
+        if self._index is None:
+            self.build_index()
+        return self._index
+
+    def set_index(self, index: V3DObjectIndex):
+        self._index = index
+
     def get_obj_type(self) -> Optional[int]:
         try:
             typ = self._xdrfile.unpack_uint()  # XDR does not support short
@@ -122,6 +328,18 @@ class V3DReader:
             final_list.append(self.unpack_rgba_float())
         return final_list
 
+    def unpack_array(self, dtype: np.dtype, n: int) -> np.ndarray:
+        # Reads n big-endian XDR scalars in one block and returns them in native byte order
+        dtype = np.dtype(dtype)
+        data = self._xdrfile.unpack_fopaque(n * dtype.itemsize)
+        return np.frombuffer(data, dtype=dtype, count=n).astype(dtype.newbyteorder('='))
+
+    def unpack_triple_array(self, n: int) -> np.ndarray:
+        return self.unpack_array(self._real_dtype, 3 * n).reshape(n, 3)
+
+    def unpack_rgba_float_array(self, n: int) -> np.ndarray:
+        return self.unpack_array('>f4', 4 * n).reshape(n, 4)
+
     def process_header(self) -> V3DHeaderInformation:
         header = V3DHeaderInformation()
         num_headers = self._xdrfile.unpack_uint()
@@ -159,7 +377,9 @@ class V3DReader:
             elif header_type == v3dheadertypes.v3dheadertypes_zoomFactor:
                 header.configuration.zoomFactor = self.unpack_double()
             elif header_type == v3dheadertypes.v3dheadertypes_zoomPinchFactor:
-                header.configuration.zoomPinch_factor = self.unpack_double()
+                header.configuration.zoomPinchFactor = self.unpack_double()
+            elif header_type == v3dheadertypes.v3dheadertypes_zoomPinchCap:
+                header.configuration.zoomPinchCap = self.unpack_double()
             elif header_type == v3dheadertypes.v3dheadertypes_zoomStep:
                 header.configuration.zoomStep = self.unpack_double()
             elif header_type == v3dheadertypes.v3dheadertypes_shiftHoldDistance:
@@ -170,185 +390,170 @@ class V3DReader:
                 header.configuration.vibrateTime = self.unpack_double()
             elif header_type == v3dheadertypes.v3dheadertypes_imageName:
                 n = self._xdrfile.unpack_uhyper()
-                pos = self._xdrfile.get_position()
-                raw = self._xdrfile.get_buffer()[pos:pos+n]
-                # Advance to (n+3)/4 words worth of bytes to match getWordSize
-                totalBytes = ((n + 3) // 4) * 4
-                self._xdrfile.set_position(pos + totalBytes)
-                header.image = raw.decode('utf-8')
+                # Consumes (n+3)/4 words worth of bytes to match getWordSize
+                raw = self._xdrfile.unpack_fstring(n)
+                header.image = bytes(raw).decode('utf-8')
             else:
                 for _ in range(block_count):
                     self._xdrfile.unpack_uint()
         return header
 
-    def process_bezierpatch(self) -> V3DBezierPatch:
-        base_ctlpts = self.unpack_triple_n(16)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
+    def _unpack_record(self, typ: int) -> tuple:
+        return self._xdrfile.unpack_struct(self._record_structs[typ])
 
-        assert len(base_ctlpts) == 16
-        return V3DBezierPatch(tuple(base_ctlpts), material_id, center_id)
+    def process_bezierpatch(self) -> V3DBezierPatch:
+        v = self._unpack_record(v3dtypes.v3dtypes_bezierPatch)
+        return V3DBezierPatch(_triples(v, 0, 16), v[49], v[48])
 
     def process_bezierpatch_color(self) -> V3DBezierPatchColor:
-        base_ctlpts = self.unpack_triple_n(16)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        colors = self.unpack_rgba_float_n(4)
-
-        assert len(base_ctlpts) == 16
-        return V3DBezierPatchColor(tuple(base_ctlpts), tuple(colors), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_bezierPatchColor)
+        return V3DBezierPatchColor(_triples(v, 0, 16), _rgbas(v, 50, 4), v[49], v[48])
 
     def process_beziertriangle(self) -> V3DBezierTriangle:
-        base_ctlpts = self.unpack_triple_n(10)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        assert len(base_ctlpts) == 10
-        return V3DBezierTriangle(tuple(base_ctlpts), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_bezierTriangle)
+        return V3DBezierTriangle(_triples(v, 0, 10), v[31], v[30])
 
     def process_beziertriangle_color(self) -> V3DBezierTriangleColor:
-        base_ctlpts = self.unpack_triple_n(10)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        colors = self.unpack_rgba_float_n(3)
-
-        assert len(base_ctlpts) == 10
-        return V3DBezierTriangleColor(tuple(base_ctlpts), tuple(colors), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_bezierTriangleColor)
+        return V3DBezierTriangleColor(_triples(v, 0, 10), _rgbas(v, 32, 3), v[31], v[30])
 
     def process_straight_bezierpatch(self) -> V3DStraightBezierPatch:
-        base_ctlpts = self.unpack_triple_n(4)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        assert len(base_ctlpts) == 4
-        return V3DStraightBezierPatch(tuple(base_ctlpts), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_quad)
+        return V3DStraightBezierPatch(_triples(v, 0, 4), v[13], v[12])
 
     def process_straight_bezierpatch_color(self) -> V3DStraightBezierPatchColor:
-        base_ctlpts = self.unpack_triple_n(4)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        colors = self.unpack_rgba_float_n(4)
-
-        assert len(base_ctlpts) == 4
-        return V3DStraightBezierPatchColor(tuple(base_ctlpts), tuple(colors), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_quadColor)
+        return V3DStraightBezierPatchColor(_triples(v, 0, 4), _rgbas(v, 14, 4), v[13], v[12])
 
     def process_straight_beziertriangle(self) -> V3DStraightBezierTriangle:
-        base_ctlpts = self.unpack_triple_n(3)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        assert len(base_ctlpts) == 3
-        return V3DStraightBezierTriangle(tuple(base_ctlpts), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_triangle)
+        return V3DStraightBezierTriangle(_triples(v, 0, 3), v[10], v[9])
 
     def process_straight_beziertriangle_color(self) -> V3DStraightBezierTriangleColor:
-        base_ctlpts = self.unpack_triple_n(3)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        colors = self.unpack_rgba_float_n(3)
-
-        assert len(base_ctlpts) == 3
-        return V3DStraightBezierTriangleColor(tuple(base_ctlpts), tuple(colors), material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_triangleColor)
+        return V3DStraightBezierTriangleColor(_triples(v, 0, 3), _rgbas(v, 11, 3), v[10], v[9])
 
     def process_sphere(self) -> V3DSphere:
-        center = self.unpack_triple()
-        radius = self.unpack_double()
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-        return V3DSphere(center, radius, material_id, center_id)
+        # center, radius, center index, material index
+        v = self._unpack_record(v3dtypes.v3dtypes_sphere)
+        return V3DSphere(v[0:3], v[3], v[5], v[4])
 
     def process_half_sphere(self) -> V3DHalfSphere:
-        center = self.unpack_triple()
-        radius = self.unpack_double()
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        polar = self.unpack_double()
-        azimuth = self.unpack_double()
-        return V3DHalfSphere(center, radius, polar, azimuth, material_id, center_id)
+        # center, radius, center index, material index, polar, azimuth
+        v = self._unpack_record(v3dtypes.v3dtypes_halfSphere)
+        return V3DHalfSphere(v[0:3], v[3], v[6], v[7], v[5], v[4])
 
     def process_cylinder(self) -> V3DCylinder:
-        center = self.unpack_triple()
-        radius = self.unpack_double()
-        height = self.unpack_double()
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        polar = self.unpack_double()
-        azimuth = self.unpack_double()
-        core_base = self.unpack_bool()
-
-        return V3DCylinder(center, radius, height, polar, azimuth, core_base, material_id, center_id)
+        # center, radius, height, center index, material index, polar, azimuth, core
+        v = self._unpack_record(v3dtypes.v3dtypes_cylinder)
+        return V3DCylinder(v[0:3], v[3], v[4], v[7], v[8], v[9] != 0, v[6], v[5])
 
     def process_disk(self) -> V3DDisk:
-        center = self.unpack_triple()
-        radius = self.unpack_double()
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        polar = self.unpack_double()
-        azimuth = self.unpack_double()
-
-        return V3DDisk(center, radius, polar, azimuth, material_id, center_id)
+        # center, radius, center index, material index, polar, azimuth
+        v = self._unpack_record(v3dtypes.v3dtypes_disk)
+        return V3DDisk(v[0:3], v[3], v[6], v[7], v[5], v[4])
 
     def process_tube(self) -> V3DTube:
-        points = self.unpack_triple_n(4)
-        width = self.unpack_double()
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        core_base = self.unpack_bool()
-
-        return V3DTube(points[0], points[1], points[2], points[3], width, core_base, material_id, center_id)
+        # path, width, center index, material index, core
+        v = self._unpack_record(v3dtypes.v3dtypes_tube)
+        return V3DTube(v[0:3], v[3:6], v[6:9], v[9:12], v[12], v[15] != 0, v[14], v[13])
 
     def process_curve(self) -> V3DCurve:
-        points = self.unpack_triple_n(4)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        return V3DCurve(points[0], points[1], points[2], points[3], material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_curve)
+        return V3DCurve(v[0:3], v[3:6], v[6:9], v[9:12], v[13], v[12])
 
     def process_line(self) -> V3DLine:
-        points = self.unpack_triple_n(2)
-
-        center_id = self._xdrfile.unpack_uint()
-        material_id = self._xdrfile.unpack_uint()
-
-        return V3DLine(points[0], points[1], material_id, center_id)
+        v = self._unpack_record(v3dtypes.v3dtypes_line)
+        return V3DLine(v[0:3], v[3:6], v[7], v[6])
 
     def process_pixel(self) -> V3DPixel:
-        point = self.unpack_triple()
-        width = self.unpack_double()
-
-        material_id = self._xdrfile.unpack_uint()
-
-        return V3DPixel(point, width, material_id, None)
+        # point, width, material index
+        v = self._unpack_record(v3dtypes.v3dtypes_pixel)
+        return V3DPixel(v[0:3], v[3], v[4], None)
+
+    def process_line_color(self) -> V3DLineColor:
+        v = self._unpack_record(v3dtypes.v3dtypes_lineColor)
+        return V3DLineColor(v[0:3], v[3:6], _rgbas(v, 8, 2), v[7], v[6])
+
+    def process_curve_color(self) -> V3DCurveColor:
+        v = self._unpack_record(v3dtypes.v3dtypes_curveColor)
+        return V3DCurveColor(v[0:3], v[3:6], v[6:9], v[9:12], _rgbas(v, 14, 2), v[13], v[12])
+
+    def process_transform(self) -> V3DTransform:
+        return V3DTransform(self._unpack_record(v3dtypes.v3dtypes_transform))
+
+    def process_element(self) -> V3DElement:
+        return V3DElement(self._unpack_record(v3dtypes.v3dtypes_element)[0])
+
+    def process_animation(self) -> V3DAnimation:
+        # Number of frames, then per frame its length in words followed by its records
+        xdr = self._xdrfile
+        num_frames = xdr.unpack_uint()
+        if self._stream:
+            # Streamed data cannot be revisited, so the frames are decoded right away
+            frames = []
+            for _ in range(num_frames):
+                num_words = xdr.unpack_uint()
+                frames.append(self._decode_until(xdr.get_position() + 4 * num_words))
+            return V3DAnimation(frames)
+        # Frames keep a copy of their bytes rather than the reader, so animations can be pickled
+        buffer = xdr.get_buffer()
+        frames = []
+        for _ in range(num_frames):
+            num_words = xdr.unpack_uint()
+            start = xdr.get_position()
+            frames.append(bytes(buffer[start:start + 4 * num_words]))
+            xdr.set_position(start + 4 * num_words)
+        preamble = struct.pack('>LL', self._file_ver, self._allow_double_precision)
+        return V3DAnimation(V3DAnimationFrames(frames, preamble, self._frame_options))
+
+    def _decode_typed(self, typ: int) -> Any:
+        # Decodes the payload of a record whose type number was just read
+        if typ == v3dtypes.v3dtypes_material:
+            return self.process_material()
+        elif typ == v3dtypes.v3dtypes_centers:
+            return self.process_centers()
+        elif typ == v3dtypes.v3dtypes_header:
+            return self.process_header()
+        fn = self.get_fn_process_type(typ)
+        if fn is None:
+            raise RuntimeError('Unknown Object type. Received type {0}'.format(typ))
+        return fn()
+
+    def _decode_until(self, end: int) -> List[Any]:
+        records = []
+        while self._xdrfile.get_position() < end:
+            typ = self._xdrfile.unpack_uint()
+            if self._known_type(typ):
+                records.append(self._decode_typed(typ))
+            elif not self._skip_unknown(typ):
+                # The rest of the span cannot be decoded, but its end is known
+                self._xdrfile.set_position(end)
+        return records
+
+    def _known_type(self, typ: int) -> bool:
+        return typ in self._object_process_fns or typ in v3dnonobject_types
+
+    def _skip_unknown(self, typ: int) -> bool:
+        """Skips a record nothing decodes; False if its end cannot be found and reading has to stop."""
+        self._skipped[typ] = self._skipped.get(typ, 0) + 1
+        size = self._unknown_sizes.get(typ)
+        if size is not None:
+            self._xdrfile.set_position(self._xdrfile.get_position() + size)
+            return True
+        if not self._tolerant:
+            raise RuntimeError('Unknown Object type. Received type {0}'.format(typ))
+        # Records do not store their length, so nothing after an unknown record can be read
+        warnings.warn('Unknown V3D record type {0} at byte {1}; ignoring the rest of the data'.format(
+            typ, self._xdrfile.get_position() - 4))
+        return False
 
     def process_material(self) -> V3DMaterial:
-        diffuse = self.unpack_rgba_float()
-        emissive = self.unpack_rgba_float()
-        specular = self.unpack_rgba_float()
-        shininess, metallic, f0 = self.unpack_rgb_float()
-        lightOn_f = self._xdrfile.unpack_float()
+        v = self._unpack_record(v3dtypes.v3dtypes_material)
+        diffuse, emissive, specular = v[0:4], v[4:8], v[8:12]
+        shininess, metallic, f0, lightOn_f = v[12:16]
         lightOn = lightOn_f != 0.0
-        return V3DMaterial(diffuse, emissive, specular, shininess, metallic, f0, lightOn)
+        return V3DMaterial(diffuse, emissive, specular, metallic=metallic, shininess=shininess, f0=f0, lightOn=lightOn)
 
     def process_centers(self) -> List[TY_TRIPLE]:
         number_centers = self._xdrfile.unpack_uint()
@@ -409,40 +614,303 @@ class V3DReader:
         else:
             return V3DTriangleGroups(positions, normals, pos_indices, normal_indices, material_id, center_id)
 
+    def process_triangles_numpy(self) -> Union[V3DTriangleGroups, V3DTriangleGroupsColor]:
+        num_idx = self._xdrfile.unpack_uint()
+
+        num_pos = self._xdrfile.unpack_uint()
+        positions = self.unpack_triple_array(num_pos)
+
+        num_normal = self._xdrfile.unpack_uint()
+        normals = self.unpack_triple_array(num_normal)
+
+        explicitNI = self.unpack_bool()
+
+        num_color = self._xdrfile.unpack_uint()
+
+        is_color = num_color > 0
+        explicitCi = False
+        if is_color:
+            colors = self.unpack_rgba_float_array(num_color)
+            explicitCi = self.unpack_bool()
+
+        # Each triangle stores its position, normal and color index triples interleaved
+        num_sets = 1 + explicitNI + explicitCi
+        indices = self.unpack_array('>u4', 3 * num_sets * num_idx).reshape(num_idx, num_sets, 3)
+
+        pos_indices = np.ascontiguousarray(indices[:, 0])
+        normal_indices = np.ascontiguousarray(indices[:, 1]) if explicitNI else pos_indices
+
+        center_id = self._xdrfile.unpack_uint()
+        material_id = self._xdrfile.unpack_uint()
+
+        if is_color:
+            color_indices = np.ascontiguousarray(indices[:, num_sets - 1]) if explicitCi else pos_indices
+            return V3DTriangleGroupsColor(positions, normals, colors, pos_indices, normal_indices, color_indices,
+                                          material_id, center_id)
+        else:
+            return V3DTriangleGroups(positions, normals, pos_indices, normal_indices, material_id, center_id)
+
+    def skip_record(self, typ: int):
+        # Advances past the payload of a record of the given type, reading only its counts
+        xdr = self._xdrfile
+        if typ in self._record_sizes:
+            xdr.set_position(xdr.get_position() + self._record_sizes[typ])
+        elif typ == v3dtypes.v3dtypes_centers:
+            num_centers = xdr.unpack_uint()
+            xdr.set_position(xdr.get_position() + 3 * self._real_dtype.itemsize * num_centers)
+        elif typ == v3dtypes.v3dtypes_header:
+            # Bypasses the instrumented wrapper so that skipping is not counted as decoding
+            V3DReader.process_header(self)
+        elif typ == v3dtypes.v3dtypes_triangles:
+            real_size = self._real_dtype.itemsize
+            num_idx = xdr.unpack_uint()
+            num_pos = xdr.unpack_uint()
+            xdr.set_position(xdr.get_position() + 3 * real_size * num_pos)
+            num_normal = xdr.unpack_uint()
+            xdr.set_position(xdr.get_position() + 3 * real_size * num_normal)
+            explicitNI = self.unpack_bool()
+            num_color = xdr.unpack_uint()
+            explicitCi = False
+            if num_color > 0:
+                xdr.set_position(xdr.get_position() + 16 * num_color)
+                explicitCi = self.unpack_bool()
+            num_sets = 1 + explicitNI + explicitCi
+            # Index triples, then center and material indices
+            xdr.set_position(xdr.get_position() + 12 * num_sets * num_idx + 8)
+        elif typ == v3dtypes.v3dtypes_animation:
+            for _ in range(xdr.unpack_uint()):
+                num_words = xdr.unpack_uint()
+                xdr.set_position(xdr.get_position() + 4 * num_words)
+        else:
+            raise RuntimeError('Unknown Object type. Received type {0}'.format(typ))
+
+    def build_index(self) -> V3DObjectIndex:
+        if self._stream:
+            raise RuntimeError('Cannot index a streamed reader')
+        start = time.perf_counter()
+        self._process_preamble()
+
+        types: List[int] = []
+        offsets: List[int] = []
+        lengths: List[int] = []
+        while typ := self.get_obj_type():
+            offset = self._xdrfile.get_position()
+            if not self._known_type(typ):
+                # Skipped records are left out of the index
+                if self._skip_unknown(typ):
+                    continue
+                break
+            self.skip_record(typ)
+            types.append(typ)
+            offsets.append(offset)
+            lengths.append(self._xdrfile.get_position() - offset)
+        else:
+            self._xdrfile.done()
+
+        self._index = V3DObjectIndex(np.array(types, dtype=np.uint32), np.array(offsets, dtype=np.int64),
+                                     np.array(lengths, dtype=np.int64), self._file_ver, self._allow_double_precision)
+        if self._stats is not None:
+            self._stats.index_seconds += time.perf_counter() - start
+        return self._index
+
+    def scan(self, stop_after_header: bool = False) -> V3DScan:
+        """Skip-scans the records from the start, parsing only the header and counting records by type.
+
+        No objects are built, and only the counts that variable-length records need are read. With
+        stop_after_header=True reading ends right after the header record, so a streamed reader
+        decompresses little more than the header. Unknown records are handled as in iter_objects.
+        """
+        self._process_preamble()
+        xdr = self._xdrfile
+        header: Optional[V3DHeaderInformation] = None
+        counts: Dict[int, int] = {}
+        num_centers = 0
+        complete = True
+        while typ := self.get_obj_type():
+            if not self._known_type(typ):
+                if self._skip_unknown(typ):
+                    continue
+                complete = False
+                break
+            counts[typ] = counts.get(typ, 0) + 1
+            if typ == v3dtypes.v3dtypes_header and header is None:
+                header = self.process_header()
+                if stop_after_header:
+                    complete = False
+                    break
+                continue
+            start = xdr.get_position()
+            self.skip_record(typ)
+            if typ == v3dtypes.v3dtypes_centers:
+                num_centers += (xdr.get_position() - start - 4) // (3 * self._real_dtype.itemsize)
+        return V3DScan(self._file_ver, self._allow_double_precision, header, counts, num_centers,
+                       xdr.get_position(), complete)
+
+    def _decode_record(self, record: int) -> Any:
+        index = self.index
+        if self._file_ver is None:
+            self._process_preamble()
+        self._xdrfile.set_position(int(index.offsets[record]))
+        return self._decode_typed(int(index.types[record]))
+
+    def get_object(self, i: int) -> AV3Dobject:
+        return self._decode_record(int(self.index.object_records[i]))
+
+    def get_objects(self, start: int, stop: int) -> List[AV3Dobject]:
+        return [self._decode_record(record) for record in self.index.object_records[start:stop].tolist()]
+
+    def objects_of_type(self, typ: int) -> List[AV3Dobject]:
+        return [self._decode_record(record) for record in self.index.records_of_type(typ).tolist()]
+
+    def arrays_of_type(self, typ: int) -> V3DObjectArray:
+        """Decodes every object of a fixed-size type straight into a V3DObjectArray."""
+        index = self.index
+        if typ not in v3dfixed_object_types:
+            raise ValueError('Type {0} does not have a fixed record size'.format(typ))
+        view = memoryview(self._xdrfile.get_buffer())
+        size = record_sizes(index.double_precision)[typ]
+        data = b''.join([view[offset:offset + size] for offset in index.offsets[index.types == typ].tolist()])
+        return V3DObjectArray.from_bytes(typ, data, index.double_precision)
+
     def get_fn_process_type(self, typ: int) -> Optional[Callable[[], AV3Dobject]]:
         return self._object_process_fns.get(typ, None)
 
-    def process(self, force: bool = False):
-        if self._processed and not force:
-            return
-
-        if self._processed and force:
+    def _process_preamble(self):
+        if self._xdrfile.get_position() != 0:
+            if self._stream:
+                raise RuntimeError('Stream has already been consumed')
             self._xdrfile.set_position(0)
 
-        self._processed = True
         self._file_ver = self._xdrfile.unpack_uint()
 
         self._allow_double_precision = self.unpack_bool()
-        if not self._allow_double_precision:
+        if self._allow_double_precision:
+            self.unpack_double = self._xdrfile.unpack_double
+            self._real_dtype = np.dtype('>f8')
+        else:
             self.unpack_double = self._xdrfile.unpack_float
+            self._real_dtype = np.dtype('>f4')
+        self._record_sizes = record_sizes(self._allow_double_precision)
+        self._record_structs = record_structs(self._allow_double_precision)
+
+    def iter_objects(self) -> Iterator[Tuple[int, Any]]:
+        """Yields (type, record) for every record as it is decoded.
+
+        Records are V3DHeaderInformation for headers, V3DMaterial for materials, a list of triples for
+        centers and an AV3Dobject otherwise. With stream=True the input is read in chunks and nothing
+        is retained by the reader.
+        """
+        self._process_preamble()
 
         while typ := self.get_obj_type():
             if typ == v3dtypes.v3dtypes_material:
-                self._materials.append(self.process_material())
+                yield typ, self.process_material()
             elif typ == v3dtypes.v3dtypes_centers:
-                self._centers = self.process_centers()
+                yield typ, self.process_centers()
             elif typ == v3dtypes.v3dtypes_header:
-                self._header = self.process_header()
+                yield typ, self.process_header()
             else:
                 fn = self.get_fn_process_type(typ)
                 if fn is not None:
-                    obj = fn()
-                    self._objects.append(obj)
-                else:
-                    raise RuntimeError('Unknown Object type. Received type {0}'.format(typ))
+                    yield typ, fn()
+                elif not self._skip_unknown(typ):
+                    return
 
         self._xdrfile.done()
 
+    def process(self, force: bool = False):
+        if self._processed and not force:
+            return
+
+        self._processed = True
+        self._objects = []
+        self._materials = []
+
+        if self._columnar_mode:
+            self._process_preamble()
+            self._process_columnar()
+            return
+        if self._lazy:
+            self._process_lazy()
+            return
+
+        for typ, obj in self.iter_objects():
+            if typ == v3dtypes.v3dtypes_material:
+                self._materials.append(obj)
+            elif typ == v3dtypes.v3dtypes_centers:
+                self._centers = obj
+            elif typ == v3dtypes.v3dtypes_header:
+                self._header = obj
+            else:
+                self._objects.append(obj)
+
+    def _process_lazy(self):
+        # Only the index is built; object records become handles holding their metadata
+        index = self.index
+        self._decode_cache.clear()
+        for typ in (v3dtypes.v3dtypes_material, v3dtypes.v3dtypes_centers, v3dtypes.v3dtypes_header):
+            for record in index.records_of_type(typ).tolist():
+                obj = self._decode_record(record)
+                if typ == v3dtypes.v3dtypes_material:
+                    self._materials.append(obj)
+                elif typ == v3dtypes.v3dtypes_centers:
+                    self._centers = obj
+                else:
+                    self._header = obj
+
+        buffer = self._xdrfile.get_buffer()
+        words = np.frombuffer(buffer, dtype='>u4', count=len(buffer) // 4)
+        material_words, center_words = index.field_words()
+        material_ids, center_indices = [np.where(positions >= 0, words[np.maximum(positions, 0)].astype(np.int64),
+                                                 -1).tolist() for positions in (material_words, center_words)]
+        records = index.object_records
+        self._objects = [V3DLazyObject(self, typ, record, offset, None if material_id < 0 else material_id,
+                                       None if center < 0 else center)
+                         for typ, record, offset, material_id, center in
+                         zip(index.types[records].tolist(), records.tolist(), index.offsets[records].tolist(),
+                             material_ids, center_indices)]
+
+    def _process_columnar(self):
+        # Fixed-size records are only located here; they are decoded per type in one pass afterwards
+        sizes = self._record_sizes
+        object_types: List[int] = []
+        record_offsets: dict[int, List[int]] = {}
+        triangle_groups: List[AV3Dobject] = []
+        object_lists: dict[int, List[AV3Dobject]] = {}
+
+        while typ := self.get_obj_type():
+            if typ == v3dtypes.v3dtypes_material:
+                self._materials.append(self.process_material())
+            elif typ == v3dtypes.v3dtypes_centers:
+                self._centers = self.process_centers()
+            elif typ == v3dtypes.v3dtypes_header:
+                self._header = self.process_header()
+            elif typ in v3dfixed_object_types:
+                pos = self._xdrfile.get_position()
+                record_offsets.setdefault(typ, []).append(pos)
+                self._xdrfile.set_position(pos + sizes[typ])
+                object_types.append(typ)
+            elif typ == v3dtypes.v3dtypes_triangles:
+                triangle_groups.append(self._object_process_fns[typ]())
+                object_types.append(typ)
+            elif typ in self._object_process_fns:
+                object_lists.setdefault(typ, []).append(self._object_process_fns[typ]())
+                object_types.append(typ)
+            elif not self._skip_unknown(typ):
+                break
+        else:
+            self._xdrfile.done()
+
+        start = time.perf_counter()
+        self._columnar = V3DColumnarScene.from_offsets(self._xdrfile.get_buffer(), object_types, record_offsets,
+                                                       triangle_groups, self._allow_double_precision, object_lists)
+        if self._stats is not None:
+            self._stats.columnar_seconds += time.perf_counter() - start
+            for typ, offsets in record_offsets.items():
+                type_stats = self._stats.type_stats(typ)
+                type_stats.count += len(offsets)
+                type_stats.bytes += len(offsets) * (sizes[typ] + 4)
+
 
 def main():
     # asy -fv3d -c "import teapot;" -o teapot
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# Cropping and filtering of V3D files by copying the encoded records of the kept objects
+
+import numpy as np
+from typing import Collection, Optional, Sequence, Tuple
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dconv import V3DReader
+from pyv3d.v3dwriter import V3DWriter
+from pyv3d.v3dindex import V3DObjectIndex
+from pyv3d.v3dlayouts import record_dtype
+from pyv3d.v3dcolumnar import V3DObjectArray
+from pyv3d.v3dbounds import has_bounds, object_bounds
+
+# Records gathered at once when reading bounds or copying
+_BATCH_RECORDS = 1 << 16
+
+# Records that place the objects following them rather than holding geometry
+_PLACEMENT_TYPES = np.array([v3dtypes.v3dtypes_transform, v3dtypes.v3dtypes_element], dtype=np.uint32)
+
+
+class V3DFilterReport:
+    def __init__(self, objects_in: int, objects_out: int, materials_in: int, materials_out: int,
+                 centers_in: int, centers_out: int, bytes_in: int, bytes_out: int):
+        self.objects_in = objects_in
+        self.objects_out = objects_out
+        self.materials_in = materials_in
+        self.materials_out = materials_out
+        self.centers_in = centers_in
+        self.centers_out = centers_out
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+
+    def __repr__(self) -> str:
+        return ('V3DFilterReport(objects {0} -> {1}, materials {2} -> {3}, centers {4} -> {5}, '
+                'bytes {6} -> {7})').format(self.objects_in, self.objects_out, self.materials_in, self.materials_out,
+                                           self.centers_in, self.centers_out, self.bytes_in, self.bytes_out)
+
+
+def _gather(data: np.ndarray, offsets: np.ndarray, size: int) -> np.ndarray:
+    """Rows data[offset:offset + size] for every offset, shape (len(offsets), size)."""
+    return data[offsets[:, None] + np.arange(size)]
+
+
+class _RecordTable:
+    """Material and center numbers of every object record, read from their fixed positions."""
+
+    def __init__(self, index: V3DObjectIndex, words: np.ndarray):
+        self.index = index
+        self.words = words
+        self.material_words, self.center_words = index.field_words()
+
+    def values(self, positions: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(positions), dtype=np.int64)
+        present = positions >= 0
+        result[present] = self.words[positions[present]]
+        return result
+
+
+def _animation_boxes(data: np.ndarray, offset: int) -> np.ndarray:
+    """Boxes (frames, 2, 3) enclosing the objects of each frame of the animation record at offset."""
+    num_frames = int(data[offset:offset + 4].view('>u4')[0])
+    position = offset + 4
+    boxes = np.empty((num_frames, 2, 3))
+    for i in range(num_frames):
+        num_words = int(data[position:position + 4].view('>u4')[0])
+        position += 4
+        # A frame is a sequence of records, indexed like a file of its own behind the file's preamble
+        frame = np.concatenate((data[:8], data[position:position + 4 * num_words]))
+        frame_index = V3DReader(memoryview(frame)).build_index()
+        frame_boxes = _record_boxes(frame_index, frame)
+        boxes[i] = (frame_boxes[:, 0].min(axis=0, initial=np.inf), frame_boxes[:, 1].max(axis=0, initial=-np.inf))
+        position += 4 * num_words
+    return boxes
+
+
+def _record_boxes(index: V3DObjectIndex, data: np.ndarray) -> np.ndarray:
+    """Bounds (N, 2, 3) of each object record; empty for records without geometry of their own.
+
+    An animation gets the union of the bounds of all its frames.
+    """
+    records = index.object_records
+    types = index.types[records]
+    real = np.dtype('>f8' if index.double_precision else '>f4')
+    boxes = np.empty((len(records), 2, 3))
+    boxes[:, 0], boxes[:, 1] = np.inf, -np.inf
+    for typ in np.unique(types).tolist():
+        selected = np.flatnonzero(types == typ)
+        for start in range(0, len(selected), _BATCH_RECORDS):
+            batch = selected[start:start + _BATCH_RECORDS]
+            offsets = index.offsets[records[batch]]
+            if typ == v3dtypes.v3dtypes_animation:
+                for i, offset in zip(batch.tolist(), offsets.tolist()):
+                    frames = _animation_boxes(data, offset)
+                    boxes[i] = (frames[:, 0].min(axis=0, initial=np.inf), frames[:, 1].max(axis=0, initial=-np.inf))
+            elif typ == v3dtypes.v3dtypes_triangles:
+                for i, offset in zip(batch.tolist(), offsets.tolist()):
+                    # num_idx and num_pos precede the positions
+                    num_pos = int(data[offset + 4:offset + 8].view('>u4')[0])
+                    positions = data[offset + 8:offset + 8 + 3 * real.itemsize * num_pos].view(real).reshape(-1, 3)
+                    if num_pos:
+                        boxes[i] = (positions.min(axis=0), positions.max(axis=0))
+            elif has_bounds(typ):
+                dtype = record_dtype(typ, index.double_precision)
+                rows = _gather(data, offsets, dtype.itemsize)
+                boxes[batch] = object_bounds(V3DObjectArray.from_records(typ, rows.view(dtype).ravel()))
+    return boxes
+
+
+def _box_mask(index: V3DObjectIndex, data: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Whether the bounds of each object record overlap the box [lo, hi].
+
+    Transform and element records are always kept, since they affect the objects after them.
+    """
+    boxes = _record_boxes(index, data)
+    keep = np.all((boxes[:, 0] <= hi) & (lo <= boxes[:, 1]), axis=1)
+    keep |= np.isin(index.types[index.object_records], _PLACEMENT_TYPES)
+    return keep
+
+
+def filter_v3d(reader: V3DReader, out_name: str, box: Optional[Tuple[Sequence[float], Sequence[float]]] = None,
+               types: Optional[Collection[int]] = None, materials: Optional[Collection[int]] = None,
+               compresslevel: int = 6) -> V3DFilterReport:
+    """Writes the objects of reader that pass every given criterion to a new gzipped V3D file.
+
+    box keeps objects whose bounds overlap (lo, hi), types keeps the listed v3dtypes codes and
+    materials the listed material numbers. Only the bounds of candidate objects are decoded; the
+    encoded records of kept objects are copied verbatim, except that material and center numbers
+    are rewritten in place when unused materials and centers are dropped. The header is kept.
+
+    Transform and element records pass the box and material criteria, as they place the objects
+    after them; an animation passes the box test if any of its frames does. Records inside frames
+    are not renumbered, so materials and centers are all kept when an animation is.
+    """
+    index = reader.index if reader.index is not None else reader.build_index()
+    buffer = reader.raw_buffer
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    words = data[:len(data) // 4 * 4].view('>u4')
+    table = _RecordTable(index, words)
+
+    records = index.object_records
+    keep = np.ones(len(records), dtype=bool)
+    if types is not None:
+        keep &= np.isin(index.types[records], np.fromiter(types, dtype=np.uint32))
+    material_ids = table.values(table.material_words)
+    if materials is not None:
+        # Records without a material number of their own, such as transforms and animations, pass
+        keep &= np.isin(material_ids, np.fromiter(materials, dtype=np.int64)) | (table.material_words < 0)
+    if box is not None:
+        candidates = np.flatnonzero(keep)
+        sub_index = V3DObjectIndex(index.types[records[candidates]], index.offsets[records[candidates]],
+                                   index.lengths[records[candidates]], index.file_version, index.double_precision)
+        keep[candidates] = _box_mask(sub_index, data, np.asarray(box[0], dtype=np.float64),
+                                     np.asarray(box[1], dtype=np.float64))
+
+    # Renumber the materials and centers still referenced, keeping their order
+    material_records = index.records_of_type(v3dtypes.v3dtypes_material)
+    used_materials = np.unique(material_ids[keep])
+    used_materials = used_materials[used_materials < len(material_records)]
+
+    center_records = index.records_of_type(v3dtypes.v3dtypes_centers)
+    center_ids = table.values(table.center_words)
+    centers = np.empty((0, 3))
+    if len(center_records):
+        offset = int(index.offsets[center_records[-1]])
+        real = np.dtype('>f8' if index.double_precision else '>f4')
+        centers = data[offset + 4:offset + 4 + 3 * real.itemsize * int(words[offset // 4])].view(real).reshape(-1, 3)
+    # Center numbers start at 1; 0 means no center
+    used_centers = np.unique(center_ids[keep])
+    used_centers = used_centers[(used_centers > 0) & (used_centers <= len(centers))]
+    if np.any(index.types[records[keep]] == v3dtypes.v3dtypes_animation):
+        # Frames of animations are copied as they are, so the numbers inside them must stay valid
+        used_materials = np.arange(len(material_records))
+        used_centers = np.arange(1, len(centers) + 1)
+    # Built after the animation override so that kept numbers match the materials and centers written
+    material_map = np.arange(len(material_records))
+    material_map[used_materials] = np.arange(len(used_materials))
+    center_map = np.arange(len(centers) + 1)
+    center_map[used_centers] = np.arange(1, len(used_centers) + 1)
+
+    emit = np.zeros(len(index), dtype=bool)
+    emit[records[keep]] = True
+    emit[index.records_of_type(v3dtypes.v3dtypes_header)] = True
+    emit[material_records[used_materials]] = True
+    centers_record = -1
+    if len(used_centers):
+        # The pruned centers replace the last centers record, which is the one objects refer to
+        emit[center_records[-1]] = True
+        centers_record = int(center_records[-1])
+        centers_payload = (np.array([v3dtypes.v3dtypes_centers, len(used_centers)], dtype='>u4').tobytes() +
+                           centers[used_centers - 1].tobytes())
+
+    # Word positions of the numbers to rewrite, relative to the start of each object record's payload
+    material_words = np.full(len(index), -1, dtype=np.int64)
+    center_words = np.full(len(index), -1, dtype=np.int64)
+    payload_words = index.offsets[records] // 4
+    material_words[records] = np.where(table.material_words >= 0, table.material_words - payload_words, -1)
+    center_words[records] = np.where(table.center_words >= 0, table.center_words - payload_words, -1)
+
+    bytes_out = 8
+    with V3DWriter.from_file_name(out_name, index.double_precision, compresslevel, index.file_version) as writer:
+        emitted = np.flatnonzero(emit)
+        for start in range(0, len(emitted), _BATCH_RECORDS):
+            batch = emitted[start:start + _BATCH_RECORDS]
+            chunks = [centers_payload if record == centers_record else
+                      buffer[index.offsets[record] - 4:index.offsets[record] + index.lengths[record]]
+                      for record in batch.tolist()]
+            out = np.frombuffer(bytearray(b''.join(chunks)), dtype='>u4')
+            sizes = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+            # Output word of each record's payload, just past its type number
+            payload_starts = (np.cumsum(sizes) - sizes) // 4 + 1
+            for relative, mapping in ((material_words[batch], material_map), (center_words[batch], center_map)):
+                has = relative >= 0
+                target = payload_starts[has] + relative[has]
+                values = out[target].astype(np.int64)
+                known = values < len(mapping)
+                out[target[known]] = mapping[values[known]]
+            writer.write_raw(out.tobytes())
+            bytes_out += out.nbytes
+
+    return V3DFilterReport(len(records), int(np.count_nonzero(keep)), len(material_records), len(used_materials),
+                           len(centers), len(used_centers), len(data), bytes_out)
+
+
+def _type_code(name: str) -> int:
+    # Accepts numeric codes as well as names such as 'sphere' or 'v3dtypes_sphere'
+    if name.isdigit():
+        return int(name)
+    return getattr(v3dtypes, name if name.startswith('v3dtypes_') else 'v3dtypes_' + name)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Copy the objects of a V3D file that pass the given filters.')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--box', nargs=6, type=float, metavar=('X0', 'Y0', 'Z0', 'X1', 'Y1', 'Z1'))
+    parser.add_argument('--types', nargs='+', type=_type_code)
+    parser.add_argument('--materials', nargs='+', type=int)
+    parser.add_argument('--compresslevel', type=int, default=6)
+    parser.add_argument('--raw', action='store_true', help='input is an already decompressed .v3d.raw file')
+    args = parser.parse_args()
+
+    reader = V3DReader.from_file_name(args.input, raw=args.raw)
+    box = None if args.box is None else (args.box[:3], args.box[3:])
+    print(filter_v3d(reader, args.output, box, args.types, args.materials, args.compresslevel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Binary glTF export of decoded V3D scenes
+
+from typing import Iterable, List, Optional
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import *
+from pyv3d.v3dlazy import decode_triangles
+from pyv3d.v3dmesh import V3DMesh, merge_triangle_groups
+from pyv3d.v3dgltf import GLTFBuilder, add_header, add_materials
+from pyv3d.v3dtessellate import tessellate_object_array, v3dsurface_types
+from pyv3d.v3dinstances import add_primitives
+
+
+def add_triangle_groups(builder: GLTFBuilder, objects: Iterable[AV3Dobject], materials: Optional[List[int]] = None):
+    """Adds one mesh per triangle group; the decoded arrays are packed as whole buffer views."""
+    for k, obj in enumerate(objects):
+        obj = decode_triangles(obj)
+        if not isinstance(obj, V3DTriangleGroups):
+            continue
+        material = None
+        if materials is not None and obj.material_id is not None and obj.material_id < len(materials):
+            material = materials[obj.material_id]
+        mesh = builder.add_mesh(V3DMesh.from_triangle_group(obj), material, name='triangles_{0}'.format(k))
+        builder.add_node({'mesh': mesh})
+
+
+def write_glb(objects: Iterable[AV3Dobject], file_name: str, materials: Optional[List[V3DMaterial]] = None,
+              header: Optional[V3DHeaderInformation] = None):
+    """Writes the triangle groups of objects with their materials, camera and lights as a .glb file."""
+    builder = GLTFBuilder()
+    material_indices = None if materials is None else add_materials(builder, materials)
+    add_header(builder, header)
+    add_triangle_groups(builder, objects, material_indices)
+    builder.write_glb(file_name)
+
+
+def write_reader_glb(reader, file_name: str, resolution: Optional[int] = None, lod: int = 1, merge: bool = False):
+    """Exports a processed V3DReader.
+
+    Triangle groups are always written. In columnar mode the analytic primitives are added as
+    instanced meshes at the given level of detail, and when resolution is given the Bezier
+    surfaces and quads are tessellated as well. With merge=True, triangle groups sharing a
+    material and center are merged into one mesh each.
+    """
+    builder = GLTFBuilder()
+    materials = add_materials(builder, reader.materials)
+    add_header(builder, reader.header)
+    if reader.columnar_mode:
+        triangle_groups = reader.columnar.get(v3dtypes.v3dtypes_triangles) or []
+    else:
+        triangle_groups = reader.objects
+    add_triangle_groups(builder, merge_triangle_groups(triangle_groups) if merge else triangle_groups, materials)
+    if reader.columnar_mode:
+        scene = reader.columnar
+        if resolution is not None:
+            surfaces = V3DMesh.concatenate([tessellate_object_array(group, resolution)
+                                            for typ, group in scene.groups.items() if typ in v3dsurface_types])
+            if surfaces.num_triangles:
+                builder.add_mesh_nodes(surfaces, materials, 'surfaces')
+        add_primitives(builder, scene, materials, lod)
+    builder.write_glb(file_name)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Binary glTF 2.0 (.glb) assembly from NumPy arrays
+
+import json
+import struct
+import numpy as np
+from typing import Dict, List, Optional
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dobjects import V3DHeaderInformation, V3DMaterial
+
+GLB_MAGIC = 0x46546C67
+GLB_VERSION = 2
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+
+_component_types = {
+    np.dtype(np.int8): 5120, np.dtype(np.uint8): 5121, np.dtype(np.int16): 5122,
+    np.dtype(np.uint16): 5123, np.dtype(np.uint32): 5125, np.dtype(np.float32): 5126,
+}
+
+_accessor_types = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4', 16: 'MAT4'}
+
+KHR_MATERIALS_UNLIT = 'KHR_materials_unlit'
+KHR_MATERIALS_SPECULAR = 'KHR_materials_specular'
+KHR_MATERIALS_IOR = 'KHR_materials_ior'
+KHR_LIGHTS_PUNCTUAL = 'KHR_lights_punctual'
+
+
+class GLTFBuilder:
+    """Collects glTF JSON and one binary buffer; arrays are appended as whole blocks.
+
+    Every add_* method returns the index of the new entry, to be referenced by later entries.
+    """
+
+    def __init__(self, generator: str = 'pyv3d'):
+        self.gltf: Dict = {
+            'asset': {'version': '2.0', 'generator': generator},
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+            'nodes': [],
+            'meshes': [],
+            'accessors': [],
+            'bufferViews': [],
+            'buffers': [],
+        }
+        self._blocks: List[bytes] = []
+        self._length = 0
+        self._extensions = set()
+
+    def _add(self, key: str, entry: Dict) -> int:
+        entries = self.gltf.setdefault(key, [])
+        entries.append(entry)
+        return len(entries) - 1
+
+    def use_extension(self, name: str):
+        self._extensions.add(name)
+
+    def add_buffer_view(self, data: np.ndarray, target: Optional[int] = None) -> int:
+        raw = np.ascontiguousarray(data).astype(data.dtype.newbyteorder('<'), copy=False).tobytes()
+        view = {'buffer': 0, 'byteOffset': self._length, 'byteLength': len(raw)}
+        if target is not None:
+            view['target'] = target
+        # Accessors require 4-byte aligned offsets
+        self._blocks.append(raw + b'\0' * (-len(raw) % 4))
+        self._length += len(raw) + (-len(raw) % 4)
+        return self._add('bufferViews', view)
+
+    def add_accessor(self, data: np.ndarray, target: Optional[int] = None, bounds: bool = False,
+                     normalized: bool = False) -> int:
+        """Stores data of shape (count,) or (count, components) in its own buffer view."""
+        data = np.asarray(data)
+        if data.dtype == np.float64:
+            data = data.astype(np.float32)
+        elif data.dtype == np.int64:
+            data = data.astype(np.uint32)
+        components = 1 if data.ndim == 1 else int(np.prod(data.shape[1:]))
+        accessor = {
+            'bufferView': self.add_buffer_view(data, target),
+            'componentType': _component_types[data.dtype],
+            'count': len(data),
+            'type': _accessor_types[components],
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if bounds and len(data):
+            flat = data.reshape(len(data), -1)
+            accessor['min'] = flat.min(axis=0).tolist()
+            accessor['max'] = flat.max(axis=0).tolist()
+        return self._add('accessors', accessor)
+
+    def add_mesh(self, mesh: V3DMesh, material: Optional[int] = None, name: Optional[str] = None) -> int:
+        attributes = {
+            'POSITION': self.add_accessor(mesh.positions.astype(np.float32), TARGET_ARRAY_BUFFER, bounds=True),
+            'NORMAL': self.add_accessor(mesh.normals.astype(np.float32), TARGET_ARRAY_BUFFER),
+        }
+        if mesh.colors is not None:
+            attributes['COLOR_0'] = self.add_accessor(mesh.colors, TARGET_ARRAY_BUFFER)
+        indices = mesh.indices.ravel()
+        if mesh.num_vertices <= 0xffff:
+            indices = indices.astype(np.uint16)
+        primitive = {'attributes': attributes, 'indices': self.add_accessor(indices, TARGET_ELEMENT_ARRAY_BUFFER)}
+        if material is not None:
+            primitive['material'] = material
+        entry = {'primitives': [primitive]}
+        if name is not None:
+            entry['name'] = name
+        return self._add('meshes', entry)
+
+    def add_mesh_nodes(self, mesh: V3DMesh, materials: Optional[List[int]] = None, name: str = 'mesh'):
+        """Adds one mesh and node per material id of mesh; materials maps V3D ids to glTF indices."""
+        material_ids = np.unique(mesh.material_ids).tolist()
+        for material_id in material_ids:
+            material = None if materials is None or material_id >= len(materials) else materials[material_id]
+            part = mesh if len(material_ids) == 1 else mesh.select_triangles(mesh.material_ids == material_id)
+            self.add_node({'mesh': self.add_mesh(part, material, name='{0}_{1}'.format(name, material_id))})
+
+    def add_material(self, material: Dict) -> int:
+        return self._add('materials', material)
+
+    def add_camera(self, camera: Dict) -> int:
+        return self._add('cameras', camera)
+
+    def add_node(self, node: Dict, root: bool = True) -> int:
+        index = self._add('nodes', node)
+        if root:
+            self.gltf['scenes'][0]['nodes'].append(index)
+        return index
+
+    def _glb_chunks(self) -> List[bytes]:
+        gltf = dict(self.gltf)
+        gltf['buffers'] = [{'byteLength': self._length}] if self._length else []
+        if self._extensions:
+            gltf['extensionsUsed'] = sorted(self._extensions)
+        gltf = {key: value for key, value in gltf.items() if value != [] or key in ('scenes', 'asset')}
+        header = json.dumps(gltf, separators=(',', ':')).encode()
+        header += b' ' * (-len(header) % 4)
+        chunks = [struct.pack('<II', len(header), _CHUNK_JSON), header]
+        if self._length:
+            chunks.append(struct.pack('<II', self._length, _CHUNK_BIN))
+            chunks.extend(self._blocks)
+        total = 12 + sum(len(chunk) for chunk in chunks)
+        return [struct.pack('<III', GLB_MAGIC, GLB_VERSION, total)] + chunks
+
+    def to_glb(self) -> bytes:
+        return b''.join(self._glb_chunks())
+
+    def write_glb(self, file_name: str):
+        with open(file_name, 'wb') as fil:
+            fil.writelines(self._glb_chunks())
+
+
+def gltf_material(material: V3DMaterial) -> Dict:
+    """PBR material for a V3DMaterial; the extensions it uses are listed under 'extensionsUsed'."""
+    diffuse = [float(c) for c in material.diffuse]
+    entry = {
+        'pbrMetallicRoughness': {'baseColorFactor': diffuse,
+                                 'metallicFactor': float(material.metallic),
+                                 'roughnessFactor': float(1.0 - material.shininess)},
+        'emissiveFactor': [float(c) for c in material.emissive[:3]],
+        'doubleSided': True,
+        'extensions': {},
+    }
+    if diffuse[3] < 1.0:
+        entry['alphaMode'] = 'BLEND'
+    if not material.lightOn:
+        entry['extensions'][KHR_MATERIALS_UNLIT] = {}
+    else:
+        entry['extensions'][KHR_MATERIALS_SPECULAR] = {
+            'specularColorFactor': [float(c) for c in material.specular[:3]]}
+        # Fresnel reflectance at normal incidence f0 = ((ior - 1) / (ior + 1))**2
+        root = float(np.sqrt(np.clip(material.f0, 0.0, 0.99)))
+        entry['extensions'][KHR_MATERIALS_IOR] = {'ior': (1 + root) / (1 - root)}
+    return entry
+
+
+def add_materials(builder: GLTFBuilder, materials: List[V3DMaterial]) -> List[int]:
+    """Adds the materials in V3D order and returns their glTF indices."""
+    indices = []
+    for material in materials:
+        entry = gltf_material(material)
+        for name in entry['extensions']:
+            builder.use_extension(name)
+        if not entry['extensions']:
+            del entry['extensions']
+        indices.append(builder.add_material(entry))
+    return indices
+
+
+def _quaternion_from_z(directions: np.ndarray) -> np.ndarray:
+    # Shortest rotations (x, y, z, w) taking +z to each of the unit directions
+    z = np.array([0.0, 0.0, 1.0])
+    axis = np.cross(z, directions)
+    w = 1.0 + directions @ z
+    quaternions = np.hstack((axis, w[:, None]))
+    # Opposite directions: half turn about x
+    quaternions[w < 1e-12] = [1.0, 0.0, 0.0, 0.0]
+    return quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+
+
+def add_header(builder: GLTFBuilder, header: Optional[V3DHeaderInformation]):
+    """Adds the camera and the lights of a V3D header.
+
+    V3D geometry is given in viewing coordinates: the camera sits at the origin looking down -z,
+    which is also the default orientation of a glTF camera node. Lights are directional and shine
+    from their position vector towards the origin.
+    """
+    if header is None:
+        return
+    width, height = header.canvasWidth or 0, header.canvasHeight or 0
+    aspect = width / height if width and height else None
+    zoom = header.initialZoom or 1.0
+    near, far = None, None
+    if header.minBound is not None and header.maxBound is not None:
+        near, far = -float(header.maxBound[2]), -float(header.minBound[2])
+
+    if header.orthographic:
+        camera = {'type': 'orthographic', 'orthographic': {'xmag': 1.0, 'ymag': 1.0, 'znear': 0.0, 'zfar': 1.0}}
+        if header.minBound is not None and header.maxBound is not None:
+            half = 0.5 * np.subtract(header.maxBound, header.minBound) / zoom
+            camera['orthographic'].update(xmag=float(half[0]), ymag=float(half[1]),
+                                          znear=max(near, 0.0), zfar=max(far, near + 1e-6))
+        builder.add_node({'camera': builder.add_camera(camera), 'name': 'camera'})
+    elif header.angleOfView:
+        perspective = {'yfov': float(2 * np.arctan(np.tan(0.5 * header.angleOfView) / zoom)),
+                       'znear': near if near is not None and near > 0 else 1e-3}
+        if aspect is not None:
+            perspective['aspectRatio'] = aspect
+        if far is not None and far > perspective['znear']:
+            perspective['zfar'] = far
+        camera = {'type': 'perspective', 'perspective': perspective}
+        builder.add_node({'camera': builder.add_camera(camera), 'name': 'camera'})
+
+    if header.lights:
+        positions = np.array([light.position for light in header.lights], dtype=np.float64)
+        directions = positions / np.maximum(np.linalg.norm(positions, axis=1, keepdims=True), 1e-300)
+        # The light shines along its node's -z axis, i.e. from the position towards the origin
+        rotations = _quaternion_from_z(directions)
+        lights = []
+        for light, rotation in zip(header.lights, rotations.tolist()):
+            color = np.asarray(light.color, dtype=np.float64)
+            intensity = float(color.max()) if color.max() > 0 else 0.0
+            lights.append({'type': 'directional', 'intensity': intensity,
+                           'color': (color / intensity).tolist() if intensity else [1.0, 1.0, 1.0]})
+            builder.add_node({'rotation': rotation,
+                              'extensions': {KHR_LIGHTS_PUNCTUAL: {'light': len(lights) - 1}}})
+        builder.gltf.setdefault('extensions', {})[KHR_LIGHTS_PUNCTUAL] = {'lights': lights}
+        builder.use_extension(KHR_LIGHTS_PUNCTUAL)
+
+    builder.gltf['scenes'][0]['extras'] = {'background': [float(c) for c in header.background]}
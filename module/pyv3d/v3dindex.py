@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Byte-offset index of the records in a decompressed V3D stream
+
+import os
+import numpy as np
+from typing import Optional, Tuple
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dlayouts import v3dfixed_object_types, record_dtype
+
+# Records that configure the scene rather than being objects of it
+v3dnonobject_types = frozenset((v3dtypes.v3dtypes_material, v3dtypes.v3dtypes_centers, v3dtypes.v3dtypes_header))
+
+# Version 2: lengths exclude the type number
+_INDEX_FORMAT_VERSION = 2
+
+
+def _field_words(typ: int, name: str, double_precision: bool) -> Optional[int]:
+    # Offset in words of a UINT field within the payload of a fixed-size record
+    fields = record_dtype(typ, double_precision).fields
+    return None if name not in fields else fields[name][1] // 4
+
+
+def index_sidecar(file_name: str) -> str:
+    return file_name + '.idx'
+
+
+class V3DObjectIndex:
+    """Type, payload offset and payload length of every record of a V3D stream.
+
+    Offsets point just past the type number into the decompressed stream; lengths exclude it.
+    Object numbers used by V3DReader.get_object count only the entries of ``object_records``,
+    matching the order of V3DReader.objects.
+    """
+
+    def __init__(self, types: np.ndarray, offsets: np.ndarray, lengths: np.ndarray,
+                 file_version: int, double_precision: bool, source_size: int = -1, source_mtime_ns: int = -1):
+        self.types = np.asarray(types, dtype=np.uint32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.file_version = file_version
+        self.double_precision = double_precision
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self._object_records: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @property
+    def object_records(self) -> np.ndarray:
+        if self._object_records is None:
+            mask = ~np.isin(self.types, np.fromiter(v3dnonobject_types, dtype=np.uint32))
+            self._object_records = np.flatnonzero(mask)
+        return self._object_records
+
+    @property
+    def num_objects(self) -> int:
+        return len(self.object_records)
+
+    def records_of_type(self, typ: int) -> np.ndarray:
+        return np.flatnonzero(self.types == typ)
+
+    def counts_by_type(self) -> dict[int, int]:
+        types, counts = np.unique(self.types, return_counts=True)
+        return dict(zip(types.tolist(), counts.tolist()))
+
+    def field_words(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Word positions in the stream of the material and center number of every object record.
+
+        Both arrays follow ``object_records``; -1 marks a record without that field.
+        """
+        records = self.object_records
+        types = self.types[records]
+        material_words = np.full(len(records), -1, dtype=np.int64)
+        center_words = np.full(len(records), -1, dtype=np.int64)
+        for typ in np.unique(types).tolist():
+            mask = types == typ
+            offsets = self.offsets[records[mask]]
+            if typ == v3dtypes.v3dtypes_triangles:
+                # Triangle groups end with their center and material numbers
+                ends = (offsets + self.lengths[records[mask]]) // 4
+                center_words[mask] = ends - 2
+                material_words[mask] = ends - 1
+            elif typ in v3dfixed_object_types:
+                material = _field_words(typ, 'material_id', self.double_precision)
+                center = _field_words(typ, 'center_index', self.double_precision)
+                if material is not None:
+                    material_words[mask] = offsets // 4 + material
+                if center is not None:
+                    center_words[mask] = offsets // 4 + center
+            elif typ != v3dtypes.v3dtypes_animation:
+                raise RuntimeError('No material and center numbers for objects of type {0}'.format(typ))
+        return material_words, center_words
+
+    def stamp(self, file_name: str):
+        stat = os.stat(file_name)
+        self.source_size = stat.st_size
+        self.source_mtime_ns = stat.st_mtime_ns
+
+    def matches(self, file_name: str) -> bool:
+        stat = os.stat(file_name)
+        return self.source_size == stat.st_size and self.source_mtime_ns == stat.st_mtime_ns
+
+    def save(self, file_name: str):
+        meta = np.array([_INDEX_FORMAT_VERSION, self.file_version, int(self.double_precision),
+                         self.source_size, self.source_mtime_ns], dtype=np.int64)
+        with open(file_name, 'wb') as fil:
+            np.savez(fil, meta=meta, types=self.types, offsets=self.offsets, lengths=self.lengths)
+
+    @classmethod
+    def load(cls, file_name: str) -> 'V3DObjectIndex':
+        with np.load(file_name) as data:
+            fmt, file_version, double_precision, source_size, source_mtime_ns = data['meta'].tolist()
+            if fmt != _INDEX_FORMAT_VERSION:
+                raise ValueError('Unsupported index format version {0}'.format(fmt))
+            return cls(data['types'], data['offsets'], data['lengths'], file_version, bool(double_precision),
+                       source_size, source_mtime_ns)
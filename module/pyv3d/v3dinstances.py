@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Instanced export of the analytic V3D primitives as shared unit meshes plus per-instance transforms
+
+import numpy as np
+from typing import Dict, List, Optional
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dobjects import V3DMaterial
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+from pyv3d.v3dprimitives import unit_sphere, unit_half_sphere, unit_cylinder, unit_disk, mesh_tubes
+from pyv3d.v3dgltf import GLTFBuilder, add_materials
+
+EXT_MESH_GPU_INSTANCING = 'EXT_mesh_gpu_instancing'
+
+
+def rotation_quaternions(polar: np.ndarray, azimuth: np.ndarray) -> np.ndarray:
+    """Quaternions (x, y, z, w) of Rz(azimuth) @ Ry(polar), matching v3dprimitives.rotations."""
+    half_polar = 0.5 * np.asarray(polar, dtype=np.float64)
+    half_azimuth = 0.5 * np.asarray(azimuth, dtype=np.float64)
+    cy, sy, cz, sz = np.cos(half_polar), np.sin(half_polar), np.cos(half_azimuth), np.sin(half_azimuth)
+    return np.stack((-sz * sy, cz * sy, sz * cy, cz * cy), axis=-1)
+
+
+class V3DInstances:
+    """All instances of one unit mesh: translations (N,3), rotations (N,4) as quaternions, scales (N,3)."""
+
+    def __init__(self, shape: str, template: V3DMesh, translations: np.ndarray, rotations: np.ndarray,
+                 scales: np.ndarray, material_ids: np.ndarray, center_indices: np.ndarray):
+        self.shape = shape
+        self.template = template
+        self.translations = np.asarray(translations, dtype=np.float32).reshape(-1, 3)
+        self.rotations = np.asarray(rotations, dtype=np.float32).reshape(-1, 4)
+        self.scales = np.asarray(scales, dtype=np.float32).reshape(-1, 3)
+        self.material_ids = np.asarray(material_ids, dtype=np.uint32)
+        self.center_indices = np.asarray(center_indices, dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return len(self.translations)
+
+    def select(self, mask: np.ndarray) -> 'V3DInstances':
+        return V3DInstances(self.shape, self.template, self.translations[mask], self.rotations[mask],
+                            self.scales[mask], self.material_ids[mask], self.center_indices[mask])
+
+    def by_material(self) -> Dict[int, 'V3DInstances']:
+        return {material_id: self.select(self.material_ids == material_id)
+                for material_id in np.unique(self.material_ids).tolist()}
+
+
+def _identity_rotations(n: int) -> np.ndarray:
+    rotations = np.zeros((n, 4))
+    rotations[:, 3] = 1.0
+    return rotations
+
+
+def _spheres(objects: V3DObjectArray, lod: int) -> V3DInstances:
+    return V3DInstances('sphere', unit_sphere(lod), objects.center, _identity_rotations(len(objects)),
+                        np.repeat(objects.radius[:, None], 3, axis=1), objects.material_id, objects.center_index)
+
+
+def _half_spheres(objects: V3DObjectArray, lod: int) -> V3DInstances:
+    return V3DInstances('halfSphere', unit_half_sphere(lod), objects.center,
+                        rotation_quaternions(objects.polar, objects.azimuth),
+                        np.repeat(objects.radius[:, None], 3, axis=1), objects.material_id, objects.center_index)
+
+
+def _cylinders(objects: V3DObjectArray, lod: int) -> V3DInstances:
+    return V3DInstances('cylinder', unit_cylinder(lod), objects.center,
+                        rotation_quaternions(objects.polar, objects.azimuth),
+                        np.stack((objects.radius, objects.radius, objects.height), axis=1),
+                        objects.material_id, objects.center_index)
+
+
+def _disks(objects: V3DObjectArray, lod: int) -> V3DInstances:
+    return V3DInstances('disk', unit_disk(lod), objects.center,
+                        rotation_quaternions(objects.polar, objects.azimuth),
+                        np.stack((objects.radius, objects.radius, np.ones(len(objects))), axis=1),
+                        objects.material_id, objects.center_index)
+
+
+_instancers = {
+    v3dtypes.v3dtypes_sphere: _spheres,
+    v3dtypes.v3dtypes_halfSphere: _half_spheres,
+    v3dtypes.v3dtypes_cylinder: _cylinders,
+    v3dtypes.v3dtypes_disk: _disks,
+}
+
+v3dinstanced_types = frozenset(_instancers)
+
+
+def collect_instances(scene: V3DColumnarScene, lod: int = 1) -> List[V3DInstances]:
+    """One V3DInstances per primitive type present in the scene.
+
+    Tubes each follow their own path and are not instanced.
+    """
+    return [_instancers[typ](group, lod) for typ, group in scene.groups.items() if typ in _instancers]
+
+
+def write_instances_npz(instances: List[V3DInstances], file_name: str, compressed: bool = True):
+    """Stores each unit mesh once and the per-instance arrays under '<shape>/<name>' keys."""
+    arrays = {}
+    for group in instances:
+        prefix = group.shape + '/'
+        arrays[prefix + 'positions'] = group.template.positions.astype(np.float32)
+        arrays[prefix + 'normals'] = group.template.normals.astype(np.float32)
+        arrays[prefix + 'indices'] = group.template.indices
+        arrays[prefix + 'translations'] = group.translations
+        arrays[prefix + 'rotations'] = group.rotations
+        arrays[prefix + 'scales'] = group.scales
+        arrays[prefix + 'material_ids'] = group.material_ids
+        arrays[prefix + 'center_indices'] = group.center_indices
+    (np.savez_compressed if compressed else np.savez)(file_name, **arrays)
+
+
+def add_instances(builder: GLTFBuilder, instances: List[V3DInstances], materials: Optional[List[int]] = None):
+    """Adds one node per (shape, material) with EXT_mesh_gpu_instancing transforms.
+
+    materials maps V3D material ids to glTF material indices of the builder.
+    """
+    for group in instances:
+        for material_id, part in group.by_material().items():
+            material = None if materials is None or material_id >= len(materials) else materials[material_id]
+            mesh = builder.add_mesh(group.template, material, name='{0}_{1}'.format(group.shape, material_id))
+            attributes = {
+                'TRANSLATION': builder.add_accessor(part.translations),
+                'ROTATION': builder.add_accessor(part.rotations),
+                'SCALE': builder.add_accessor(part.scales),
+            }
+            builder.use_extension(EXT_MESH_GPU_INSTANCING)
+            builder.add_node({'mesh': mesh, 'extensions': {EXT_MESH_GPU_INSTANCING: {'attributes': attributes}}})
+
+
+def add_primitives(builder: GLTFBuilder, scene: V3DColumnarScene, materials: Optional[List[int]] = None,
+                   lod: int = 1):
+    """Adds the primitives of a scene as instanced meshes; tubes are meshed directly."""
+    add_instances(builder, collect_instances(scene, lod), materials)
+    tubes = scene.get(v3dtypes.v3dtypes_tube)
+    if tubes is not None and len(tubes):
+        builder.add_mesh_nodes(mesh_tubes(tubes, lod), materials, 'tube')
+
+
+def write_instances_glb(scene: V3DColumnarScene, file_name: str, materials: Optional[List[V3DMaterial]] = None,
+                        lod: int = 1):
+    builder = GLTFBuilder()
+    add_primitives(builder, scene, None if materials is None else add_materials(builder, materials), lod)
+    builder.write_glb(file_name)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# On-disk layouts of the fixed-size V3D records
+
+import struct
+import numpy as np
+from typing import Dict, Tuple
+from pyv3d.v3dtypes import v3dtypes
+
+TY_FIELD = Tuple[str, str, int]
+
+# Each field is (name, kind, count), listed in stream order. Names follow the attribute names used in v3dobjects.
+v3dlayouts: Dict[int, Tuple[TY_FIELD, ...]] = {
+    v3dtypes.v3dtypes_material: (
+        ('diffuse', 'RGBA', 1), ('emissive', 'RGBA', 1), ('specular', 'RGBA', 1),
+        ('shininess', 'FLOAT', 1), ('metallic', 'FLOAT', 1), ('f0', 'FLOAT', 1), ('lightOn', 'FLOAT', 1)),
+    v3dtypes.v3dtypes_bezierPatch: (
+        ('control_pts', 'TRIPLE', 16), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_bezierPatchColor: (
+        ('control_pts', 'TRIPLE', 16), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 4)),
+    v3dtypes.v3dtypes_bezierTriangle: (
+        ('control_pts', 'TRIPLE', 10), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_bezierTriangleColor: (
+        ('control_pts', 'TRIPLE', 10), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 3)),
+    v3dtypes.v3dtypes_quad: (
+        ('control_pts', 'TRIPLE', 4), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_quadColor: (
+        ('control_pts', 'TRIPLE', 4), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 4)),
+    v3dtypes.v3dtypes_triangle: (
+        ('control_pts', 'TRIPLE', 3), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_triangleColor: (
+        ('control_pts', 'TRIPLE', 3), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 3)),
+    v3dtypes.v3dtypes_sphere: (
+        ('center', 'TRIPLE', 1), ('radius', 'REAL', 1), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_halfSphere: (
+        ('center', 'TRIPLE', 1), ('radius', 'REAL', 1), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('polar', 'REAL', 1), ('azimuth', 'REAL', 1)),
+    v3dtypes.v3dtypes_cylinder: (
+        ('center', 'TRIPLE', 1), ('radius', 'REAL', 1), ('height', 'REAL', 1),
+        ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('polar', 'REAL', 1), ('azimuth', 'REAL', 1), ('core', 'BOOL', 1)),
+    v3dtypes.v3dtypes_disk: (
+        ('center', 'TRIPLE', 1), ('radius', 'REAL', 1), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('polar', 'REAL', 1), ('azimuth', 'REAL', 1)),
+    v3dtypes.v3dtypes_tube: (
+        ('path', 'TRIPLE', 4), ('width', 'REAL', 1), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('core', 'BOOL', 1)),
+    v3dtypes.v3dtypes_curve: (
+        ('control_pts', 'TRIPLE', 4), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_line: (
+        ('control_pts', 'TRIPLE', 2), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1)),
+    v3dtypes.v3dtypes_pixel: (
+        ('point', 'TRIPLE', 1), ('width', 'REAL', 1), ('material_id', 'UINT', 1)),
+    # Colored lines and curves carry one color per end point after the material, like the colored
+    # triangles and quads
+    v3dtypes.v3dtypes_lineColor: (
+        ('control_pts', 'TRIPLE', 2), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 2)),
+    v3dtypes.v3dtypes_curveColor: (
+        ('control_pts', 'TRIPLE', 4), ('center_index', 'UINT', 1), ('material_id', 'UINT', 1),
+        ('colors', 'RGBA', 2)),
+    # A 4x4 matrix in row-major order applying to the objects that follow
+    v3dtypes.v3dtypes_transform: (
+        ('matrix', 'REAL', 16),),
+    # Marks the start of the element with the given number
+    v3dtypes.v3dtypes_element: (
+        ('element_id', 'UINT', 1),),
+}
+
+# Fixed-size geometry records, i.e. everything in the table except materials
+v3dfixed_object_types = frozenset(typ for typ in v3dlayouts if typ != v3dtypes.v3dtypes_material)
+
+
+def _field_dtype(kind: str, count: int, double_precision: bool) -> Tuple[str, Tuple[int, ...]]:
+    real = '>f8' if double_precision else '>f4'
+    if kind == 'TRIPLE':
+        shape = (3,) if count == 1 else (count, 3)
+        return real, shape
+    elif kind == 'RGBA':
+        shape = (4,) if count == 1 else (count, 4)
+        return '>f4', shape
+    elif kind == 'REAL':
+        return real, (() if count == 1 else (count,))
+    elif kind == 'FLOAT':
+        return '>f4', ()
+    elif kind in ('UINT', 'BOOL'):
+        return '>u4', ()
+    raise ValueError('Unknown field kind {0}'.format(kind))
+
+
+def record_dtype(typ: int, double_precision: bool = True) -> np.dtype:
+    """Big-endian structured dtype matching one record (without its type number)."""
+    fields = []
+    for name, kind, count in v3dlayouts[typ]:
+        base, shape = _field_dtype(kind, count, double_precision)
+        fields.append((name, base, shape) if shape else (name, base))
+    return np.dtype(fields)
+
+
+def record_size(typ: int, double_precision: bool = True) -> int:
+    return record_dtype(typ, double_precision).itemsize
+
+
+def record_sizes(double_precision: bool = True) -> Dict[int, int]:
+    return {typ: record_size(typ, double_precision) for typ in v3dlayouts}
+
+
+def _field_format(kind: str, count: int, double_precision: bool) -> str:
+    real = 'd' if double_precision else 'f'
+    if kind == 'TRIPLE':
+        return '{0}{1}'.format(3 * count, real)
+    elif kind == 'RGBA':
+        return '{0}f'.format(4 * count)
+    elif kind == 'REAL':
+        return '{0}{1}'.format(count, real)
+    elif kind == 'FLOAT':
+        return '{0}f'.format(count)
+    elif kind in ('UINT', 'BOOL'):
+        return '{0}L'.format(count)
+    raise ValueError('Unknown field kind {0}'.format(kind))
+
+
+def record_struct(typ: int, double_precision: bool = True) -> struct.Struct:
+    """Precompiled struct decoding one record into a flat tuple of its scalars."""
+    return struct.Struct('>' + ''.join(_field_format(kind, count, double_precision)
+                                       for _, kind, count in v3dlayouts[typ]))
+
+
+def record_structs(double_precision: bool = True) -> Dict[int, struct.Struct]:
+    return {typ: record_struct(typ, double_precision) for typ in v3dlayouts}
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Lazily decoded V3D objects: handles that parse their payload on first use
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, List, Optional
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import AV3Dobject
+
+
+class V3DDecodeCache:
+    """Least recently used cache of decoded records, keyed by record number."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[int, AV3Dobject]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, record: int, decode: Callable[[int], AV3Dobject]) -> AV3Dobject:
+        entries = self._entries
+        obj = entries.get(record)
+        if obj is not None:
+            self.hits += 1
+            entries.move_to_end(record)
+            return obj
+        self.misses += 1
+        obj = decode(record)
+        if self.maxsize > 0:
+            entries[record] = obj
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        return obj
+
+    def clear(self):
+        self._entries.clear()
+
+
+class V3DLazyObject:
+    """Handle to one object record of a V3D stream.
+
+    The type, record number, payload offset, material and center numbers are read when the
+    handle is made. Any other attribute decodes the payload through the reader's cache and is
+    looked up on the decoded object, so a handle can stand in for it; ``decode()`` returns the
+    object itself for isinstance checks.
+    """
+    __slots__ = ('_reader', 'obj_type', 'record', 'offset', 'material_id', 'center_index')
+
+    def __init__(self, reader, obj_type: int, record: int, offset: int, material_id: int,
+                 center_index: Optional[int]):
+        self._reader = reader
+        self.obj_type = obj_type
+        self.record = record
+        self.offset = offset
+        self.material_id = material_id
+        self.center_index = center_index
+
+    def decode(self) -> AV3Dobject:
+        return self._reader.decode_cache.get(self.record, self._reader._decode_record)
+
+    @property
+    def double_precision(self) -> bool:
+        return self._reader.index.double_precision
+
+    def payload(self) -> memoryview:
+        """The encoded record after its type number, as stored in the reader's stream."""
+        length = int(self._reader.index.lengths[self.record])
+        return self._reader.raw_buffer[self.offset:self.offset + length]
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes the handle does not hold itself
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.decode(), name)
+
+    def __repr__(self) -> str:
+        return 'V3DLazyObject(type={0}, offset={1}, material_id={2}, center_index={3})'.format(
+            self.obj_type, self.offset, self.material_id, self.center_index)
+
+
+def decode_triangles(obj: Any) -> Any:
+    """The decoded object for a lazy handle of a triangle group record, otherwise obj itself.
+
+    Lets consumers that pick out triangle groups with isinstance take lazy readers' objects.
+    """
+    if isinstance(obj, V3DLazyObject) and obj.obj_type == v3dtypes.v3dtypes_triangles:
+        return obj.decode()
+    return obj
+
+
+class V3DAnimationFrames(Sequence):
+    """Frames of an animation record, each decoded into a list of records when first accessed.
+
+    Each frame is held as its encoded records along with the preamble and reader options of its
+    file, so the frames do not depend on the reader that found them and can be pickled.
+    """
+
+    def __init__(self, data: List[bytes], preamble: bytes, options: Dict[str, Any]):
+        self._data = data
+        self._preamble = preamble
+        self._options = options
+        self._frames: Dict[int, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('frame index out of range')
+        frame = self._frames.get(i)
+        if frame is None:
+            frame = self._frames[i] = self._decode(self._data[i])
+        return frame
+
+    def _decode(self, data: bytes) -> List[Any]:
+        from pyv3d.v3dconv import V3DReader
+        reader = V3DReader(memoryview(self._preamble + data), **self._options)
+        return [record for _, record in reader.iter_objects()]
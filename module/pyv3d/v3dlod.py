@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Levels of detail for triangle meshes by vertex clustering
+
+import numpy as np
+from typing import List, Optional, Sequence, Tuple, Union
+from pyv3d.v3dobjects import V3DTriangleGroups, V3DTriangleGroupsColor
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dtessellate import normalize
+
+_SQRT3 = np.sqrt(3.0)
+
+
+def _cluster_sums(labels: np.ndarray, values: np.ndarray, num_clusters: int) -> np.ndarray:
+    """Per-cluster sums of the rows of values (N, k), shape (num_clusters, k)."""
+    columns = np.ascontiguousarray(values.T, dtype=np.float64)
+    return np.stack([np.bincount(labels, weights=column, minlength=num_clusters) for column in columns], axis=1)
+
+
+def _quadric_positions(mesh: V3DMesh, labels: np.ndarray, num_clusters: int, means: np.ndarray,
+                       cell_lo: np.ndarray, cell_size: float) -> np.ndarray:
+    # Minimizes the summed squared distances to the planes of the triangles around each cluster
+    corners = mesh.positions[mesh.indices]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    area = 0.5 * np.linalg.norm(cross, axis=1)
+    normal = normalize(cross)
+    offset = -np.einsum('ij,ij->i', normal, corners[:, 0])
+    # Upper triangle of n n^T and the vector n d, weighted by area
+    rows, cols = np.triu_indices(3)
+    terms = np.hstack((normal[:, rows] * normal[:, cols], normal * offset[:, None])) * area[:, None]
+    sums = sum(_cluster_sums(labels[mesh.indices[:, corner]], terms, num_clusters) for corner in range(3))
+
+    a = np.empty((num_clusters, 3, 3))
+    a[:, rows, cols] = sums[:, :6]
+    a[:, cols, rows] = sums[:, :6]
+    b = -sums[:, 6:]
+    # A small pull towards the mean keeps flat and ridge clusters well posed
+    weight = 1e-3 * np.trace(a, axis1=1, axis2=2) / 3 + 1e-12
+    a += weight[:, None, None] * np.eye(3)
+    b += weight[:, None] * means
+    positions = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+    return np.clip(positions, cell_lo, cell_lo + cell_size)
+
+
+def _labels(keys: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense labels of integer keys in [0, size) and the first element of every label."""
+    if size <= 4 * len(keys) + 1024:
+        # Occupancy table instead of a sort when the keys are not much sparser than the elements
+        occupied = np.zeros(size, dtype=bool)
+        occupied[keys] = True
+        dense = np.cumsum(occupied) - 1
+        labels = dense[keys]
+        first = np.empty(int(dense[-1]) + 1, dtype=np.int64)
+        first[labels[::-1]] = np.arange(len(keys) - 1, -1, -1)
+        return labels, first
+    _, first, labels = np.unique(keys, return_index=True, return_inverse=True)
+    return labels.ravel(), first
+
+
+def _packed(columns: np.ndarray) -> Optional[Tuple[np.ndarray, int]]:
+    """Non-negative integer columns (N, k) as one int64 key per row with its range, if that fits."""
+    sizes = columns.max(axis=0).astype(np.int64) + 1 if len(columns) else np.ones(columns.shape[1], dtype=np.int64)
+    if np.sum(np.log2(sizes.astype(np.float64))) >= 62:
+        return None
+    keys = np.zeros(len(columns), dtype=np.int64)
+    for k, size in enumerate(sizes.tolist()):
+        keys *= size
+        keys += columns[:, k]
+    return keys, int(np.prod(sizes))
+
+
+def cluster_vertices(mesh: V3DMesh, cell_size: float, representative: str = 'mean') -> V3DMesh:
+    """Simplifies mesh by merging all vertices within each cube of a grid of the given cell size.
+
+    Every vertex moves by at most the cell diagonal, sqrt(3) * cell_size. The representative
+    of a cell is the mean of its vertices, or with representative='quadric' the point closest to
+    the planes of the adjacent triangles, clamped to the cell. Normals are averaged and
+    renormalized, colors averaged. Triangles that collapse are removed, as are duplicates.
+    """
+    # Also rejects NaN
+    if not cell_size > 0:
+        raise ValueError('Cell size must be positive, got {0}'.format(cell_size))
+    if mesh.num_triangles == 0:
+        return mesh
+    origin = mesh.positions.min(axis=0)
+    cells = np.floor((mesh.positions - origin) / cell_size).astype(np.int64)
+    packed = _packed(cells)
+    if packed is not None:
+        labels, first = _labels(*packed)
+    else:
+        cells = np.ascontiguousarray(cells)
+        _, first, labels = np.unique(cells.view(np.dtype((np.void, 3 * cells.itemsize))).ravel(),
+                                     return_index=True, return_inverse=True)
+        labels = labels.ravel()
+    num_clusters = len(first)
+
+    counts = np.bincount(labels, minlength=num_clusters).astype(np.float64)[:, None]
+    positions = _cluster_sums(labels, mesh.positions, num_clusters) / counts
+    if representative == 'quadric':
+        positions = _quadric_positions(mesh, labels, num_clusters, positions, origin + cells[first] * cell_size,
+                                       cell_size)
+    elif representative != 'mean':
+        raise ValueError('Unknown representative {0}'.format(representative))
+    normals = normalize(_cluster_sums(labels, mesh.normals, num_clusters))
+    colors = None if mesh.colors is None else \
+        _cluster_sums(labels, mesh.colors.astype(np.float64), num_clusters) / counts
+
+    indices = labels[mesh.indices]
+    keep = (indices[:, 0] != indices[:, 1]) & (indices[:, 1] != indices[:, 2]) & (indices[:, 2] != indices[:, 0])
+    indices = indices[keep]
+    material_ids, center_indices = mesh.material_ids[keep], mesh.center_indices[keep]
+
+    # Triangles mapped onto the same cells with the same material are kept once; the rotation
+    # to the smallest index first preserves orientation
+    start = np.argmin(indices, axis=1)
+    rotated = np.take_along_axis(indices, (start[:, None] + np.arange(3)) % 3, axis=1)
+    rows = np.column_stack((rotated, material_ids, center_indices)).astype(np.int64)
+    packed = _packed(rows)
+    if packed is not None:
+        _, unique_rows = np.unique(packed[0], return_index=True)
+    else:
+        _, unique_rows = np.unique(rows, axis=0, return_index=True)
+    unique_rows.sort()
+
+    simplified = V3DMesh(positions, normals, indices[unique_rows], colors, material_ids[unique_rows],
+                         center_indices[unique_rows])
+    # Drop the clusters no remaining triangle uses
+    return simplified.select_triangles(np.ones(simplified.num_triangles, dtype=bool))
+
+
+def cell_size_for_error(max_error: float) -> float:
+    """Largest cell size whose clustering moves no vertex further than max_error."""
+    if not max_error >= 0:
+        raise ValueError('Maximum error must not be negative, got {0}'.format(max_error))
+    return max_error / _SQRT3
+
+
+def lod_levels(mesh: V3DMesh, errors: Optional[Sequence[float]] = None, levels: int = 3,
+               representative: str = 'mean') -> List[Tuple[float, V3DMesh]]:
+    """Simplified versions of mesh as (max_error, mesh) pairs, finest first.
+
+    By default the errors are 1/512, 1/128 and 1/32 of the bounding box diagonal and so on by
+    factors of four.
+    """
+    if errors is None:
+        diagonal = float(np.linalg.norm(mesh.positions.max(axis=0) - mesh.positions.min(axis=0))) \
+            if mesh.num_vertices else 0.0
+        errors = [diagonal / 512 * 4 ** level for level in range(levels)]
+    cell_sizes = [cell_size_for_error(error) for error in errors]
+    return [(error, cluster_vertices(mesh, cell_size, representative) if cell_size > 0 else mesh)
+            for error, cell_size in zip(errors, cell_sizes)]
+
+
+def triangle_group_lods(group: V3DTriangleGroups, errors: Optional[Sequence[float]] = None, levels: int = 3,
+                        representative: str = 'mean') -> List[Tuple[float,
+                                                                    Union[V3DTriangleGroups, V3DTriangleGroupsColor]]]:
+    """lod_levels for a single triangle group, returned as triangle groups."""
+    material_id = 0 if group.material_id is None else group.material_id
+    center_index = 0 if group.center_index is None else group.center_index
+    return [(error, mesh.to_triangle_group(material_id, center_index))
+            for error, mesh in lod_levels(V3DMesh.from_triangle_group(group), errors, levels, representative)]
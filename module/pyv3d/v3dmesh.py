@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# Indexed triangle meshes built from V3D geometry
+
+import numpy as np
+from typing import Iterable, List, Optional, Sequence, Union
+from pyv3d.v3dobjects import *
+from pyv3d.v3dlazy import decode_triangles
+
+_WHITE = np.ones(4)
+
+
+class V3DMesh:
+    """A single indexed triangle mesh with per-vertex normals and optional colors.
+
+    Unlike V3DTriangleGroups, positions, normals and colors share one index buffer. Material and
+    center indices are stored per triangle so that meshes with different materials can be merged.
+    """
+
+    def __init__(self, positions: np.ndarray, normals: np.ndarray, indices: np.ndarray,
+                 colors: Optional[np.ndarray] = None, material_ids: Optional[np.ndarray] = None,
+                 center_indices: Optional[np.ndarray] = None):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+        self.indices = np.asarray(indices, dtype=np.uint32).reshape(-1, 3)
+        self.colors = None if colors is None else np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+        num_triangles = len(self.indices)
+        self.material_ids = np.zeros(num_triangles, dtype=np.uint32) if material_ids is None else \
+            np.broadcast_to(np.asarray(material_ids, dtype=np.uint32), (num_triangles,))
+        self.center_indices = np.zeros(num_triangles, dtype=np.uint32) if center_indices is None else \
+            np.broadcast_to(np.asarray(center_indices, dtype=np.uint32), (num_triangles,))
+        assert len(self.positions) == len(self.normals)
+        assert self.colors is None or len(self.colors) == len(self.positions)
+
+    @property
+    def num_vertices(self) -> int:
+        return len(self.positions)
+
+    @property
+    def num_triangles(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def empty(cls) -> 'V3DMesh':
+        return cls(np.empty((0, 3)), np.empty((0, 3)), np.empty((0, 3), dtype=np.uint32))
+
+    @classmethod
+    def concatenate(cls, meshes: Sequence['V3DMesh']) -> 'V3DMesh':
+        meshes = [mesh for mesh in meshes if mesh.num_triangles > 0]
+        if not meshes:
+            return cls.empty()
+        if len(meshes) == 1:
+            return meshes[0]
+
+        vertex_offsets = np.cumsum([0] + [mesh.num_vertices for mesh in meshes[:-1]])
+        triangle_counts = [mesh.num_triangles for mesh in meshes]
+        indices = np.concatenate([mesh.indices for mesh in meshes]).astype(np.int64)
+        indices += np.repeat(vertex_offsets, triangle_counts)[:, None]
+
+        colors = None
+        if any(mesh.colors is not None for mesh in meshes):
+            colors = np.concatenate([mesh.colors if mesh.colors is not None else
+                                     np.broadcast_to(_WHITE, (mesh.num_vertices, 4)) for mesh in meshes])
+
+        return cls(np.concatenate([mesh.positions for mesh in meshes]),
+                   np.concatenate([mesh.normals for mesh in meshes]),
+                   indices, colors,
+                   np.concatenate([mesh.material_ids for mesh in meshes]),
+                   np.concatenate([mesh.center_indices for mesh in meshes]))
+
+    @classmethod
+    def from_triangle_group(cls, obj: V3DTriangleGroups) -> 'V3DMesh':
+        """Converts a triangle group, duplicating vertices only when its index arrays disagree."""
+        positions = np.asarray(obj.positions, dtype=np.float64).reshape(-1, 3)
+        normals = np.asarray(obj.normals, dtype=np.float64).reshape(-1, 3)
+        pos_indices = np.asarray(obj.position_indices, dtype=np.int64).reshape(-1, 3)
+        normal_indices = np.asarray(obj.normals_indices, dtype=np.int64).reshape(-1, 3)
+        colors = None
+        color_indices = None
+        if isinstance(obj, V3DTriangleGroupsColor):
+            colors = np.asarray(obj.colors, dtype=np.float32).reshape(-1, 4)
+            color_indices = np.asarray(obj.color_indices, dtype=np.int64).reshape(-1, 3)
+
+        shared = len(normals) == len(positions) and np.array_equal(pos_indices, normal_indices)
+        if colors is not None:
+            shared = shared and len(colors) == len(positions) and np.array_equal(pos_indices, color_indices)
+
+        material_id = 0 if obj.material_id is None else obj.material_id
+        center_index = 0 if obj.center_index is None else obj.center_index
+        if shared:
+            return cls(positions, normals, pos_indices, colors, material_id, center_index)
+
+        # One vertex per triangle corner
+        corners = np.arange(3 * len(pos_indices)).reshape(-1, 3)
+        return cls(positions[pos_indices.ravel()], normals[normal_indices.ravel()], corners,
+                   None if colors is None else colors[color_indices.ravel()], material_id, center_index)
+
+    @classmethod
+    def from_objects(cls, objects: Iterable[AV3Dobject]) -> 'V3DMesh':
+        return cls.concatenate([cls.from_triangle_group(obj) for obj in map(decode_triangles, objects)
+                                if isinstance(obj, V3DTriangleGroups)])
+
+    def select_triangles(self, mask: np.ndarray) -> 'V3DMesh':
+        """Submesh of the selected triangles, with unused vertices dropped."""
+        indices = self.indices[mask]
+        used, remapped = np.unique(indices, return_inverse=True)
+        return V3DMesh(self.positions[used], self.normals[used], remapped.reshape(-1, 3),
+                       None if self.colors is None else self.colors[used],
+                       self.material_ids[mask], self.center_indices[mask])
+
+    def weld(self, tolerance: float = 1e-6, normal_tolerance: float = 1e-3, color_tolerance: float = 1.0 / 512,
+             drop_degenerate: bool = True) -> 'V3DMesh':
+        """Merges vertices whose position, normal and color agree up to the tolerances.
+
+        Each attribute is quantized to its tolerance and the quantized rows are packed into one
+        fixed-size byte key per vertex, so a single np.unique finds the distinct vertices. The
+        first vertex of every class is kept. Triangles that collapse to an edge or point are
+        dropped unless drop_degenerate is False.
+        """
+        columns = [np.round(self.positions / tolerance), np.round(self.normals / normal_tolerance)]
+        if self.colors is not None:
+            columns.append(np.round(self.colors / color_tolerance))
+        quantized = np.ascontiguousarray(np.hstack(columns).astype(np.int64))
+        keys = quantized.view(np.dtype((np.void, quantized.itemsize * quantized.shape[1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        indices = inverse.ravel()[self.indices]
+
+        material_ids, center_indices = self.material_ids, self.center_indices
+        if drop_degenerate:
+            keep = (indices[:, 0] != indices[:, 1]) & (indices[:, 1] != indices[:, 2]) & \
+                   (indices[:, 2] != indices[:, 0])
+            indices, material_ids, center_indices = indices[keep], material_ids[keep], center_indices[keep]
+        return V3DMesh(self.positions[first], self.normals[first], indices,
+                       None if self.colors is None else self.colors[first], material_ids, center_indices)
+
+    def to_triangle_group(self, material_id: int = 0,
+                          center_index: int = 0) -> Union[V3DTriangleGroups, V3DTriangleGroupsColor]:
+        """The whole mesh as one triangle group sharing a single index buffer."""
+        if self.colors is None:
+            return V3DTriangleGroups(self.positions, self.normals, self.indices, self.indices,
+                                     material_id, center_index)
+        return V3DTriangleGroupsColor(self.positions, self.normals, self.colors, self.indices,
+                                      self.indices, self.indices, material_id, center_index)
+
+    def to_triangle_groups(self) -> List[Union[V3DTriangleGroups, V3DTriangleGroupsColor]]:
+        """Splits the mesh into one triangle group per (material, center) pair."""
+        keys = (self.material_ids.astype(np.uint64) << np.uint64(32)) | self.center_indices.astype(np.uint64)
+        groups = []
+        for key in np.unique(keys).tolist():
+            part = self.select_triangles(keys == key)
+            groups.append(part.to_triangle_group(key >> 32, key & 0xffffffff))
+        return groups
+
+
+def merge_triangle_groups(objects: Iterable[AV3Dobject]) -> List[Union[V3DTriangleGroups, V3DTriangleGroupsColor]]:
+    """Concatenates all triangle groups sharing a material and center index into one group each.
+
+    Indices are offset by the vertex counts of the preceding groups; groups whose normal or
+    color indices differ from their position indices are de-indexed first. Groups without
+    colors merged with colored ones get white vertices. The result is ordered by first
+    appearance of each (material, center) pair; other objects are skipped.
+    """
+    batches = {}
+    for obj in map(decode_triangles, objects):
+        if isinstance(obj, V3DTriangleGroups):
+            key = (0 if obj.material_id is None else obj.material_id,
+                   0 if obj.center_index is None else obj.center_index)
+            batches.setdefault(key, []).append(V3DMesh.from_triangle_group(obj))
+    return [V3DMesh.concatenate(meshes).to_triangle_group(*key) for key, meshes in batches.items()]
+
+
+def _shares_indices(indices, position_indices) -> bool:
+    return indices is position_indices or np.array_equal(np.asarray(indices), np.asarray(position_indices))
+
+
+def _triangle_group_nbytes(obj: V3DTriangleGroups) -> int:
+    # Size of the group's arrays as single precision floats and 32-bit indices; like V3DWriter, normal
+    # and color indices equal to the position indices are counted once
+    index_sets = 1 + (not _shares_indices(obj.normals_indices, obj.position_indices))
+    size = 12 * (len(obj.positions) + len(obj.normals))
+    if isinstance(obj, V3DTriangleGroupsColor):
+        size += 16 * len(obj.colors)
+        index_sets += not _shares_indices(obj.color_indices, obj.position_indices)
+    return size + 12 * index_sets * len(obj.position_indices)
+
+
+class V3DWeldReport:
+    """Sizes before and after welding; vertices count the entries of the position arrays."""
+
+    def __init__(self, vertices_before: int, vertices_after: int, triangles_before: int, triangles_after: int,
+                 bytes_before: int, bytes_after: int):
+        self.vertices_before = vertices_before
+        self.vertices_after = vertices_after
+        self.triangles_before = triangles_before
+        self.triangles_after = triangles_after
+        self.bytes_before = bytes_before
+        self.bytes_after = bytes_after
+
+    @property
+    def reduction(self) -> float:
+        """Fraction of the bytes saved."""
+        return 1.0 - self.bytes_after / self.bytes_before if self.bytes_before else 0.0
+
+    def __repr__(self) -> str:
+        return 'V3DWeldReport(vertices {0} -> {1}, triangles {2} -> {3}, bytes {4} -> {5}, {6:.1%} saved)'.format(
+            self.vertices_before, self.vertices_after, self.triangles_before, self.triangles_after,
+            self.bytes_before, self.bytes_after, self.reduction)
+
+
+def weld_triangle_groups(objects: Iterable[AV3Dobject], tolerance: float = 1e-6, normal_tolerance: float = 1e-3,
+                         color_tolerance: float = 1.0 / 512, merge: bool = True):
+    """Welds triangle groups and reports the reduction; returns (groups, V3DWeldReport).
+
+    With merge=True, groups sharing a material and center are merged first so that positions
+    repeated across groups are stored once.
+    """
+    objects = [obj for obj in map(decode_triangles, objects) if isinstance(obj, V3DTriangleGroups)]
+    groups = merge_triangle_groups(objects) if merge else objects
+    welded = [V3DMesh.from_triangle_group(obj).weld(tolerance, normal_tolerance, color_tolerance).to_triangle_group(
+        0 if obj.material_id is None else obj.material_id, 0 if obj.center_index is None else obj.center_index)
+        for obj in groups]
+    report = V3DWeldReport(sum(len(obj.positions) for obj in objects), sum(len(obj.positions) for obj in welded),
+                           sum(len(obj.position_indices) for obj in objects),
+                           sum(len(obj.position_indices) for obj in welded),
+                           sum(_triangle_group_nbytes(obj) for obj in objects),
+                           sum(_triangle_group_nbytes(obj) for obj in welded))
+    return welded, report
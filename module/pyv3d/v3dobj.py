@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Wavefront OBJ/MTL export of V3D triangle groups
+
+import os
+import numpy as np
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import BinaryIO, Iterable, List, Optional
+from pyv3d.v3dobjects import *
+from pyv3d.v3dlazy import decode_triangles
+
+_ROWS_PER_BLOCK = 1 << 16
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+# Scaled values below this are integers exactly representable as doubles
+_MAX_EXACT = 2.0 ** 53
+
+
+# Numbers are rendered into a (rows, width) byte matrix padded with NUL bytes, which are dropped when the
+# block is flattened. This keeps formatting of whole blocks inside NumPy.
+def _uint_chars(values: np.ndarray) -> np.ndarray:
+    num_digits = len(str(int(values.max()))) if len(values) else 1
+    values = values.astype(np.int32 if num_digits < 10 else np.int64)
+    chars = np.empty((len(values), num_digits), dtype=np.uint8)
+    rest = values
+    for k in range(num_digits - 1, -1, -1):
+        rest, digit = np.divmod(rest, 10)
+        chars[:, k] = digit
+    chars += ord('0')
+    chars[:, :-1][values[:, None] < _POW10[num_digits - 1:0:-1]] = 0
+    return chars
+
+
+def _fixed_chars(values: np.ndarray, precision: int) -> np.ndarray:
+    scale = 10 ** precision
+    product = np.abs(values) * scale
+    scaled = np.rint(product)
+    # The product is rounded, so values within its error of a half unit are rounded again from their exact
+    # decimal expansion, half to even as printf does
+    for i in np.flatnonzero(np.abs(product - np.floor(product) - 0.5) <= np.spacing(product)):
+        scaled[i] = int(Decimal(abs(float(values[i]))).scaleb(precision).to_integral_value(ROUND_HALF_EVEN))
+    scaled = scaled.astype(np.int64)
+    sign = np.where(np.signbit(values), ord('-'), 0).astype(np.uint8)[:, None]
+    if precision == 0:
+        return np.hstack((sign, _uint_chars(scaled)))
+    point = np.full((len(values), 1), ord('.'), dtype=np.uint8)
+    fraction = _uint_chars(scaled % scale + scale)[:, 1:]
+    return np.hstack((sign, _uint_chars(scaled // scale), point, fraction))
+
+
+def _format_rows(prefix: bytes, columns: List[np.ndarray], separators: List[bytes]) -> bytes:
+    parts = [np.broadcast_to(np.frombuffer(prefix, dtype=np.uint8), (len(columns[0]), len(prefix)))]
+    for column, separator in zip(columns, separators):
+        parts.append(column)
+        parts.append(np.broadcast_to(np.frombuffer(separator, dtype=np.uint8), (len(column), len(separator))))
+    chars = np.concatenate(parts, axis=1)
+    return chars[chars != 0].tobytes()
+
+
+def _write_real_rows(fil: BinaryIO, prefix: str, rows: np.ndarray, precision: int):
+    separators = [b' '] * (rows.shape[1] - 1) + [b'\n']
+    limit = _MAX_EXACT / 10 ** precision
+    for start in range(0, len(rows), _ROWS_PER_BLOCK):
+        block = rows[start:start + _ROWS_PER_BLOCK]
+        if np.all(np.abs(block) < limit):
+            fil.write(_format_rows(prefix.encode(), [_fixed_chars(block[:, i], precision)
+                                                     for i in range(block.shape[1])], separators))
+        else:
+            # Non-finite or huge values take the printf route
+            row_format = prefix + ' '.join(['%.{0}f'.format(precision)] * block.shape[1]) + '\n'
+            fil.write(((row_format * len(block)) % tuple(block.ravel().tolist())).encode())
+
+
+def _write_face_rows(fil: BinaryIO, faces: np.ndarray):
+    separators = [b'//', b' ', b'//', b' ', b'//', b'\n']
+    for start in range(0, len(faces), _ROWS_PER_BLOCK):
+        block = faces[start:start + _ROWS_PER_BLOCK]
+        fil.write(_format_rows(b'f ', [_uint_chars(block[:, i]) for i in range(6)], separators))
+
+
+def vertex_colors(obj: V3DTriangleGroupsColor) -> np.ndarray:
+    """Colors per position entry; where several colors land on one position the last one is used."""
+    pos_indices = np.asarray(obj.position_indices, dtype=np.int64).ravel()
+    color_indices = np.asarray(obj.color_indices, dtype=np.int64).ravel()
+    colors = np.asarray(obj.colors, dtype=np.float64).reshape(-1, 4)
+    result = np.ones((len(obj.positions), 4))
+    result[pos_indices] = colors[color_indices]
+    return result
+
+
+def material_name(material_id: Optional[int]) -> str:
+    return 'material_{0}'.format(0 if material_id is None else material_id)
+
+
+def write_mtl(materials: List[V3DMaterial], out_name: str, precision: int = 6):
+    real = '%.{0}f'.format(precision)
+    with open(out_name, 'w', buffering=1 << 20) as fil:
+        for i, material in enumerate(materials):
+            roughness = 1.0 - material.shininess
+            fil.write('newmtl {0}\n'.format(material_name(i)))
+            fil.write(('Kd {0} {0} {0}\nKe {0} {0} {0}\nKs {0} {0} {0}\nd {0}\n'.format(real)) % (
+                *material.diffuse[:3], *material.emissive[:3], *material.specular[:3], material.diffuse[3]))
+            fil.write(('Ns {0}\nPm {0}\nPr {0}\n'.format(real)) % (
+                material.shininess * 1000.0, material.metallic, roughness))
+            fil.write('illum {0}\n\n'.format(2 if material.lightOn else 0))
+
+
+def write_obj(objects: Iterable[AV3Dobject], out_name: str, materials: Optional[List[V3DMaterial]] = None,
+              scale: float = 1.0, precision: int = 6, vertex_color: bool = True):
+    """Writes every triangle group of objects as one OBJ group; other objects are skipped.
+
+    Vertices, normals and faces of each group are formatted block-wise in NumPy. When
+    materials are given, an .mtl file is written next to the .obj and each group selects its
+    material with usemtl. Per-vertex colors of V3DTriangleGroupsColor are emitted as the common
+    ``v x y z r g b`` extension.
+    """
+    with open(out_name, 'wb', buffering=1 << 22) as fil:
+        if materials:
+            mtl_name = os.path.splitext(out_name)[0] + '.mtl'
+            write_mtl(materials, mtl_name, precision)
+            fil.write('mtllib {0}\n'.format(os.path.basename(mtl_name)).encode())
+        fil.write(b'\n')
+
+        base_position_offset = 1
+        base_normal_offset = 1
+        k = 0
+        for obj in objects:
+            obj = decode_triangles(obj)
+            if not isinstance(obj, V3DTriangleGroups):
+                continue
+            positions = np.asarray(obj.positions, dtype=np.float64).reshape(-1, 3) * scale
+            normals = np.asarray(obj.normals, dtype=np.float64).reshape(-1, 3)
+            pos_indices = np.asarray(obj.position_indices, dtype=np.int64).reshape(-1, 3)
+            normal_indices = np.asarray(obj.normals_indices, dtype=np.int64).reshape(-1, 3)
+
+            fil.write('g triangles_{0}\n'.format(k).encode())
+            if materials:
+                fil.write('usemtl {0}\n'.format(material_name(obj.material_id)).encode())
+
+            if vertex_color and isinstance(obj, V3DTriangleGroupsColor):
+                rgb = vertex_colors(obj)[:, :3]
+                _write_real_rows(fil, 'v ', np.hstack((positions, rgb)), precision)
+            else:
+                _write_real_rows(fil, 'v ', positions, precision)
+            _write_real_rows(fil, 'vn ', normals, precision)
+
+            faces = np.empty((len(pos_indices), 3, 2), dtype=np.int64)
+            faces[:, :, 0] = pos_indices + base_position_offset
+            faces[:, :, 1] = normal_indices + base_normal_offset
+            _write_face_rows(fil, faces.reshape(-1, 6))
+
+            base_position_offset += len(positions)
+            base_normal_offset += len(normals)
+            k += 1
+
+
+def write_reader_obj(reader, out_name: str, scale: float = 1.0, precision: int = 6, vertex_color: bool = True):
+    """Exports the triangle groups and materials decoded by a V3DReader."""
+    write_obj(reader.objects, out_name, reader.materials, scale, precision, vertex_color)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 from .typehints import *
-from typing import Optional
+from typing import Optional, Sequence
 
 class AV3Dobject:
     def __init__(self, material_id: Optional[int] = None, center_index: Optional[int] = None):
@@ -199,6 +199,40 @@ class V3DLine(AV3Dobject):
         self.z1 = z1
 
 
+class V3DLineColor(V3DLine):
+    def __init__(self, z0: TY_TRIPLE, z1: TY_TRIPLE, colors: Tuple[TY_RGBA, TY_RGBA], material_id: int = None,
+                 center_index: int = None):
+        super().__init__(z0, z1, material_id, center_index)
+        self.colors = colors
+
+
+class V3DCurveColor(V3DCurve):
+    def __init__(self, z0: TY_TRIPLE, c0: TY_TRIPLE, c1: TY_TRIPLE, z1: TY_TRIPLE, colors: Tuple[TY_RGBA, TY_RGBA],
+                 material_id: int = None, center_index: int = None):
+        super().__init__(z0, c0, c1, z1, material_id, center_index)
+        self.colors = colors
+
+
+class V3DTransform(AV3Dobject):
+    def __init__(self, matrix: Tuple[float, ...]):
+        super().__init__()
+        # 16 values of a 4x4 matrix in row-major order
+        self.matrix = matrix
+
+
+class V3DElement(AV3Dobject):
+    def __init__(self, element_id: int):
+        super().__init__()
+        self.element_id = element_id
+
+
+class V3DAnimation(AV3Dobject):
+    def __init__(self, frames: Sequence[List[AV3Dobject]]):
+        super().__init__()
+        # One list of records per frame; readers decode a frame when it is first accessed
+        self.frames = frames
+
+
 class V3DPixel(AV3Dobject):
     def __init__(
             self, point: TY_TRIPLE, width: float, material_id: int = None, center_index: int = None):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Multi-process decoding of V3D files split at record boundaries
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+from pyv3d.v3dconv import V3DReader
+from pyv3d.v3dindex import V3DObjectIndex
+from pyv3d.v3dtypes import v3dtypes
+
+
+def _decode_chunk(shm_name: str, size: int, options: Dict[str, Any], types: np.ndarray, offsets: np.ndarray,
+                  lengths: np.ndarray) -> Tuple[List[Tuple[int, Any]], Dict[int, int]]:
+    # Returns the decoded records with the counts of records the worker's reader skipped
+    shm = SharedMemory(name=shm_name)
+    view = shm.buf[:size]
+    try:
+        reader = V3DReader(view, **options)
+        reader.set_index(V3DObjectIndex(types, offsets, lengths, -1, True))
+        records = [(typ, reader._decode_record(i)) for i, typ in enumerate(types.tolist())]
+        # Decoded values never reference the segment, so it can be detached once the reader lets go of it
+        reader._xdrfile.reset(b'')
+    finally:
+        view.release()
+        shm.close()
+    return records, reader.skipped
+
+
+def split_records(index: V3DObjectIndex, num_chunks: int) -> List[Tuple[int, int]]:
+    """Splits the records of an index into contiguous ranges of roughly equal byte size."""
+    if len(index) == 0:
+        return []
+    cumulative = np.cumsum(index.lengths + 4)
+    targets = np.linspace(0, cumulative[-1], num_chunks + 1)[1:-1]
+    bounds = np.unique(np.concatenate(([0], np.searchsorted(cumulative, targets, side='right'), [len(index)])))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def process_parallel(reader: V3DReader, max_workers: Optional[int] = None, chunks_per_worker: int = 4):
+    """Decodes all records of an in-memory reader in worker processes.
+
+    The decompressed stream is placed in shared memory once; each worker attaches to it and decodes
+    a contiguous range of records found by the index skip-scan. The partial results are merged back
+    into the reader in file order, exactly as V3DReader.process would leave them. Columnar and lazy
+    readers keep other state and are not supported.
+    """
+    if reader.columnar_mode or reader.lazy_mode:
+        raise ValueError('Parallel decoding needs a reader in the default mode')
+    if reader.processed:
+        return
+    index = reader.index
+    buffer = reader._xdrfile.get_buffer()
+    workers = max_workers or os.cpu_count() or 1
+    # Workers read with the options of the reader, which frames of decoded animations keep
+    options = dict(numpy_triangles=reader.numpy_triangles, tolerant=reader._tolerant,
+                   unknown_sizes=reader._unknown_sizes)
+
+    shm = SharedMemory(create=True, size=max(len(buffer), 1))
+    try:
+        shm.buf[:len(buffer)] = buffer
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_decode_chunk, shm.name, len(buffer), options,
+                                       index.types[start:stop], index.offsets[start:stop],
+                                       index.lengths[start:stop])
+                       for start, stop in split_records(index, workers * chunks_per_worker)]
+            chunks = [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    reader._processed = True
+    reader._file_ver = index.file_version
+    reader._objects = []
+    reader._materials = []
+    for records, skipped in chunks:
+        for typ, n in skipped.items():
+            reader._skipped[typ] = reader._skipped.get(typ, 0) + n
+        for typ, obj in records:
+            if typ == v3dtypes.v3dtypes_material:
+                reader._materials.append(obj)
+            elif typ == v3dtypes.v3dtypes_centers:
+                reader._centers = obj
+            elif typ == v3dtypes.v3dtypes_header:
+                reader._header = obj
+            else:
+                reader._objects.append(obj)
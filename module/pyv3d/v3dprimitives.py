@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Batched meshes for the analytic V3D primitives: spheres, half spheres, cylinders, disks and tubes
+
+import numpy as np
+from typing import Dict, Optional, Tuple
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+from pyv3d.v3dtessellate import batches, normalize, tessellate_scene
+
+_unit_meshes: Dict[Tuple[str, int], V3DMesh] = {}
+
+
+def _segments(lod: int) -> int:
+    # Number of segments around the axis at a level of detail
+    return 8 << lod
+
+
+def _grid_triangles(rows: int, columns: int) -> np.ndarray:
+    """Two triangles per cell of a (rows+1) x (columns+1) vertex grid numbered row by row."""
+    vid = np.arange((rows + 1) * (columns + 1)).reshape(rows + 1, columns + 1)
+    a, b, c, d = vid[:-1, :-1].ravel(), vid[1:, :-1].ravel(), vid[1:, 1:].ravel(), vid[:-1, 1:].ravel()
+    return np.concatenate((np.stack((a, b, c), axis=1), np.stack((a, c, d), axis=1)))
+
+
+def _oriented(positions: np.ndarray, normals: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """Drops degenerate triangles and flips the others to agree with the vertex normals."""
+    corners = positions[triangles]
+    face = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    area = np.linalg.norm(face, axis=1)
+    triangles = triangles[area > 1e-12 * area.max()]
+    face = face[area > 1e-12 * area.max()]
+    flip = np.einsum('ij,ij->i', face, normals[triangles].sum(axis=1)) < 0
+    triangles[flip] = triangles[flip][:, ::-1]
+    return triangles
+
+
+def _revolution(profile: np.ndarray, profile_normals: np.ndarray, lod: int) -> V3DMesh:
+    # Revolves a profile of (r, z) points with (nr, nz) normals about the z axis
+    phi = np.linspace(0.0, 2 * np.pi, _segments(lod) + 1)
+    cos, sin = np.cos(phi)[None, :], np.sin(phi)[None, :]
+    positions = np.stack((profile[:, 0:1] * cos, profile[:, 0:1] * sin,
+                          np.broadcast_to(profile[:, 1:2], (len(profile), len(phi)))), axis=-1)
+    normals = np.stack((profile_normals[:, 0:1] * cos, profile_normals[:, 0:1] * sin,
+                        np.broadcast_to(profile_normals[:, 1:2], (len(profile), len(phi)))), axis=-1)
+    positions, normals = positions.reshape(-1, 3), normals.reshape(-1, 3)
+    triangles = _grid_triangles(len(profile) - 1, len(phi) - 1)
+    return V3DMesh(positions, normals, _oriented(positions, normals, triangles))
+
+
+def unit_sphere(lod: int = 1) -> V3DMesh:
+    key = ('sphere', lod)
+    if key not in _unit_meshes:
+        theta = np.linspace(0.0, np.pi, _segments(lod) // 2 + 1)
+        profile = np.stack((np.sin(theta), np.cos(theta)), axis=1)
+        _unit_meshes[key] = _revolution(profile, profile, lod)
+    return _unit_meshes[key]
+
+
+def unit_half_sphere(lod: int = 1) -> V3DMesh:
+    """Upper half of the unit sphere, z >= 0."""
+    key = ('halfSphere', lod)
+    if key not in _unit_meshes:
+        theta = np.linspace(0.0, np.pi / 2, _segments(lod) // 4 + 1)
+        profile = np.stack((np.sin(theta), np.cos(theta)), axis=1)
+        _unit_meshes[key] = _revolution(profile, profile, lod)
+    return _unit_meshes[key]
+
+
+def unit_cylinder(lod: int = 1) -> V3DMesh:
+    """Open side of the cylinder of radius 1 from z = 0 to z = 1."""
+    key = ('cylinder', lod)
+    if key not in _unit_meshes:
+        profile = np.array([[1.0, 0.0], [1.0, 1.0]])
+        _unit_meshes[key] = _revolution(profile, np.array([[1.0, 0.0], [1.0, 0.0]]), lod)
+    return _unit_meshes[key]
+
+
+def unit_disk(lod: int = 1) -> V3DMesh:
+    """Unit disk in the plane z = 0 facing +z."""
+    key = ('disk', lod)
+    if key not in _unit_meshes:
+        profile = np.array([[0.0, 0.0], [1.0, 0.0]])
+        _unit_meshes[key] = _revolution(profile, np.array([[0.0, 1.0], [0.0, 1.0]]), lod)
+    return _unit_meshes[key]
+
+
+def rotations(polar: np.ndarray, azimuth: np.ndarray) -> np.ndarray:
+    """Rotations Rz(azimuth) @ Ry(polar) taking +z to the direction (polar, azimuth), shape (N,3,3)."""
+    polar, azimuth = np.asarray(polar, dtype=np.float64), np.asarray(azimuth, dtype=np.float64)
+    cp, sp, ca, sa = np.cos(polar), np.sin(polar), np.cos(azimuth), np.sin(azimuth)
+    zero = np.zeros_like(cp)
+    return np.stack((np.stack((ca * cp, -sa, ca * sp), axis=-1),
+                     np.stack((sa * cp, ca, sa * sp), axis=-1),
+                     np.stack((-sp, zero, cp), axis=-1)), axis=-2)
+
+
+def instance(template: V3DMesh, centers: np.ndarray, scales: np.ndarray, rotation: Optional[np.ndarray] = None,
+             material_ids: Optional[np.ndarray] = None, center_indices: Optional[np.ndarray] = None) -> V3DMesh:
+    """Places one copy of template per instance: scaled by scales (N,3), rotated, then translated.
+
+    Normals are transformed by the inverse transpose of the scaling so that they stay perpendicular
+    to non-uniformly scaled surfaces.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    scales = np.broadcast_to(np.asarray(scales, dtype=np.float64), (len(centers), 3))
+    meshes = []
+    for batch in batches(len(centers)):
+        positions = template.positions[None] * scales[batch, None]
+        normals = template.normals[None] / np.where(scales[batch, None] != 0, scales[batch, None], 1.0)
+        if rotation is not None:
+            positions = np.einsum('nij,nvj->nvi', rotation[batch], positions, optimize=True)
+            normals = np.einsum('nij,nvj->nvi', rotation[batch], normals, optimize=True)
+        positions += centers[batch, None]
+        count = len(positions)
+        offsets = (np.arange(count) * template.num_vertices)[:, None, None]
+        indices = (template.indices[None].astype(np.int64) + offsets).reshape(-1, 3)
+        per_instance = template.num_triangles
+        meshes.append(V3DMesh(positions.reshape(-1, 3), normalize(normals).reshape(-1, 3), indices, None,
+                              None if material_ids is None else np.repeat(material_ids[batch], per_instance),
+                              None if center_indices is None else np.repeat(center_indices[batch], per_instance)))
+    return V3DMesh.concatenate(meshes)
+
+
+def mesh_spheres(spheres: V3DObjectArray, lod: int = 1) -> V3DMesh:
+    radius = spheres.radius[:, None]
+    return instance(unit_sphere(lod), spheres.center, np.repeat(radius, 3, axis=1), None,
+                    spheres.material_id, spheres.center_index)
+
+
+def mesh_half_spheres(half_spheres: V3DObjectArray, lod: int = 1) -> V3DMesh:
+    radius = half_spheres.radius[:, None]
+    return instance(unit_half_sphere(lod), half_spheres.center, np.repeat(radius, 3, axis=1),
+                    rotations(half_spheres.polar, half_spheres.azimuth), half_spheres.material_id,
+                    half_spheres.center_index)
+
+
+def mesh_cylinders(cylinders: V3DObjectArray, lod: int = 1) -> V3DMesh:
+    """Cylinder sides from center along the (polar, azimuth) axis; the core line is not meshed."""
+    scales = np.stack((cylinders.radius, cylinders.radius, cylinders.height), axis=1)
+    return instance(unit_cylinder(lod), cylinders.center, scales, rotations(cylinders.polar, cylinders.azimuth),
+                    cylinders.material_id, cylinders.center_index)
+
+
+def mesh_disks(disks: V3DObjectArray, lod: int = 1) -> V3DMesh:
+    radius = disks.radius[:, None]
+    return instance(unit_disk(lod), disks.center, np.hstack((radius, radius, np.ones_like(radius))),
+                    rotations(disks.polar, disks.azimuth), disks.material_id, disks.center_index)
+
+
+def _perpendicular(vectors: np.ndarray) -> np.ndarray:
+    # Some unit vector perpendicular to each of vectors
+    axis = np.zeros_like(vectors)
+    axis[np.arange(len(vectors)), np.argmin(np.abs(vectors), axis=1)] = 1.0
+    return normalize(np.cross(vectors, axis))
+
+
+def _bezier_curve(path: np.ndarray, t: float) -> Tuple[np.ndarray, np.ndarray]:
+    s = 1 - t
+    position = s ** 3 * path[:, 0] + 3 * s * s * t * path[:, 1] + 3 * s * t * t * path[:, 2] + t ** 3 * path[:, 3]
+    tangent = 3 * (s * s * (path[:, 1] - path[:, 0]) + 2 * s * t * (path[:, 2] - path[:, 1]) +
+                   t * t * (path[:, 3] - path[:, 2]))
+    # Coincident control points leave the derivative zero at an end; fall back to the chord
+    tangent = np.where(np.linalg.norm(tangent, axis=1, keepdims=True) > 0, tangent, path[:, 3] - path[:, 0])
+    return position, normalize(tangent)
+
+
+def mesh_tubes(tubes: V3DObjectArray, lod: int = 1) -> V3DMesh:
+    """Sweeps a circle of diameter width along each cubic Bezier path.
+
+    Frames are propagated along the samples by the double reflection method, which gives
+    rotation minimizing frames and so no twisting. The loop runs over samples; all tubes are
+    processed together.
+    """
+    segments = _segments(lod)
+    samples = 2 * segments + 1
+    phi = np.linspace(0.0, 2 * np.pi, segments + 1)
+    cos, sin = np.cos(phi)[None, :, None], np.sin(phi)[None, :, None]
+    triangles = _grid_triangles(samples - 1, segments)
+    meshes = []
+    for batch in batches(len(tubes)):
+        path = np.asarray(tubes.path[batch], dtype=np.float64)
+        radius = 0.5 * tubes.width[batch][:, None, None]
+        rings = np.empty((len(path), samples, segments + 1, 3))
+        ring_normals = np.empty_like(rings)
+        position, tangent = _bezier_curve(path, 0.0)
+        normal = _perpendicular(tangent)
+        for k, t in enumerate(np.linspace(0.0, 1.0, samples)):
+            if k:
+                next_position, next_tangent = _bezier_curve(path, t)
+                v1 = next_position - position
+                c1 = np.einsum('ij,ij->i', v1, v1)[:, None]
+                c1 = np.where(c1 > 0, c1, 1.0)
+                normal_l = normal - 2 / c1 * np.einsum('ij,ij->i', v1, normal)[:, None] * v1
+                tangent_l = tangent - 2 / c1 * np.einsum('ij,ij->i', v1, tangent)[:, None] * v1
+                v2 = next_tangent - tangent_l
+                c2 = np.einsum('ij,ij->i', v2, v2)[:, None]
+                c2 = np.where(c2 > 0, c2, 1.0)
+                normal = normalize(normal_l - 2 / c2 * np.einsum('ij,ij->i', v2, normal_l)[:, None] * v2)
+                position, tangent = next_position, next_tangent
+            binormal = np.cross(tangent, normal)
+            ring_normals[:, k] = cos * normal[:, None] + sin * binormal[:, None]
+            rings[:, k] = position[:, None] + radius * ring_normals[:, k]
+
+        vertices_per_tube = samples * (segments + 1)
+        offsets = (np.arange(len(path)) * vertices_per_tube)[:, None, None]
+        indices = (triangles[None] + offsets).reshape(-1, 3)
+        meshes.append(V3DMesh(rings.reshape(-1, 3), ring_normals.reshape(-1, 3), indices, None,
+                              np.repeat(tubes.material_id[batch], len(triangles)),
+                              np.repeat(tubes.center_index[batch], len(triangles))))
+    return V3DMesh.concatenate(meshes)
+
+
+v3dprimitive_meshers = {
+    v3dtypes.v3dtypes_sphere: mesh_spheres,
+    v3dtypes.v3dtypes_halfSphere: mesh_half_spheres,
+    v3dtypes.v3dtypes_cylinder: mesh_cylinders,
+    v3dtypes.v3dtypes_disk: mesh_disks,
+    v3dtypes.v3dtypes_tube: mesh_tubes,
+}
+
+
+def mesh_primitives(scene: V3DColumnarScene, lod: int = 1) -> V3DMesh:
+    """Merges the meshes of every analytic primitive in a columnar scene."""
+    return V3DMesh.concatenate([v3dprimitive_meshers[typ](group, lod) for typ, group in scene.groups.items()
+                                if typ in v3dprimitive_meshers])
+
+
+def mesh_scene(scene: V3DColumnarScene, resolution: int = 8, lod: int = 1) -> V3DMesh:
+    """One mesh with the surfaces and the analytic primitives of a columnar scene."""
+    return V3DMesh.concatenate([tessellate_scene(scene, resolution), mesh_primitives(scene, lod)])
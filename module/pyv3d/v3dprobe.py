@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Metadata probes of V3D files that read the header, or count records, without building objects
+
+import os
+import sys
+import gzip
+import json
+import time
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dconv import V3DReader
+from pyv3d.v3dobjects import V3DHeaderInformation
+
+# Type names without the v3dtypes_ prefix, as accepted by v3dfilter
+_TYPE_NAMES = {code: name[len('v3dtypes_'):] for name, code in vars(v3dtypes).items()
+               if name.startswith('v3dtypes_')}
+
+# Decompressed bytes pulled per read; headers come first in files written by Asymptote
+_HEADER_CHUNK = 1 << 12
+_SCAN_CHUNK = 1 << 20
+
+
+class V3DProbe:
+    """What a probe found out about a V3D file.
+
+    ``counts`` maps type codes to their number of records and ``num_centers`` is the number of center
+    positions; both are None unless the whole file was scanned. ``scanned_bytes`` is how much of the
+    decompressed stream was read, which for header probes is usually a few kilobytes.
+    """
+
+    def __init__(self, file_name: str, file_version: int, double_precision: bool,
+                 header: Optional[V3DHeaderInformation], counts: Optional[Dict[int, int]],
+                 num_centers: Optional[int], skipped: Dict[int, int], compressed_bytes: int, scanned_bytes: int,
+                 seconds: float):
+        self.file_name = file_name
+        self.file_version = file_version
+        self.double_precision = double_precision
+        self.header = header
+        self.counts = counts
+        self.num_centers = num_centers
+        self.skipped = skipped
+        self.compressed_bytes = compressed_bytes
+        self.scanned_bytes = scanned_bytes
+        self.seconds = seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain values for JSON, with record types given by name."""
+        result = {'file': self.file_name, 'file_version': self.file_version,
+                  'double_precision': self.double_precision,
+                  'header': None if self.header is None else header_dict(self.header),
+                  'compressed_bytes': self.compressed_bytes, 'scanned_bytes': self.scanned_bytes,
+                  'seconds': self.seconds}
+        if self.counts is not None:
+            result['counts'] = {_TYPE_NAMES.get(typ, str(typ)): n for typ, n in sorted(self.counts.items())}
+            result['num_centers'] = self.num_centers
+        if self.skipped:
+            result['skipped'] = {str(typ): n for typ, n in sorted(self.skipped.items())}
+        return result
+
+    def __repr__(self) -> str:
+        return 'V3DProbe({0})'.format(self.as_dict())
+
+
+def header_dict(header: V3DHeaderInformation) -> Dict[str, Any]:
+    configuration = {name: value for name, value in vars(header.configuration).items() if value is not None}
+    result = {'canvasWidth': header.canvasWidth, 'canvasHeight': header.canvasHeight,
+              'minBound': header.minBound, 'maxBound': header.maxBound, 'orthographic': header.orthographic,
+              'angleOfView': header.angleOfView, 'initialZoom': header.initialZoom,
+              'viewportShift': header.viewportShift, 'viewportMargin': header.viewportMargin,
+              'lights': [{'position': light.position, 'color': light.color} for light in header.lights],
+              'background': header.background}
+    if configuration:
+        result['configuration'] = configuration
+    if header.image is not None:
+        result['image'] = header.image
+    return result
+
+
+def probe(file_name: str, counts: bool = False, tolerant: bool = True,
+          unknown_sizes: Optional[Dict[int, int]] = None) -> V3DProbe:
+    """Reads the metadata of a gzipped V3D file without decoding its objects.
+
+    By default decompression stops as soon as the header record has been parsed. With counts=True
+    the whole stream is skip-scanned instead, reading only the counts that variable-length records
+    need, to find the number of records of each type. Records of unknown type are passed over as in
+    a tolerant V3DReader; with tolerant=False they raise.
+    """
+    start = time.perf_counter()
+    with gzip.open(file_name, 'rb') as fil:
+        reader = V3DReader(fil, stream=True, tolerant=tolerant, unknown_sizes=unknown_sizes,
+                           chunk_size=_SCAN_CHUNK if counts else _HEADER_CHUNK)
+        scan = reader.scan(stop_after_header=not counts)
+    return V3DProbe(file_name, scan.file_version, scan.double_precision, scan.header,
+                    scan.counts if counts else None, scan.num_centers if counts else None, reader.skipped,
+                    os.path.getsize(file_name), scan.scanned_bytes, time.perf_counter() - start)
+
+
+def find_files(paths: Sequence[str], pattern: str = '*.v3d') -> Iterator[str]:
+    """The given files, and the files below the given directories whose names match pattern, in order."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(fnmatch.filter(files, pattern)):
+                yield os.path.join(root, name)
+
+
+def _probe_entry(file_name: str, counts: bool, tolerant: bool) -> Dict[str, Any]:
+    # Failures are reported per file so that one broken file does not stop a batch
+    try:
+        return probe(file_name, counts, tolerant).as_dict()
+    except Exception as e:
+        return {'file': file_name, 'error': '{0}: {1}'.format(type(e).__name__, e)}
+
+
+def probe_files(file_names: List[str], counts: bool = False, tolerant: bool = True,
+                max_workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Probes files in worker processes, yielding the as_dict() of each result in the given order.
+
+    Files that cannot be probed give {'file': ..., 'error': ...} instead.
+    """
+    if max_workers == 1:
+        for file_name in file_names:
+            yield _probe_entry(file_name, counts, tolerant)
+        return
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(file_names) // (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_probe_entry, file_names, [counts] * len(file_names),
+                                [tolerant] * len(file_names), chunksize=chunksize)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Print the header, and optionally the record counts, of V3D files '
+                                                 'as JSON lines.')
+    parser.add_argument('paths', nargs='+', help='V3D files, or directories searched recursively')
+    parser.add_argument('--counts', action='store_true', help='skip-scan whole files to count records by type')
+    parser.add_argument('--pattern', default='*.v3d', help='names of the files probed in directories')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--strict', action='store_true', help='fail on records of unknown type')
+    parser.add_argument('--output', default=None, help='write to this file instead of standard output')
+    args = parser.parse_args()
+
+    out = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        for result in probe_files(list(find_files(args.paths, args.pattern)), args.counts, not args.strict,
+                                  args.jobs):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Opt-in decode statistics and per-record hooks for V3DReader
+
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+# Called once per decoded record with (type, record, seconds, bytes)
+TY_RECORD_HOOK = Callable[[int, Any, float, int], None]
+
+
+class V3DTypeStats:
+    __slots__ = ('count', 'seconds', 'bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'count': self.count, 'seconds': self.seconds, 'bytes': self.bytes}
+
+
+class V3DReaderStats:
+    """Where the time of a V3DReader went.
+
+    ``per_type`` maps v3dtypes codes to the number of records decoded, their cumulative decode
+    time and the bytes they took up in the decompressed stream, type numbers included.
+    ``inflate_seconds`` is the time spent reading and decompressing the input up front; streamed
+    readers inflate while decoding, so there it is part of the per-type times. In columnar mode the
+    fixed-size records are decoded in bulk and only counted, with the bulk time in
+    ``columnar_seconds``. Lazy readers count records when they are actually decoded: the header,
+    materials and centers up front and each object when its handle is first decoded, so the totals
+    only match the other modes once every handle has been; the skip-scan that builds the record
+    index is not per type and is timed in ``index_seconds``.
+    """
+
+    def __init__(self):
+        self.inflate_seconds = 0.0
+        self.inflated_bytes = 0
+        self.compressed_bytes: Optional[int] = None
+        self.columnar_seconds = 0.0
+        self.index_seconds = 0.0
+        self.per_type: Dict[int, V3DTypeStats] = {}
+
+    def type_stats(self, typ: int) -> V3DTypeStats:
+        stats = self.per_type.get(typ)
+        if stats is None:
+            stats = self.per_type[typ] = V3DTypeStats()
+        return stats
+
+    @property
+    def decode_seconds(self) -> float:
+        return sum(stats.seconds for stats in self.per_type.values()) + self.columnar_seconds
+
+    @property
+    def decoded_bytes(self) -> int:
+        return sum(stats.bytes for stats in self.per_type.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {'inflate_seconds': self.inflate_seconds, 'inflated_bytes': self.inflated_bytes,
+                'compressed_bytes': self.compressed_bytes, 'columnar_seconds': self.columnar_seconds,
+                'index_seconds': self.index_seconds,
+                'per_type': {typ: stats.as_dict() for typ, stats in sorted(self.per_type.items()) if stats.count}}
+
+    def summary(self) -> str:
+        lines = ['inflate {0:.3f}s ({1} bytes), decode {2:.3f}s'.format(
+            self.inflate_seconds, self.inflated_bytes, self.decode_seconds)]
+        if self.index_seconds:
+            lines[0] += ', index {0:.3f}s'.format(self.index_seconds)
+        for typ, stats in sorted(self.per_type.items(), key=lambda item: -item[1].seconds):
+            if not stats.count:
+                continue
+            lines.append('  type {0:5d}: {1:9d} records {2:12d} bytes {3:9.3f}s'.format(
+                typ, stats.count, stats.bytes, stats.seconds))
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return self.summary()
+
+
+def instrument(fn: Callable[[], Any], typ: int, stats: V3DReaderStats, position: Callable[[], int],
+               hook: Optional[TY_RECORD_HOOK] = None) -> Callable[[], Any]:
+    """Wraps a record decoding function so each call is counted, timed and passed to hook.
+
+    The record's type number has already been read when fn is called and is counted as well.
+    """
+    type_stats = stats.type_stats(typ)
+    clock = time.perf_counter
+
+    def instrumented():
+        start_position = position()
+        start = clock()
+        record = fn()
+        seconds = clock() - start
+        nbytes = position() - start_position + 4
+        type_stats.count += 1
+        type_stats.seconds += seconds
+        type_stats.bytes += nbytes
+        if hook is not None:
+            hook(typ, record, seconds, nbytes)
+        return record
+
+    return instrumented
+
+
+def logging_hook(logger: Optional[logging.Logger] = None, level: int = logging.DEBUG) -> TY_RECORD_HOOK:
+    """A record hook writing one log line per decoded record."""
+    if logger is None:
+        logger = logging.getLogger('pyv3d')
+
+    def hook(typ: int, record: Any, seconds: float, nbytes: int):
+        if logger.isEnabledFor(level):
+            logger.log(level, 'decoded %s (type %d, %d bytes) in %.6fs', type(record).__name__, typ, nbytes, seconds)
+
+    return hook
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# XDR unpacking from a file-like stream in bounded memory
+
+import struct
+from typing import BinaryIO
+from pyv3d.xdrlib import Error
+
+_uint = struct.Struct('>L')
+_int = struct.Struct('>l')
+_float = struct.Struct('>f')
+_double = struct.Struct('>d')
+
+
+class StreamUnpacker:
+    """Drop-in replacement for xdrlib.Unpacker that pulls data from a stream in chunks.
+
+    Only the bytes not yet consumed are kept in memory. Positions are absolute offsets into the
+    decompressed stream; seeking backwards is only possible within the current chunk.
+    """
+
+    def __init__(self, fil: BinaryIO, chunk_size: int = 1 << 20):
+        self._fil = fil
+        self._chunk_size = chunk_size
+        self._buf = b''
+        self._pos = 0
+        self._base = 0
+
+    def _fill(self, n: int) -> bool:
+        have = len(self._buf) - self._pos
+        if have >= n:
+            return True
+        parts = [self._buf[self._pos:]]
+        self._base += self._pos
+        self._pos = 0
+        while have < n:
+            chunk = self._fil.read(max(self._chunk_size, n - have))
+            if not chunk:
+                break
+            parts.append(chunk)
+            have += len(chunk)
+        self._buf = b''.join(parts)
+        return have >= n
+
+    def _unpack(self, fmt: struct.Struct):
+        if not self._fill(fmt.size):
+            raise EOFError
+        i = self._pos
+        self._pos = i + fmt.size
+        return fmt.unpack_from(self._buf, i)[0]
+
+    def get_position(self) -> int:
+        return self._base + self._pos
+
+    def set_position(self, position: int):
+        rel = position - self._base
+        if rel < 0:
+            raise Error('cannot seek backwards past the current chunk of a stream')
+        if rel <= len(self._buf):
+            self._pos = rel
+            return
+        skip = rel - len(self._buf)
+        self._base += len(self._buf)
+        self._buf = b''
+        self._pos = 0
+        while skip > 0:
+            chunk = self._fil.read(min(self._chunk_size, skip))
+            if not chunk:
+                raise EOFError
+            skip -= len(chunk)
+            self._base += len(chunk)
+
+    def done(self):
+        if self._pos < len(self._buf) or self._fil.read(1):
+            raise Error('unextracted data remains')
+
+    def unpack_uint(self) -> int:
+        return self._unpack(_uint)
+
+    def unpack_int(self) -> int:
+        return self._unpack(_int)
+
+    unpack_enum = unpack_int
+
+    def unpack_bool(self) -> bool:
+        return bool(self.unpack_int())
+
+    def unpack_uhyper(self) -> int:
+        hi = self.unpack_uint()
+        lo = self.unpack_uint()
+        return int(hi) << 32 | lo
+
+    def unpack_float(self) -> float:
+        return self._unpack(_float)
+
+    def unpack_double(self) -> float:
+        return self._unpack(_double)
+
+    def unpack_struct(self, fmt: struct.Struct) -> tuple:
+        if not self._fill(fmt.size):
+            raise EOFError
+        i = self._pos
+        self._pos = i + fmt.size
+        return fmt.unpack_from(self._buf, i)
+
+    def unpack_fstring(self, n: int) -> bytes:
+        if n < 0:
+            raise ValueError('fstring size must be nonnegative')
+        total = (n + 3) // 4 * 4
+        if not self._fill(total):
+            raise EOFError
+        i = self._pos
+        self._pos = i + total
+        return self._buf[i:i + n]
+
+    unpack_fopaque = unpack_fstring
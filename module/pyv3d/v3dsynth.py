@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Deterministic synthetic V3D scenes for benchmarks
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Union
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import *
+from pyv3d.v3dlayouts import v3dfixed_object_types, record_size, record_dtype
+from pyv3d.v3dcolumnar import V3DObjectArray
+from pyv3d.v3dwriter import V3DWriter
+
+# Every object type the reader decodes
+v3dsynthetic_types = tuple(sorted(v3dfixed_object_types | {v3dtypes.v3dtypes_triangles,
+                                                           v3dtypes.v3dtypes_animation}))
+
+# Frames per animation and spheres per frame
+_ANIMATION_FRAMES = 4
+_FRAME_OBJECTS = 8
+
+# Objects of one type generated and written at once
+_CHUNK = 1 << 15
+
+# Fields holding points, spread over the scene
+_POINT_FIELDS = frozenset(('control_pts', 'path', 'center', 'point'))
+
+
+def synthetic_header(extent: float = 10.0) -> V3DHeaderInformation:
+    header = V3DHeaderInformation()
+    header.canvasWidth = 1024
+    header.canvasHeight = 768
+    header.minBound = (-extent, -extent, -extent)
+    header.maxBound = (extent, extent, extent)
+    header.orthographic = False
+    header.angleOfView = 0.5
+    header.initialZoom = 1.0
+    header.viewportMargin = (0.0, 0.0)
+    header.lights = [V3DSingleLightSource((1.0, 1.0, 1.0), (1.0, 1.0, 1.0)),
+                     V3DSingleLightSource((-1.0, 0.5, 0.25), (0.5, 0.5, 0.6))]
+    header.background = (1.0, 1.0, 1.0, 1.0)
+    return header
+
+
+def synthetic_materials(n: int, seed: int = 0) -> List[V3DMaterial]:
+    rng = np.random.default_rng([seed, v3dtypes.v3dtypes_material])
+    return [V3DMaterial((*rng.uniform(0, 1, 3).tolist(), 1.0), (0.0, 0.0, 0.0, 1.0), (1.0, 1.0, 1.0, 1.0),
+                        metallic=float(rng.uniform(0, 1)), shininess=float(rng.uniform(0, 1)), f0=0.04,
+                        lightOn=bool(i % 8)) for i in range(n)]
+
+
+def synthetic_centers(n: int, extent: float = 10.0, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng([seed, v3dtypes.v3dtypes_centers]).uniform(-extent, extent, (n, 3))
+
+
+def synthetic_object_array(typ: int, n: int, rng: np.random.Generator, num_materials: int = 1,
+                           num_centers: int = 0, extent: float = 10.0) -> V3DObjectArray:
+    """n random objects of a fixed-size type; multi-point fields are jittered around one point."""
+    fields: Dict[str, np.ndarray] = {}
+    for name, (dtype, _) in record_dtype(typ).fields.items():
+        shape = (n,) + dtype.shape
+        if name in _POINT_FIELDS:
+            base = rng.uniform(-extent, extent, (n, 3))
+            fields[name] = base if len(shape) == 2 else base[:, None] + rng.normal(0.0, 0.05 * extent, shape)
+        elif name == 'colors':
+            colors = rng.uniform(0.0, 1.0, shape).astype(np.float32)
+            colors[..., 3] = 1.0
+            fields[name] = colors
+        elif name in ('radius', 'width', 'height'):
+            fields[name] = rng.uniform(0.001, 0.01, n) * extent
+        elif name == 'polar':
+            fields[name] = rng.uniform(0.0, np.pi, n)
+        elif name == 'azimuth':
+            fields[name] = rng.uniform(0.0, 2 * np.pi, n)
+        elif name == 'core':
+            fields[name] = rng.integers(0, 2, n).astype(bool)
+        elif name == 'material_id':
+            fields[name] = rng.integers(0, max(num_materials, 1), n).astype(np.uint32)
+        elif name == 'center_index':
+            # 0 is no center; otherwise a 1-based center number
+            fields[name] = rng.integers(0, num_centers + 1, n).astype(np.uint32)
+        elif name == 'matrix':
+            # Affine transforms close to the identity
+            matrix = np.tile(np.eye(4), (n, 1, 1))
+            matrix[:, :3, :3] += rng.normal(0.0, 0.1, (n, 3, 3))
+            matrix[:, :3, 3] = rng.uniform(-extent, extent, (n, 3))
+            fields[name] = matrix.reshape(n, 16)
+        elif name == 'element_id':
+            fields[name] = rng.integers(0, 1 << 16, n).astype(np.uint32)
+        else:
+            raise ValueError('No generator for field {0}'.format(name))
+    return V3DObjectArray(typ, fields)
+
+
+def _grid_indices(side: int) -> np.ndarray:
+    corner = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)).ravel()
+    return np.concatenate((np.stack((corner, corner + 1, corner + side), axis=1),
+                           np.stack((corner + 1, corner + side + 1, corner + side), axis=1)))
+
+
+def synthetic_triangle_group(rng: np.random.Generator, side: int = 16, num_materials: int = 1,
+                             num_centers: int = 0, extent: float = 10.0,
+                             colored: bool = False) -> Union[V3DTriangleGroups, V3DTriangleGroupsColor]:
+    """A bumpy side x side grid of vertices with shared indices, as written by -prerender."""
+    u, v = np.meshgrid(np.linspace(0, 1, side), np.linspace(0, 1, side))
+    height = 0.05 * np.sin(2 * np.pi * (u + rng.uniform())) * np.cos(2 * np.pi * (v + rng.uniform()))
+    positions = np.stack((u, v, height), axis=-1).reshape(-1, 3) * (0.1 * extent) + \
+        rng.uniform(-extent, extent, 3)
+    normals = np.zeros_like(positions)
+    normals[:, 2] = 1.0
+    indices = _grid_indices(side)
+    material_id = int(rng.integers(0, max(num_materials, 1)))
+    center_index = int(rng.integers(0, num_centers + 1))
+    if colored:
+        colors = rng.uniform(0.0, 1.0, (len(positions), 4)).astype(np.float32)
+        colors[:, 3] = 1.0
+        return V3DTriangleGroupsColor(positions, normals, colors, indices, indices, indices, material_id,
+                                      center_index)
+    return V3DTriangleGroups(positions, normals, indices, indices, material_id, center_index)
+
+
+def synthetic_animation(rng: np.random.Generator, num_materials: int = 1, num_centers: int = 0,
+                        extent: float = 10.0) -> V3DAnimation:
+    """A few frames, each holding some spheres."""
+    return V3DAnimation([list(synthetic_object_array(v3dtypes.v3dtypes_sphere, _FRAME_OBJECTS, rng, num_materials,
+                                                     num_centers, extent))
+                         for _ in range(_ANIMATION_FRAMES)])
+
+
+def object_nbytes(typ: int, double_precision: bool = True, side: int = 16, colored: bool = False) -> int:
+    """Decompressed size of one synthetic record of the given type, including its type number."""
+    if typ == v3dtypes.v3dtypes_animation:
+        return 8 + _ANIMATION_FRAMES * (4 + _FRAME_OBJECTS * (4 + record_size(v3dtypes.v3dtypes_sphere,
+                                                                                double_precision)))
+    if typ != v3dtypes.v3dtypes_triangles:
+        return 4 + record_size(typ, double_precision)
+    real = 8 if double_precision else 4
+    num_vertices = side * side
+    num_triangles = 2 * (side - 1) ** 2
+    return 4 + 4 + 4 + 2 * (4 + 3 * real * num_vertices) + 4 + 4 + (16 * num_vertices + 4 if colored else 0) + \
+        12 * num_triangles + 8
+
+
+def scene_counts(target_bytes: int, double_precision: bool = True, types: Optional[Iterable[int]] = None,
+                 side: int = 16) -> Dict[int, int]:
+    """Object counts giving each type an equal share of a scene of about target_bytes decompressed."""
+    types = v3dsynthetic_types if types is None else tuple(types)
+    share = target_bytes / len(types)
+    return {typ: max(1, int(share // object_nbytes(typ, double_precision, side))) for typ in types}
+
+
+def write_synthetic_scene(file_name: str, counts: Dict[int, int], double_precision: bool = True, seed: int = 0,
+                          num_materials: int = 16, num_centers: int = 64, side: int = 16,
+                          compresslevel: int = 1, extent: float = 10.0) -> Dict[int, int]:
+    """Writes a header, materials, centers and counts[typ] objects of each type to a gzipped V3D file.
+
+    The same arguments always give the same file. Types are written interleaved in chunks so that
+    readers see a mix of records, and memory use does not grow with the counts. Every other
+    triangle group carries vertex colors. Returns the counts written.
+    """
+    rngs = {typ: np.random.default_rng([seed, typ]) for typ in counts}
+    remaining = dict(counts)
+    with V3DWriter.from_file_name(file_name, double_precision, compresslevel) as writer:
+        writer.write_header(synthetic_header(extent))
+        writer.write_materials(synthetic_materials(num_materials, seed))
+        if num_centers > 0:
+            writer.write_centers(synthetic_centers(num_centers, extent, seed))
+        while any(remaining.values()):
+            for typ in counts:
+                n = remaining[typ]
+                if n == 0:
+                    continue
+                rng = rngs[typ]
+                if typ == v3dtypes.v3dtypes_triangles:
+                    # Triangle groups are much larger than the fixed records
+                    n = min(n, max(1, _CHUNK // side ** 2))
+                    first = counts[typ] - remaining[typ]
+                    for i in range(first, first + n):
+                        writer.write_triangles(synthetic_triangle_group(rng, side, num_materials, num_centers,
+                                                                        extent, colored=i % 2 == 1))
+                elif typ == v3dtypes.v3dtypes_animation:
+                    n = min(n, max(1, _CHUNK // (_ANIMATION_FRAMES * _FRAME_OBJECTS)))
+                    for _ in range(n):
+                        writer.write_animation(synthetic_animation(rng, num_materials, num_centers, extent))
+                else:
+                    n = min(n, _CHUNK)
+                    writer.write_object_array(synthetic_object_array(typ, n, rng, num_materials, num_centers, extent))
+                remaining[typ] -= n
+    return dict(counts)
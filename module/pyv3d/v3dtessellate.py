@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# Vectorized tessellation of Bezier patches, Bezier triangles and straight quads/triangles
+
+import numpy as np
+from math import factorial
+from typing import Dict, Iterable, List, Optional, Tuple
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+from pyv3d.v3dobjects import V3DHeaderInformation
+
+# Number of objects evaluated per NumPy call; bounds the size of the temporaries
+BATCH_SIZE = 4096
+
+# Offset of the parameters used for normals, so that collapsed patch edges still get a normal
+_NORMAL_EPSILON = 1e-4
+
+_BINOMIAL3 = np.array([1.0, 3.0, 3.0, 1.0])
+
+
+def bernstein(t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Cubic Bernstein basis and its derivative at parameters t, both of shape (len(t), 4)."""
+    t = np.asarray(t, dtype=np.float64)[:, None]
+    k = np.arange(4)
+    basis = _BINOMIAL3 * t ** k * (1 - t) ** (3 - k)
+    # d/dt of the cubic basis in terms of the quadratic one
+    quadratic = np.array([1.0, 2.0, 1.0]) * t ** np.arange(3) * (1 - t) ** (2 - np.arange(3))
+    derivative = np.zeros_like(basis)
+    derivative[:, :3] -= 3 * quadratic
+    derivative[:, 1:] += 3 * quadratic
+    return basis, derivative
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit vectors along the last axis; zero vectors stay zero."""
+    length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, length, out=np.zeros_like(vectors), where=length > 0)
+
+
+class _Template:
+    """Parameter samples and triangle connectivity shared by all objects of one kind and resolution."""
+
+    def __init__(self, params: np.ndarray, triangles: np.ndarray, edges: Tuple[np.ndarray, ...]):
+        self.params = params
+        self.triangles = triangles
+        # Vertex numbers along each boundary edge, in parameter order
+        self.edges = edges
+
+
+_templates: Dict[Tuple[str, int], _Template] = {}
+
+
+def patch_template(n: int) -> _Template:
+    key = ('patch', n)
+    if key not in _templates:
+        t = np.linspace(0.0, 1.0, n + 1)
+        u, v = np.meshgrid(t, t, indexing='ij')
+        params = np.stack((u.ravel(), v.ravel()), axis=1)
+        vid = np.arange((n + 1) ** 2).reshape(n + 1, n + 1)
+        a, b, c, d = vid[:-1, :-1].ravel(), vid[1:, :-1].ravel(), vid[1:, 1:].ravel(), vid[:-1, 1:].ravel()
+        triangles = np.concatenate((np.stack((a, b, c), axis=1), np.stack((a, c, d), axis=1)))
+        edges = (vid[:, 0], vid[-1, :], vid[:, -1], vid[0, :])
+        _templates[key] = _Template(params, triangles, edges)
+    return _templates[key]
+
+
+def triangle_template(n: int) -> _Template:
+    key = ('triangle', n)
+    if key not in _templates:
+        # Barycentric samples (a, b) with a + b <= n, numbered row by row in b
+        rows = [(a, b) for b in range(n + 1) for a in range(n + 1 - b)]
+        params = np.array(rows, dtype=np.float64) / n
+        vid = {ab: i for i, ab in enumerate(rows)}
+        triangles = []
+        for b in range(n):
+            for a in range(n - b):
+                triangles.append((vid[a, b], vid[a + 1, b], vid[a, b + 1]))
+                if a + b + 1 < n:
+                    triangles.append((vid[a + 1, b], vid[a + 1, b + 1], vid[a, b + 1]))
+        edges = (np.array([vid[a, 0] for a in range(n + 1)]),
+                 np.array([vid[n - b, b] for b in range(n + 1)]),
+                 np.array([vid[0, b] for b in range(n + 1)]))
+        _templates[key] = _Template(params, np.array(triangles), edges)
+    return _templates[key]
+
+
+def _triangle_basis(params: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cubic triangle Bernstein basis for entries (i+j)(i+j+1)/2+j of p_{i,j,3-i-j} with derivatives.
+
+    A parameter (a, b) is the barycentric weight of p_{3,0,0} and p_{0,3,0}; the remaining weight
+    1-a-b belongs to p_{0,0,3}. Derivatives are taken along a and b with that weight decreasing.
+    """
+    a, b = params[:, 0:1], params[:, 1:2]
+    c = 1 - a - b
+    ij = [(i, s - i) for s in range(4) for i in range(s, -1, -1)]
+    ij = sorted(ij, key=lambda p: (p[0] + p[1]) * (p[0] + p[1] + 1) // 2 + p[1])
+    i = np.array([p[0] for p in ij])
+    j = np.array([p[1] for p in ij])
+    k = 3 - i - j
+    coeff = np.array([6.0 / (factorial(p) * factorial(q) * factorial(3 - p - q)) for p, q in ij])
+
+    def power(x, e):
+        return np.where(e >= 0, x ** np.maximum(e, 0), 0.0)
+
+    basis = coeff * power(a, i) * power(b, j) * power(c, k)
+    d_c = coeff * k * power(a, i) * power(b, j) * power(c, k - 1)
+    d_a = coeff * i * power(a, i - 1) * power(b, j) * power(c, k) - d_c
+    d_b = coeff * j * power(a, i) * power(b, j - 1) * power(c, k) - d_c
+    return basis, d_a, d_b
+
+
+def batches(n: int):
+    """Slices covering range(n) in steps of BATCH_SIZE."""
+    for start in range(0, n, BATCH_SIZE):
+        yield slice(start, min(start + BATCH_SIZE, n))
+
+
+def _assemble(template: _Template, positions: np.ndarray, normals: np.ndarray, colors: Optional[np.ndarray],
+              material_ids, center_indices) -> V3DMesh:
+    num_objects, num_vertices = positions.shape[:2]
+    offsets = (np.arange(num_objects) * num_vertices)[:, None, None]
+    indices = (template.triangles[None] + offsets).reshape(-1, 3)
+    per_triangle = len(template.triangles)
+    return V3DMesh(positions.reshape(-1, 3), normals.reshape(-1, 3), indices,
+                   None if colors is None else colors.reshape(-1, 4),
+                   None if material_ids is None else np.repeat(material_ids, per_triangle),
+                   None if center_indices is None else np.repeat(center_indices, per_triangle))
+
+
+def evaluate_patches(control_pts: np.ndarray, params: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions and unit normals of patches (N,16,3) at parameters (V,2); both (N,V,3)."""
+    ctrl = np.asarray(control_pts, dtype=np.float64).reshape(-1, 4, 4, 3)
+    bu, _ = bernstein(params[:, 0])
+    bv, _ = bernstein(params[:, 1])
+    positions = np.einsum('vi,nijc,vj->nvc', bu, ctrl, bv, optimize=True)
+
+    inner = np.clip(params, _NORMAL_EPSILON, 1 - _NORMAL_EPSILON)
+    bu, dbu = bernstein(inner[:, 0])
+    bv, dbv = bernstein(inner[:, 1])
+    su = np.einsum('vi,nijc,vj->nvc', dbu, ctrl, bv, optimize=True)
+    sv = np.einsum('vi,nijc,vj->nvc', bu, ctrl, dbv, optimize=True)
+    return positions, normalize(np.cross(su, sv))
+
+
+def evaluate_bezier_triangles(control_pts: np.ndarray, params: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions and unit normals of Bezier triangles (N,10,3) at barycentric parameters (V,2)."""
+    ctrl = np.asarray(control_pts, dtype=np.float64).reshape(-1, 10, 3)
+    basis, _, _ = _triangle_basis(params)
+    positions = np.einsum('vk,nkc->nvc', basis, ctrl, optimize=True)
+
+    # Pull the normal samples slightly towards the centroid
+    inner = params + _NORMAL_EPSILON * (1.0 / 3.0 - params)
+    _, d_a, d_b = _triangle_basis(inner)
+    sa = np.einsum('vk,nkc->nvc', d_a, ctrl, optimize=True)
+    sb = np.einsum('vk,nkc->nvc', d_b, ctrl, optimize=True)
+    return positions, normalize(np.cross(sa, sb))
+
+
+def _patch_colors(colors: np.ndarray, params: np.ndarray) -> np.ndarray:
+    # Corner colors belong to p0, p12, p15, p3, i.e. (u,v) = (0,0), (1,0), (1,1), (0,1)
+    u, v = params[:, 0:1], params[:, 1:2]
+    weights = np.hstack(((1 - u) * (1 - v), u * (1 - v), u * v, (1 - u) * v))
+    return np.einsum('vk,nkc->nvc', weights, np.asarray(colors, dtype=np.float64).reshape(-1, 4, 4))
+
+
+def _triangle_colors(colors: np.ndarray, params: np.ndarray) -> np.ndarray:
+    # Corner colors belong to p0, p6, p9, i.e. the p_{0,0,3}, p_{3,0,0} and p_{0,3,0} corners
+    a, b = params[:, 0:1], params[:, 1:2]
+    weights = np.hstack((1 - a - b, a, b))
+    return np.einsum('vk,nkc->nvc', weights, np.asarray(colors, dtype=np.float64).reshape(-1, 3, 4))
+
+
+def _check_resolution(resolution: int):
+    if resolution < 1:
+        raise ValueError('Resolution must be at least 1, got {0}'.format(resolution))
+
+
+def tessellate_patches(control_pts: np.ndarray, resolution: int = 8, colors: Optional[np.ndarray] = None,
+                       material_ids: Optional[np.ndarray] = None,
+                       center_indices: Optional[np.ndarray] = None) -> V3DMesh:
+    """Tessellates N bicubic patches (N,16,3) into a (resolution x resolution) grid each."""
+    _check_resolution(resolution)
+    template = patch_template(resolution)
+    meshes = []
+    for batch in batches(len(control_pts)):
+        positions, normals = evaluate_patches(control_pts[batch], template.params)
+        batch_colors = None if colors is None else _patch_colors(colors[batch], template.params)
+        meshes.append(_assemble(template, positions, normals, batch_colors,
+                                None if material_ids is None else material_ids[batch],
+                                None if center_indices is None else center_indices[batch]))
+    return V3DMesh.concatenate(meshes)
+
+
+def tessellate_bezier_triangles(control_pts: np.ndarray, resolution: int = 8, colors: Optional[np.ndarray] = None,
+                                material_ids: Optional[np.ndarray] = None,
+                                center_indices: Optional[np.ndarray] = None) -> V3DMesh:
+    """Tessellates N cubic Bezier triangles (N,10,3) into resolution**2 triangles each."""
+    _check_resolution(resolution)
+    template = triangle_template(resolution)
+    meshes = []
+    for batch in batches(len(control_pts)):
+        positions, normals = evaluate_bezier_triangles(control_pts[batch], template.params)
+        batch_colors = None if colors is None else _triangle_colors(colors[batch], template.params)
+        meshes.append(_assemble(template, positions, normals, batch_colors,
+                                None if material_ids is None else material_ids[batch],
+                                None if center_indices is None else center_indices[batch]))
+    return V3DMesh.concatenate(meshes)
+
+
+def tessellate_quads(vertices: np.ndarray, colors: Optional[np.ndarray] = None,
+                     material_ids: Optional[np.ndarray] = None,
+                     center_indices: Optional[np.ndarray] = None) -> V3DMesh:
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 4, 3)
+    normal = normalize(np.cross(vertices[:, 2] - vertices[:, 0], vertices[:, 3] - vertices[:, 1]))
+    template = _Template(None, np.array([[0, 1, 2], [0, 2, 3]]), ())
+    return _assemble(template, vertices, np.repeat(normal[:, None], 4, axis=1), colors, material_ids,
+                     center_indices)
+
+
+def tessellate_flat_triangles(vertices: np.ndarray, colors: Optional[np.ndarray] = None,
+                              material_ids: Optional[np.ndarray] = None,
+                              center_indices: Optional[np.ndarray] = None) -> V3DMesh:
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    normal = normalize(np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0]))
+    template = _Template(None, np.array([[0, 1, 2]]), ())
+    return _assemble(template, vertices, np.repeat(normal[:, None], 3, axis=1), colors, material_ids,
+                     center_indices)
+
+
+_surface_tessellators = {
+    v3dtypes.v3dtypes_bezierPatch: tessellate_patches,
+    v3dtypes.v3dtypes_bezierPatchColor: tessellate_patches,
+    v3dtypes.v3dtypes_bezierTriangle: tessellate_bezier_triangles,
+    v3dtypes.v3dtypes_bezierTriangleColor: tessellate_bezier_triangles,
+}
+
+_straight_tessellators = {
+    v3dtypes.v3dtypes_quad: tessellate_quads,
+    v3dtypes.v3dtypes_quadColor: tessellate_quads,
+    v3dtypes.v3dtypes_triangle: tessellate_flat_triangles,
+    v3dtypes.v3dtypes_triangleColor: tessellate_flat_triangles,
+}
+
+v3dsurface_types = frozenset(_surface_tessellators) | frozenset(_straight_tessellators)
+
+
+def tessellate_object_array(objects: V3DObjectArray, resolution: int = 8) -> V3DMesh:
+    _check_resolution(resolution)
+    colors = objects.fields.get('colors', None)
+    if objects.obj_type in _surface_tessellators:
+        return _surface_tessellators[objects.obj_type](objects.control_pts, resolution, colors,
+                                                       objects.material_id, objects.center_index)
+    elif objects.obj_type in _straight_tessellators:
+        return _straight_tessellators[objects.obj_type](objects.control_pts, colors, objects.material_id,
+                                                        objects.center_index)
+    raise ValueError('Objects of type {0} are not surfaces'.format(objects.obj_type))
+
+
+def tessellate_scene(scene: V3DColumnarScene, resolution: int = 8) -> V3DMesh:
+    """Merges every surface of a columnar scene, including triangle groups, into one mesh."""
+    _check_resolution(resolution)
+    meshes = [tessellate_object_array(group, resolution) for typ, group in scene.groups.items()
+              if typ in v3dsurface_types]
+    triangle_groups = scene.get(v3dtypes.v3dtypes_triangles)
+    if triangle_groups:
+        meshes.append(V3DMesh.from_objects(triangle_groups))
+    return V3DMesh.concatenate(meshes)
+
+
+# Adaptive tessellation
+
+# Control point entries along each template edge, in the template's parameter order
+_PATCH_EDGE_CONTROLS = np.array([[0, 4, 8, 12], [12, 13, 14, 15], [3, 7, 11, 15], [0, 1, 2, 3]])
+_TRIANGLE_EDGE_CONTROLS = np.array([[0, 1, 3, 6], [6, 7, 8, 9], [0, 2, 5, 9]])
+
+
+def tolerance_from_header(header: V3DHeaderInformation, pixels: float = 1.0) -> float:
+    """World-space tolerance corresponding to the given number of pixels at the header's canvas size."""
+    if header.minBound is None or header.maxBound is None:
+        raise ValueError('Header does not carry scene bounds')
+    diagonal = np.linalg.norm(np.subtract(header.maxBound, header.minBound))
+    canvas = max(header.canvasWidth or 0, header.canvasHeight or 0)
+    if canvas <= 0:
+        raise ValueError('Header does not carry a canvas size')
+    return float(diagonal) / canvas * pixels
+
+
+def patch_flatness(control_pts: np.ndarray) -> np.ndarray:
+    """Bound on the second differences of each patch's control net along u, v and the diagonal, shape (N,)."""
+    ctrl = np.asarray(control_pts, dtype=np.float64).reshape(-1, 4, 4, 3)
+    du = np.linalg.norm(ctrl[:, 2:] - 2 * ctrl[:, 1:-1] + ctrl[:, :-2], axis=-1).max(axis=(1, 2))
+    dv = np.linalg.norm(ctrl[:, :, 2:] - 2 * ctrl[:, :, 1:-1] + ctrl[:, :, :-2], axis=-1).max(axis=(1, 2))
+    twist = np.linalg.norm(ctrl[:, 1:, 1:] - ctrl[:, 1:, :-1] - ctrl[:, :-1, 1:] + ctrl[:, :-1, :-1],
+                           axis=-1).max(axis=(1, 2))
+    return du + dv + 2 * twist
+
+
+def bezier_triangle_flatness(control_pts: np.ndarray) -> np.ndarray:
+    """Largest second difference of each Bezier triangle's control net along its three directions."""
+    ctrl = np.asarray(control_pts, dtype=np.float64).reshape(-1, 10, 3)
+    entry = {}
+    for s in range(4):
+        for j in range(s + 1):
+            entry[s - j, j] = s * (s + 1) // 2 + j
+    # Second differences p(x-d) - 2p(x) + p(x+d) for the directions d in (i,j) index space
+    triples = []
+    for (i, j), e in entry.items():
+        for di, dj in ((1, 0), (0, 1), (1, -1)):
+            lo, hi = (i - di, j - dj), (i + di, j + dj)
+            if lo in entry and hi in entry:
+                triples.append((entry[lo], e, entry[hi]))
+    triples = np.array(triples)
+    second = ctrl[:, triples[:, 0]] - 2 * ctrl[:, triples[:, 1]] + ctrl[:, triples[:, 2]]
+    return 2 * np.linalg.norm(second, axis=-1).max(axis=1)
+
+
+def _check_tolerance(tolerance: float):
+    # Also rejects NaN
+    if not tolerance > 0:
+        raise ValueError('Tolerance must be positive, got {0}'.format(tolerance))
+
+
+def _levels(flatness: np.ndarray, tolerance: float, max_level: int) -> np.ndarray:
+    # Piecewise linear interpolation of a cubic with n segments deviates by at most about 3/4 * D / n**2
+    segments = np.sqrt(0.75 * flatness / tolerance)
+    levels = np.ceil(np.log2(np.maximum(segments, 1.0)))
+    return np.clip(levels, 0, max_level).astype(np.int64)
+
+
+def _snap_edge(values: np.ndarray, edge: np.ndarray, ratio: int):
+    # Moves the samples of an edge between every ratio-th one onto the segment joining those
+    lo = (np.arange(len(edge)) // ratio) * ratio
+    hi = np.minimum(lo + ratio, len(edge) - 1)
+    t = ((np.arange(len(edge)) - lo) / ratio)[None, :, None]
+    values[:, edge] = (1 - t) * values[:, edge[lo]] + t * values[:, edge[hi]]
+
+
+class _AdaptiveSurfaces:
+    def __init__(self, objects: V3DObjectArray, tolerance: float, max_level: int):
+        self.objects = objects
+        self.is_patch = objects.obj_type in (v3dtypes.v3dtypes_bezierPatch, v3dtypes.v3dtypes_bezierPatchColor)
+        ctrl = objects.control_pts
+        flatness = patch_flatness(ctrl) if self.is_patch else bezier_triangle_flatness(ctrl)
+        self.levels = _levels(flatness, tolerance, max_level)
+        edge_controls = _PATCH_EDGE_CONTROLS if self.is_patch else _TRIANGLE_EDGE_CONTROLS
+        self.edge_points = ctrl[:, edge_controls]
+        self.edge_ids: Optional[np.ndarray] = None
+
+    def tessellate(self, edge_levels: Optional[np.ndarray]) -> V3DMesh:
+        objects = self.objects
+        colors = objects.fields.get('colors', None)
+        meshes = []
+        for level in np.unique(self.levels).tolist():
+            n = 1 << level
+            template = patch_template(n) if self.is_patch else triangle_template(n)
+            selected = np.flatnonzero(self.levels == level)
+            for batch in batches(len(selected)):
+                chosen = selected[batch]
+                if self.is_patch:
+                    positions, normals = evaluate_patches(objects.control_pts[chosen], template.params)
+                    batch_colors = None if colors is None else _patch_colors(colors[chosen], template.params)
+                else:
+                    positions, normals = evaluate_bezier_triangles(objects.control_pts[chosen], template.params)
+                    batch_colors = None if colors is None else _triangle_colors(colors[chosen], template.params)
+
+                if edge_levels is not None:
+                    # Boundary samples shared with a coarser neighbour are moved onto its edge polyline
+                    coarse = edge_levels[self.edge_ids[chosen]]
+                    for e, edge in enumerate(template.edges):
+                        for coarse_level in np.unique(coarse[:, e]).tolist():
+                            if coarse_level >= level:
+                                continue
+                            rows = coarse[:, e] == coarse_level
+                            ratio = 1 << (level - coarse_level)
+                            for values in (positions, normals, batch_colors):
+                                if values is not None:
+                                    part = values[rows]
+                                    _snap_edge(part, edge, ratio)
+                                    values[rows] = part
+                    normals = normalize(normals)
+
+                meshes.append(_assemble(template, positions, normals, batch_colors,
+                                        objects.material_id[chosen], objects.center_index[chosen]))
+        return V3DMesh.concatenate(meshes)
+
+
+def tessellate_adaptive(object_arrays: Iterable[V3DObjectArray], tolerance: float, max_level: int = 6,
+                        stitch: bool = True) -> V3DMesh:
+    """Tessellates Bezier patches and triangles with a per-object resolution meeting a world-space tolerance.
+
+    Each object is subdivided into 2**level segments per side, with the level estimated from the
+    second differences of its control net. With stitch=True, edges shared between objects of
+    different levels are detected by their control points, and the samples of the finer side are
+    snapped onto the coarser side's edge so that no cracks open up. Straight quads and triangles
+    are passed through unchanged.
+    """
+    _check_tolerance(tolerance)
+    surfaces: List[_AdaptiveSurfaces] = []
+    meshes = []
+    for objects in object_arrays:
+        if objects.obj_type in _surface_tessellators:
+            surfaces.append(_AdaptiveSurfaces(objects, tolerance, max_level))
+        elif objects.obj_type in _straight_tessellators:
+            meshes.append(tessellate_object_array(objects))
+
+    edge_levels = None
+    if stitch and surfaces:
+        points = np.concatenate([surface.edge_points.reshape(-1, 4, 3) for surface in surfaces])
+        levels = np.concatenate([np.repeat(surface.levels, surface.edge_points.shape[1]) for surface in surfaces])
+        # Edges match regardless of direction; quantize well below the tolerance
+        quantized = np.round(points / (tolerance * 1e-3)).astype(np.int64)
+        flat, reverse = quantized.reshape(len(points), -1), quantized[:, ::-1].reshape(len(points), -1)
+        # Orient every edge so that its lexicographically smaller endpoint sequence comes first
+        differs = flat != reverse
+        first = np.argmax(differs, axis=1)
+        rows = np.arange(len(flat))
+        use_reverse = differs[rows, first] & (reverse[rows, first] < flat[rows, first])
+        keys = np.where(use_reverse[:, None], reverse, flat)
+        _, edge_ids = np.unique(keys, axis=0, return_inverse=True)
+        edge_ids = edge_ids.ravel()
+        edge_levels = np.full(edge_ids.max() + 1, max_level, dtype=np.int64)
+        np.minimum.at(edge_levels, edge_ids, levels)
+
+        start = 0
+        for surface in surfaces:
+            count = surface.edge_points.shape[0] * surface.edge_points.shape[1]
+            surface.edge_ids = edge_ids[start:start + count].reshape(surface.edge_points.shape[:2])
+            start += count
+
+    for surface in surfaces:
+        meshes.append(surface.tessellate(edge_levels))
+    return V3DMesh.concatenate(meshes)
+
+
+def tessellate_scene_adaptive(scene: V3DColumnarScene, tolerance: float, max_level: int = 6,
+                              stitch: bool = True) -> V3DMesh:
+    """Adaptive counterpart of tessellate_scene; see tessellate_adaptive."""
+    _check_tolerance(tolerance)
+    meshes = [tessellate_adaptive([group for typ, group in scene.groups.items() if typ in v3dsurface_types],
+                                  tolerance, max_level, stitch)]
+    triangle_groups = scene.get(v3dtypes.v3dtypes_triangles)
+    if triangle_groups:
+        meshes.append(V3DMesh.from_objects(triangle_groups))
+    return V3DMesh.concatenate(meshes)
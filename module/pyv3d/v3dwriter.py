@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+import io
+import gzip
+import struct
+import numpy as np
+from itertools import chain
+from typing import BinaryIO, Callable, Iterable, List, Optional, Tuple
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dheadertypes import v3dheadertypes
+from pyv3d.v3dlayouts import record_dtype, record_struct
+from pyv3d.v3dcolumnar import V3DColumnarScene, V3DObjectArray
+from pyv3d.v3dlazy import V3DLazyObject
+from pyv3d.v3dobjects import *
+
+V3D_VERSION = 1
+
+_uint = struct.Struct('>L')
+
+_flat = chain.from_iterable
+
+
+def _id(index: Optional[int]) -> int:
+    return 0 if index is None else int(index)
+
+
+def _ctrl_values(obj) -> tuple:
+    return (*_flat(obj.control_pts), _id(obj.center_index), _id(obj.material_id))
+
+
+def _ctrl_color_values(obj) -> tuple:
+    return (*_flat(obj.control_pts), _id(obj.center_index), _id(obj.material_id), *_flat(obj.colors))
+
+
+# Object class -> (type, scalars of the record in stream order). Lookup is by exact class since several
+# classes derive from one another.
+_record_values: dict[type, Tuple[int, Callable[[AV3Dobject], tuple]]] = {
+    V3DBezierPatch: (v3dtypes.v3dtypes_bezierPatch, _ctrl_values),
+    V3DBezierPatchColor: (v3dtypes.v3dtypes_bezierPatchColor, _ctrl_color_values),
+    V3DBezierTriangle: (v3dtypes.v3dtypes_bezierTriangle, _ctrl_values),
+    V3DBezierTriangleColor: (v3dtypes.v3dtypes_bezierTriangleColor, _ctrl_color_values),
+    V3DStraightBezierPatch: (v3dtypes.v3dtypes_quad, _ctrl_values),
+    V3DStraightBezierPatchColor: (v3dtypes.v3dtypes_quadColor, _ctrl_color_values),
+    V3DStraightBezierTriangle: (v3dtypes.v3dtypes_triangle, _ctrl_values),
+    V3DStraightBezierTriangleColor: (v3dtypes.v3dtypes_triangleColor, _ctrl_color_values),
+    V3DSphere: (v3dtypes.v3dtypes_sphere, lambda o: (
+        *o.center, o.radius, _id(o.center_index), _id(o.material_id))),
+    V3DHalfSphere: (v3dtypes.v3dtypes_halfSphere, lambda o: (
+        *o.center, o.radius, _id(o.center_index), _id(o.material_id), o.polar, o.azimuth)),
+    V3DCylinder: (v3dtypes.v3dtypes_cylinder, lambda o: (
+        *o.center, o.radius, o.height, _id(o.center_index), _id(o.material_id), o.polar, o.azimuth,
+        int(bool(o.core)))),
+    V3DDisk: (v3dtypes.v3dtypes_disk, lambda o: (
+        *o.center, o.radius, _id(o.center_index), _id(o.material_id), o.polar, o.azimuth)),
+    V3DTube: (v3dtypes.v3dtypes_tube, lambda o: (
+        *_flat(o.path), o.width, _id(o.center_index), _id(o.material_id), int(bool(o.core)))),
+    V3DCurve: (v3dtypes.v3dtypes_curve, lambda o: (
+        *o.z0, *o.c0, *o.c1, *o.z1, _id(o.center_index), _id(o.material_id))),
+    V3DLine: (v3dtypes.v3dtypes_line, lambda o: (*o.z0, *o.z1, _id(o.center_index), _id(o.material_id))),
+    V3DPixel: (v3dtypes.v3dtypes_pixel, lambda o: (*o.point, o.width, _id(o.material_id))),
+    V3DLineColor: (v3dtypes.v3dtypes_lineColor, lambda o: (
+        *o.z0, *o.z1, _id(o.center_index), _id(o.material_id), *_flat(o.colors))),
+    V3DCurveColor: (v3dtypes.v3dtypes_curveColor, lambda o: (
+        *o.z0, *o.c0, *o.c1, *o.z1, _id(o.center_index), _id(o.material_id), *_flat(o.colors))),
+    V3DTransform: (v3dtypes.v3dtypes_transform, lambda o: tuple(np.ravel(o.matrix))),
+    V3DElement: (v3dtypes.v3dtypes_element, lambda o: (o.element_id,)),
+}
+
+
+class V3DWriter:
+    """Serializes V3D objects into an XDR stream.
+
+    Records are packed whole with one precompiled struct per type (or one tobytes() per array for
+    triangle groups and columnar object arrays) and handed to the output in large batches.
+    """
+
+    def __init__(self, fil: BinaryIO, double_precision: bool = True, version: int = V3D_VERSION,
+                 buffer_size: int = 1 << 20):
+        self._fil = fil
+        self._owns_file = False
+        self._double_precision = double_precision
+        self._real_dtype = np.dtype('>f8' if double_precision else '>f4')
+        self._real_struct = struct.Struct('>d' if double_precision else '>f')
+        self._buffer_size = buffer_size
+        self._chunks: List[bytes] = []
+        self._pending = 0
+
+        # Record structs with the type number prepended
+        self._record_structs = {}
+        for typ in (v3dtypes.v3dtypes_material, *{typ for typ, _ in _record_values.values()}):
+            fmt = record_struct(typ, double_precision).format
+            self._record_structs[typ] = struct.Struct('>L' + fmt[1:])
+
+        self._write(_uint.pack(version) + _uint.pack(int(double_precision)))
+
+    @classmethod
+    def from_file_name(cls, file_name: str, double_precision: bool = True, compresslevel: int = 9,
+                       version: int = V3D_VERSION) -> 'V3DWriter':
+        writer_obj = cls(gzip.open(file_name, 'wb', compresslevel=compresslevel), double_precision, version)
+        writer_obj._owns_file = True
+        return writer_obj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def double_precision(self) -> bool:
+        return self._double_precision
+
+    def _write(self, data: bytes):
+        self._chunks.append(data)
+        self._pending += len(data)
+        if self._pending >= self._buffer_size:
+            self.flush()
+
+    def write_raw(self, data: bytes):
+        """Appends already encoded records, including their type numbers, verbatim."""
+        self._write(data)
+
+    def flush(self):
+        if self._chunks:
+            self._fil.write(b''.join(self._chunks))
+            self._chunks = []
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self._fil.close()
+
+    def _reals(self, values) -> bytes:
+        return np.asarray(values, dtype=np.float64).astype(self._real_dtype).tobytes()
+
+    def write_header(self, header: V3DHeaderInformation):
+        real = self._real_struct.format[1:]
+        entries: List[Tuple[int, bytes]] = []
+
+        def add(key: int, fmt: str, *values):
+            entries.append((key, struct.pack('>' + fmt, *values)))
+
+        if header.canvasWidth is not None:
+            add(v3dheadertypes.v3dheadertypes_canvasWidth, 'L', header.canvasWidth)
+        if header.canvasHeight is not None:
+            add(v3dheadertypes.v3dheadertypes_canvasHeight, 'L', header.canvasHeight)
+        if header.minBound is not None:
+            add(v3dheadertypes.v3dheadertypes_minBound, 3 * real, *header.minBound)
+        if header.maxBound is not None:
+            add(v3dheadertypes.v3dheadertypes_maxBound, 3 * real, *header.maxBound)
+        if header.orthographic is not None:
+            add(v3dheadertypes.v3dheadertypes_orthographic, 'L', int(header.orthographic))
+        if header.angleOfView is not None:
+            add(v3dheadertypes.v3dheadertypes_angleOfView, real, header.angleOfView)
+        if header.initialZoom is not None:
+            add(v3dheadertypes.v3dheadertypes_initialZoom, real, header.initialZoom)
+        if header.viewportShift is not None:
+            add(v3dheadertypes.v3dheadertypes_viewportShift, 2 * real, *header.viewportShift)
+        if header.viewportMargin is not None:
+            add(v3dheadertypes.v3dheadertypes_viewportMargin, 2 * real, *header.viewportMargin)
+        for light in header.lights:
+            add(v3dheadertypes.v3dheadertypes_light, 3 * real + '3f', *light.position, *light.color)
+        if header.background is not None:
+            add(v3dheadertypes.v3dheadertypes_background, '4f', *header.background)
+
+        config = header.configuration
+        if config.absolute is not None:
+            add(v3dheadertypes.v3dheadertypes_absolute, 'L', int(config.absolute))
+        for key, value in ((v3dheadertypes.v3dheadertypes_zoomFactor, config.zoomFactor),
+                           (v3dheadertypes.v3dheadertypes_zoomPinchFactor, config.zoomPinchFactor),
+                           (v3dheadertypes.v3dheadertypes_zoomPinchCap, config.zoomPinchCap),
+                           (v3dheadertypes.v3dheadertypes_zoomStep, config.zoomStep),
+                           (v3dheadertypes.v3dheadertypes_shiftHoldDistance, config.shiftHoldDistance),
+                           (v3dheadertypes.v3dheadertypes_shiftWaitTime, config.shiftWaitTime),
+                           (v3dheadertypes.v3dheadertypes_vibrateTime, config.vibrateTime)):
+            if value is not None:
+                add(key, real, value)
+
+        if header.image is not None:
+            name = header.image.encode('utf-8')
+            padded = name + b'\0' * (-len(name) % 4)
+            entries.append((v3dheadertypes.v3dheadertypes_imageName,
+                            struct.pack('>LL', len(name) >> 32, len(name) & 0xffffffff) + padded))
+
+        parts = [_uint.pack(v3dtypes.v3dtypes_header), _uint.pack(len(entries))]
+        for key, payload in entries:
+            parts.append(struct.pack('>LL', key, len(payload) // 4))
+            parts.append(payload)
+        self._write(b''.join(parts))
+
+    def write_material(self, material: V3DMaterial):
+        self._write(self._record_structs[v3dtypes.v3dtypes_material].pack(
+            v3dtypes.v3dtypes_material, *material.diffuse, *material.emissive, *material.specular,
+            material.shininess, material.metallic, material.f0, 1.0 if material.lightOn else 0.0))
+
+    def write_materials(self, materials: Iterable[V3DMaterial]):
+        for material in materials:
+            self.write_material(material)
+
+    def write_centers(self, centers):
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        self._write(_uint.pack(v3dtypes.v3dtypes_centers) + _uint.pack(len(centers)) + self._reals(centers))
+
+    def write_triangles(self, obj: V3DTriangleGroups):
+        positions = np.asarray(obj.positions, dtype=np.float64).reshape(-1, 3)
+        normals = np.asarray(obj.normals, dtype=np.float64).reshape(-1, 3)
+        pos_indices = np.asarray(obj.position_indices, dtype=np.uint32).reshape(-1, 3)
+        normal_indices = np.asarray(obj.normals_indices, dtype=np.uint32).reshape(-1, 3)
+
+        explicitNI = not np.array_equal(pos_indices, normal_indices)
+        index_sets = [pos_indices, normal_indices] if explicitNI else [pos_indices]
+
+        colors = getattr(obj, 'colors', None)
+        num_color = 0 if colors is None else len(colors)
+        parts = [_uint.pack(v3dtypes.v3dtypes_triangles), _uint.pack(len(pos_indices)),
+                 _uint.pack(len(positions)), self._reals(positions),
+                 _uint.pack(len(normals)), self._reals(normals),
+                 _uint.pack(int(explicitNI)), _uint.pack(num_color)]
+        if num_color > 0:
+            color_indices = np.asarray(obj.color_indices, dtype=np.uint32).reshape(-1, 3)
+            explicitCi = not np.array_equal(pos_indices, color_indices)
+            parts.append(np.asarray(colors, dtype='>f4').tobytes())
+            parts.append(_uint.pack(int(explicitCi)))
+            if explicitCi:
+                index_sets.append(color_indices)
+
+        parts.append(np.stack(index_sets, axis=1).astype('>u4').tobytes())
+        parts.append(struct.pack('>LL', _id(obj.center_index), _id(obj.material_id)))
+        self._write(b''.join(parts))
+
+    def write_animation(self, obj: V3DAnimation):
+        """Writes the number of frames, then per frame its length in words and its records."""
+        parts = [_uint.pack(v3dtypes.v3dtypes_animation), _uint.pack(len(obj.frames))]
+        for frame in obj.frames:
+            out = io.BytesIO()
+            frame_writer = V3DWriter(out, self._double_precision)
+            frame_writer.write_objects(frame)
+            frame_writer.flush()
+            # Without the preamble of the nested writer
+            records = out.getvalue()[8:]
+            parts.append(_uint.pack(len(records) // 4))
+            parts.append(records)
+        self._write(b''.join(parts))
+
+    def write_lazy_object(self, obj: V3DLazyObject):
+        """Copies the encoded record of a lazy handle, or writes the decoded object if precisions differ."""
+        if obj.double_precision != self._double_precision:
+            self.write_object(obj.decode())
+            return
+        self._write(_uint.pack(obj.obj_type) + obj.payload())
+
+    def write_object(self, obj: AV3Dobject):
+        if isinstance(obj, V3DLazyObject):
+            self.write_lazy_object(obj)
+            return
+        if isinstance(obj, V3DTriangleGroups):
+            self.write_triangles(obj)
+            return
+        if isinstance(obj, V3DAnimation):
+            self.write_animation(obj)
+            return
+        try:
+            typ, values = _record_values[type(obj)]
+        except KeyError:
+            raise RuntimeError('Cannot write object of type {0}'.format(type(obj).__name__)) from None
+        self._write(self._record_structs[typ].pack(typ, *values(obj)))
+
+    def write_objects(self, objects: Iterable[AV3Dobject]):
+        for obj in objects:
+            self.write_object(obj)
+
+    def write_object_array(self, objects: V3DObjectArray):
+        """Writes all objects of a columnar array with a single tobytes() call."""
+        typ = objects.obj_type
+        body = record_dtype(typ, self._double_precision)
+        records = np.empty(len(objects), dtype=np.dtype([('type', '>u4')] + body.descr))
+        records['type'] = typ
+        for name in body.names:
+            records[name] = objects.fields[name]
+        self._write(records.tobytes())
+
+    def write_columnar_scene(self, scene: V3DColumnarScene):
+        """Writes the objects of a columnar scene in file order, batching runs of records of one type.
+
+        The order matters beyond reproducing the input: a transform record applies to the objects
+        that follow it.
+        """
+        for typ, start, stop in scene.runs():
+            group = scene.groups[typ]
+            if isinstance(group, V3DObjectArray):
+                self.write_object_array(group.slice(start, stop))
+            else:
+                self.write_objects(group[start:stop])
+
+    def write_scene(self, reader):
+        """Writes header, materials, centers and objects decoded by a V3DReader."""
+        self.write_header(reader.header)
+        self.write_materials(reader.materials)
+        if len(reader.centers) > 0:
+            self.write_centers(reader.centers)
+        if reader.columnar_mode:
+            self.write_columnar_scene(reader.columnar)
+        else:
+            self.write_objects(reader.objects)
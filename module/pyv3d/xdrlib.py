@@ -10,6 +10,11 @@ from functools import wraps
 
 __all__ = ["Error", "Packer", "Unpacker", "ConversionError"]
 
+_uint = struct.Struct('>L')
+_int = struct.Struct('>l')
+_float = struct.Struct('>f')
+_double = struct.Struct('>d')
+
 # exceptions
 class Error(Exception):
     """Exception class for this module. Use:
@@ -130,7 +135,12 @@ class Packer:
 
 
 class Unpacker:
-    """Unpacks various data representations from the given buffer."""
+    """Unpacks various data representations from the given buffer.
+
+    The buffer may be any object supporting the buffer protocol (bytes,
+    bytearray, memoryview, mmap); scalars are read in place with
+    struct.unpack_from, without slicing the buffer.
+    """
 
     def __init__(self, data):
         self.reset(data)
@@ -155,18 +165,16 @@ class Unpacker:
     def unpack_uint(self):
         i = self.__pos
         self.__pos = j = i+4
-        data = self.__buf[i:j]
-        if len(data) < 4:
+        if j > len(self.__buf):
             raise EOFError
-        return struct.unpack('>L', data)[0]
+        return _uint.unpack_from(self.__buf, i)[0]
 
     def unpack_int(self):
         i = self.__pos
         self.__pos = j = i+4
-        data = self.__buf[i:j]
-        if len(data) < 4:
+        if j > len(self.__buf):
             raise EOFError
-        return struct.unpack('>l', data)[0]
+        return _int.unpack_from(self.__buf, i)[0]
 
     unpack_enum = unpack_int
 
@@ -187,18 +195,23 @@ class Unpacker:
     def unpack_float(self):
         i = self.__pos
         self.__pos = j = i+4
-        data = self.__buf[i:j]
-        if len(data) < 4:
+        if j > len(self.__buf):
             raise EOFError
-        return struct.unpack('>f', data)[0]
+        return _float.unpack_from(self.__buf, i)[0]
 
     def unpack_double(self):
         i = self.__pos
         self.__pos = j = i+8
-        data = self.__buf[i:j]
-        if len(data) < 8:
+        if j > len(self.__buf):
+            raise EOFError
+        return _double.unpack_from(self.__buf, i)[0]
+
+    def unpack_struct(self, fmt):
+        i = self.__pos
+        self.__pos = j = i+fmt.size
+        if j > len(self.__buf):
             raise EOFError
-        return struct.unpack('>d', data)[0]
+        return fmt.unpack_from(self.__buf, i)
 
     def unpack_fstring(self, n):
         if n < 0:
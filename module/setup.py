@@ -3,9 +3,10 @@
 from setuptools import setup, find_packages
 setup(name='pyv3d',
       version='1.0',
-      description='Python library for reading V3D Files',
+      description='Python library for reading and writing V3D Files',
       url='https://gitlab.com/vectorgraphics/v3d',
       author='Supakorn "Jamie" Rassamememasmuang and John C. Bowman',
       author_email="jamievlin@outlook.com, bowman@ualberta.ca",
       license='Apache 2.0',
-      packages=find_packages())
+      packages=find_packages(),
+      install_requires=['numpy'])
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from pyv3d import V3DReader, V3DWriter
+from pyv3d.v3dbake import bake_scene, look_at_rotation
+from pyv3d.v3dbounds import directions
+from pyv3d.v3dobjects import V3DBezierPatch, V3DCylinder, V3DTransform, V3DTriangleGroups
+
+
+def _rotation(angle, axis):
+    c, s = np.cos(angle), np.sin(angle)
+    i, j = [k for k in range(3) if k != axis]
+    matrix = np.eye(3)
+    matrix[i, i] = matrix[j, j] = c
+    matrix[i, j], matrix[j, i] = -s, s
+    return matrix
+
+
+def _transform(scale, rotation, translation):
+    matrix = np.eye(4)
+    matrix[:3, :3] = scale * rotation
+    matrix[:3, 3] = translation
+    return matrix
+
+
+@pytest.fixture
+def scene(tmp_path):
+    """A columnar reader, and (matrix, object) for each object as written."""
+    rng = np.random.default_rng(1)
+    matrices = [np.eye(4), _transform(2.0, _rotation(0.3, 2) @ _rotation(0.7, 0), (1, 2, 3)),
+                _transform(0.5, _rotation(1.1, 1), (-1, 0, 4))]
+    indices = [(0, 1, 2), (1, 2, 3)]
+    written = []
+    file_name = str(tmp_path / 'bake.v3d')
+    with V3DWriter.from_file_name(file_name) as writer:
+        writer.write_centers(rng.normal(size=(5, 3)))
+        for k, matrix in enumerate(matrices):
+            if k:
+                writer.write_object(V3DTransform(tuple(matrix.ravel())))
+            for i in range(6):
+                obj = [V3DBezierPatch(rng.normal(size=(16, 3)), 0, k),
+                       V3DCylinder(tuple(rng.normal(size=3)), 0.2, 1.5, 0.4, 1.0, True, 0, i % 2),
+                       V3DTriangleGroups(rng.normal(size=(4, 3)), rng.normal(size=(4, 3)), indices, indices, 0,
+                                         i % 2)][i % 3]
+                writer.write_object(obj)
+                written.append((matrix, obj))
+    reader = V3DReader.from_file_name(file_name, columnar=True)
+    reader.process()
+    return reader, written
+
+
+def test_transforms(scene):
+    reader, written = scene
+    baked = bake_scene(reader.columnar)
+    assert len(baked) == len(written)
+    for (matrix, obj), out in zip(written, baked):
+        linear, translation = matrix[:3, :3], matrix[:3, 3]
+        if isinstance(obj, V3DBezierPatch):
+            assert np.allclose(np.asarray(obj.control_pts) @ linear.T + translation, out.control_pts)
+        elif isinstance(obj, V3DCylinder):
+            assert np.allclose(linear @ obj.center + translation, out.center)
+            axis = linear @ directions(np.array(obj.polar), np.array(obj.azimuth)) * obj.height
+            assert np.allclose(axis, directions(np.array(out.polar), np.array(out.azimuth)) * out.height)
+            assert np.isclose(out.radius, obj.radius * abs(np.linalg.det(linear)) ** (1 / 3))
+        else:
+            assert np.allclose(np.asarray(obj.positions) @ linear.T + translation, out.positions)
+            normals = np.asarray(obj.normals) @ np.linalg.inv(linear)
+            assert np.allclose(normals / np.linalg.norm(normals, axis=1, keepdims=True), out.normals)
+
+
+def test_billboards(scene):
+    reader, _ = scene
+    centers = np.asarray(reader.centers)
+    rotation = look_at_rotation((3, 1, 2), (0, 0, 0))
+    baked = bake_scene(reader.columnar, centers, rotation, transforms=False)
+    patches = [(obj, out) for obj, out in zip(reader.columnar, baked) if isinstance(obj, V3DBezierPatch)]
+    assert any(obj.center_index for obj, _ in patches) and not all(obj.center_index for obj, _ in patches)
+    for obj, out in patches:
+        points, turned = np.asarray(obj.control_pts), np.asarray(out.control_pts)
+        if obj.center_index:
+            # Seen from the camera, points about the center look as they did from the default view
+            center = centers[obj.center_index - 1]
+            assert np.allclose((turned - center) @ rotation.T, points - center)
+        else:
+            assert np.allclose(turned, points)
+
+
+def test_look_at_default_view():
+    assert np.allclose(look_at_rotation((0, 0, 1), (0, 0, 0)), np.eye(3))
+
+
+def test_billboards_need_centers(scene):
+    with pytest.raises(ValueError):
+        bake_scene(scene[0].columnar, rotation=np.eye(3))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from pyv3d import V3DReader
+from pyv3d.v3dfilter import filter_v3d
+from pyv3d.v3dsynth import scene_counts, write_synthetic_scene
+from pyv3d.v3dtypes import v3dtypes
+from pyv3d.v3dobjects import V3DAnimation, V3DSphere
+
+
+@pytest.fixture(scope='module', params=[True, False], ids=['double', 'single'])
+def scene_file(request, tmp_path_factory):
+    file_name = str(tmp_path_factory.mktemp('filter') / 'synthetic.v3d')
+    write_synthetic_scene(file_name, scene_counts(1 << 18, request.param), request.param)
+    return file_name
+
+
+def _read(file_name):
+    reader = V3DReader.from_file_name(file_name)
+    reader.process()
+    return reader
+
+
+def _frame_records(obj):
+    return [record for frame in obj.frames for record in frame]
+
+
+@pytest.mark.parametrize('types', [[v3dtypes.v3dtypes_sphere],
+                                   [v3dtypes.v3dtypes_animation, v3dtypes.v3dtypes_sphere]],
+                         ids=['pruned', 'animations'])
+def test_renumbered_materials(scene_file, tmp_path, types):
+    # Kept objects, and the records inside kept animations, keep the material values they had
+    source = _read(scene_file)
+    out_name = str(tmp_path / 'filtered.v3d')
+    filter_v3d(V3DReader.from_file_name(scene_file), out_name, types=types, materials=[0, 5])
+    out = _read(out_name)
+    kept = [obj for obj in source.objects
+            if (isinstance(obj, V3DAnimation) and v3dtypes.v3dtypes_animation in types) or
+            (type(obj) is V3DSphere and obj.material_id in (0, 5))]
+    assert len(out.objects) == len(kept)
+    if v3dtypes.v3dtypes_animation not in types:
+        assert len(out.materials) == 2
+    for src, obj in zip(kept, out.objects):
+        pairs = zip(_frame_records(src), _frame_records(obj)) if isinstance(obj, V3DAnimation) else [(src, obj)]
+        for a, b in pairs:
+            assert vars(source.materials[a.material_id]) == vars(out.materials[b.material_id])
+
+
+def test_renumbered_centers(scene_file, tmp_path):
+    source = _read(scene_file)
+    out_name = str(tmp_path / 'filtered.v3d')
+    filter_v3d(V3DReader.from_file_name(scene_file), out_name, types=[v3dtypes.v3dtypes_sphere])
+    out = _read(out_name)
+    kept = [obj for obj in source.objects if type(obj) is V3DSphere]
+    assert len(out.objects) == len(kept)
+    for src, obj in zip(kept, out.objects):
+        assert (src.center_index == 0) == (obj.center_index == 0)
+        if src.center_index:
+            assert np.array_equal(source.centers[src.center_index - 1], out.centers[obj.center_index - 1])
+
+
+def test_box_keeps_placements(scene_file, tmp_path):
+    out_name = str(tmp_path / 'filtered.v3d')
+    filter_v3d(V3DReader.from_file_name(scene_file), out_name, box=([-1.0, -1.0, -1.0], [0.5, 0.5, 0.5]))
+    types = V3DReader.from_file_name(out_name).index.types
+    source_types = V3DReader.from_file_name(scene_file).index.types
+    for typ in (v3dtypes.v3dtypes_transform, v3dtypes.v3dtypes_element):
+        assert np.count_nonzero(types == typ) == np.count_nonzero(source_types == typ)
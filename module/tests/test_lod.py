@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from pyv3d.v3dlod import cell_size_for_error, cluster_vertices, lod_levels, triangle_group_lods
+from pyv3d.v3dmesh import V3DMesh
+from pyv3d.v3dprimitives import unit_sphere
+from pyv3d.v3dobjects import V3DTriangleGroupsColor
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    return unit_sphere(5)
+
+
+@pytest.mark.parametrize('representative', ['mean', 'quadric'])
+def test_levels_within_error(sphere, representative):
+    levels = lod_levels(sphere, representative=representative)
+    assert [error for error, _ in levels] == sorted(error for error, _ in levels)
+    previous = sphere.num_triangles
+    for error, mesh in levels:
+        # Every vertex of the unit sphere moves by at most the error, so none leaves the shell
+        assert np.abs(np.linalg.norm(mesh.positions, axis=1) - 1).max() <= error
+        assert np.allclose(np.linalg.norm(mesh.normals, axis=1), 1)
+        assert 0 < mesh.num_triangles <= previous
+        previous = mesh.num_triangles
+    assert levels[-1][1].num_triangles < sphere.num_triangles
+
+
+def test_no_degenerate_triangles(sphere):
+    mesh = cluster_vertices(sphere, 0.2)
+    triangles = np.sort(mesh.indices.reshape(-1, 3), axis=1)
+    assert np.all((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]))
+    assert len(np.unique(triangles, axis=0)) == len(triangles)
+
+
+def test_zero_error_keeps_mesh(sphere):
+    assert lod_levels(sphere, errors=[0.0])[0][1] is sphere
+
+
+def test_triangle_group_lods(sphere):
+    colored = V3DMesh(sphere.positions, sphere.normals, sphere.indices,
+                      np.tile([1.0, 0.0, 0.0, 1.0], (sphere.num_vertices, 1)), 3, 2)
+    for _, group in triangle_group_lods(colored.to_triangle_group(3, 2)):
+        assert isinstance(group, V3DTriangleGroupsColor)
+        assert (group.material_id, group.center_index) == (3, 2)
+
+
+@pytest.mark.parametrize('cell_size', [0.0, -1.0, float('nan')])
+def test_rejects_cell_size(sphere, cell_size):
+    with pytest.raises(ValueError):
+        cluster_vertices(sphere, cell_size)
+
+
+@pytest.mark.parametrize('max_error', [-1.0, float('nan')])
+def test_rejects_error(sphere, max_error):
+    with pytest.raises(ValueError):
+        cell_size_for_error(max_error)
+    with pytest.raises(ValueError):
+        lod_levels(sphere, errors=[max_error])
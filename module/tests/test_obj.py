@@ -0,0 +1,51 @@
+import io
+import numpy as np
+import pytest
+from pyv3d.v3dobj import _write_real_rows, write_obj
+from pyv3d.v3dobjects import V3DTriangleGroups
+
+
+def _printf_rows(prefix, rows, precision):
+    row_format = prefix + ' '.join(['%.{0}f'.format(precision)] * rows.shape[1]) + '\n'
+    return ''.join(row_format % tuple(row) for row in rows.tolist()).encode()
+
+
+def _formatted(rows, precision):
+    out = io.BytesIO()
+    _write_real_rows(out, 'v ', rows, precision)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('precision', [0, 1, 3, 6, 9])
+def test_matches_printf(precision):
+    rng = np.random.default_rng(precision)
+    n = 3000
+    values = np.concatenate([
+        rng.normal(size=n) * 10.0 ** rng.integers(-8, 8, n),
+        # Decimal half units, whose doubles lie just above or below the tie
+        (rng.integers(-10 ** 6, 10 ** 6, n) + 0.5) / 10 ** precision,
+        # Dyadic values, many of which are exact ties
+        rng.integers(-4096, 4096, n) / 128.0,
+        [0.0, -0.0, -1e-12, 0.5, 1.5, 2.5, -2.5, 0.125, 1e-300]])
+    rows = values[:len(values) // 3 * 3].reshape(-1, 3)
+    assert _formatted(rows, precision) == _printf_rows('v ', rows, precision)
+
+
+@pytest.mark.parametrize('precision', [0, 6])
+def test_large_and_non_finite(precision):
+    limit = 2.0 ** 53 / 10 ** precision
+    rows = np.array([[limit * 0.999, -limit * 0.999, 1.0], [np.inf, -np.inf, np.nan], [1e300, limit, -limit]])
+    for row in rows:
+        assert _formatted(row[None], precision) == _printf_rows('v ', row[None], precision)
+
+
+def test_write_obj(tmp_path):
+    positions = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0]])
+    normals = np.tile([0.0, 0.0, 1.0], (4, 1))
+    indices = [(0, 1, 2), (1, 3, 2)]
+    out_name = str(tmp_path / 'square.obj')
+    write_obj([V3DTriangleGroups(positions, normals, indices, indices, 0, 0)], out_name, precision=2)
+    with open(out_name) as fil:
+        lines = [line.split() for line in fil if line.startswith(('v ', 'vn ', 'f '))]
+    assert [line[1:] for line in lines if line[0] == 'v'] == [['%.2f' % x for x in p] for p in positions]
+    assert [line[1:] for line in lines if line[0] == 'f'] == [['1//1', '2//2', '3//3'], ['2//2', '4//4', '3//3']]